@@ -0,0 +1,59 @@
+"""Partial indexes and random sampling key for approved properties
+
+Revision ID: b3d91c07a2e4
+Revises: fae2c32ac672
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b3d91c07a2e4'
+down_revision = 'fae2c32ac672'
+branch_labels = None
+depends_on = None
+
+APPROVED = sa.text("status = 'APPROVED'")
+BACKFILL_BATCH = 5000
+# Each batch is its own short transaction; ordering by id keeps batches on disjoint rows
+BACKFILL = sa.text("""
+    UPDATE properties SET random_key = random()
+    WHERE id IN (SELECT id FROM properties WHERE random_key IS NULL ORDER BY id LIMIT :batch)
+""")
+
+
+def upgrade():
+    # Nullable with no default is a catalog-only change; a volatile default would rewrite the
+    # table under an ACCESS EXCLUSIVE lock
+    op.add_column('properties', sa.Column('random_key', sa.Float(), nullable=True))
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        while bind.execute(BACKFILL, {"batch": BACKFILL_BATCH}).rowcount:
+            pass
+        # New rows get their own key from here on; SET DEFAULT does not touch existing rows
+        op.execute("ALTER TABLE properties ALTER COLUMN random_key SET DEFAULT random()")
+        # Rows inserted between the last batch and SET DEFAULT
+        while bind.execute(BACKFILL, {"batch": BACKFILL_BATCH}).rowcount:
+            pass
+        # NOT NULL without a full-table scan under ACCESS EXCLUSIVE: validate a CHECK first
+        # (SHARE UPDATE EXCLUSIVE, writes continue), which SET NOT NULL then relies on
+        op.execute("ALTER TABLE properties ADD CONSTRAINT properties_random_key_not_null CHECK (random_key IS NOT NULL) NOT VALID")
+        op.execute("ALTER TABLE properties VALIDATE CONSTRAINT properties_random_key_not_null")
+        op.execute("ALTER TABLE properties ALTER COLUMN random_key SET NOT NULL")
+        op.execute("ALTER TABLE properties DROP CONSTRAINT properties_random_key_not_null")
+        # Build indexes without blocking writes on the shared properties table
+        op.create_index('ix_properties_approved_price', 'properties', ['price'],
+                        postgresql_where=APPROVED, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_properties_approved_house_type_price', 'properties', ['house_type', 'price'],
+                        postgresql_where=APPROVED, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_properties_approved_random_key', 'properties', ['random_key'],
+                        postgresql_where=APPROVED, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_properties_approved_random_key', table_name='properties', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_properties_approved_house_type_price', table_name='properties', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_properties_approved_price', table_name='properties', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('properties', 'random_key')
@@ -0,0 +1,33 @@
+"""Materialized recommendations for saved searches
+
+Revision ID: c5e1f4a8d302
+Revises: b3d91c07a2e4
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1f4a8d302'
+down_revision = 'b3d91c07a2e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('SavedSearchResults',
+    sa.Column('saved_search_id', sa.Integer(), nullable=False),
+    sa.Column('recommendations', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['saved_search_id'], ['SavedSearches.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('saved_search_id')
+    )
+    op.create_index(op.f('ix_SavedSearchResults_refreshed_at'), 'SavedSearchResults', ['refreshed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_SavedSearchResults_refreshed_at'), table_name='SavedSearchResults')
+    op.drop_table('SavedSearchResults')
@@ -0,0 +1,52 @@
+"""Incrementally maintained feedback counters
+
+Revision ID: d8a2b6c4e915
+Revises: c5e1f4a8d302
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd8a2b6c4e915'
+down_revision = 'c5e1f4a8d302'
+branch_labels = None
+depends_on = None
+
+# Seed the counters from feedback already stored as RecommendationLogs rows
+BACKFILL = """
+WITH feedback AS (
+    SELECT l.tenant_preference_id::text AS preference_key,
+           p.user_id::text AS user_key,
+           l.feedback->>'property_id' AS property_key,
+           lower(coalesce(l.feedback->>'liked', '')) IN ('true', '1') AS liked
+    FROM "RecommendationLogs" l
+    JOIN "TenantPreferences" p ON p.id = l.tenant_preference_id
+    WHERE l.feedback ? 'liked'
+)
+INSERT INTO "FeedbackAggregates" (scope, key, liked, disliked, updated_at)
+SELECT scope, key, count(*) FILTER (WHERE liked), count(*) FILTER (WHERE NOT liked), now()
+FROM (
+    SELECT 'preference' AS scope, preference_key AS key, liked FROM feedback
+    UNION ALL SELECT 'user', user_key, liked FROM feedback
+    UNION ALL SELECT 'property', property_key, liked FROM feedback WHERE property_key IS NOT NULL
+) AS scoped
+GROUP BY scope, key
+"""
+
+
+def upgrade():
+    op.create_table('FeedbackAggregates',
+    sa.Column('scope', sa.String(length=16), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('liked', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('disliked', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+    sa.PrimaryKeyConstraint('scope', 'key')
+    )
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_table('FeedbackAggregates')
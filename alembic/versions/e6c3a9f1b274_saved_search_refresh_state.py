@@ -0,0 +1,28 @@
+"""Shared watermark of the saved-search refresh worker
+
+Revision ID: e6c3a9f1b274
+Revises: d8a2b6c4e915
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e6c3a9f1b274'
+down_revision = 'd8a2b6c4e915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('SavedSearchRefreshState',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('properties_updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('properties_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('SavedSearchRefreshState')
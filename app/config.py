@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
+from typing import Literal, Optional
 from sqlalchemy.engine import URL
 
 
@@ -12,6 +13,99 @@ class Settings(BaseSettings):
     USER_MANAGEMENT_URL: str = "https://rent-managment-system-user-magt.onrender.com"
     SEARCH_FILTERS_URL: str = "http://search-filters:8000"
     READ_ONLY_MODE: bool = False
+    # Database connection pool: "queue" (pooled) or "null" (one connection per session, serverless)
+    DB_POOL_MODE: Literal["queue", "null"] = "queue"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Prepared statement cache per connection; None = auto (off behind PgBouncer-style poolers)
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = None
+    # Random fallback tiers: "random_key" seeks the indexed properties.random_key column
+    # (added by the sampling migration b3d91c07a2e4); "random" is the legacy ORDER BY random() full sort.
+    # A database without the column is detected on the first search, which then falls back to "random"
+    SEARCH_SAMPLING_MODE: Literal["random_key", "random"] = "random_key"
+    # Candidates passed from search to transport-cost and ranking
+    SEARCH_CANDIDATE_LIMIT: int = 10
+    TRANSPORT_DATA_PATH: str = "train_data/transport_price_data.json"
+    # Persistent property vector index; synced incrementally every VECTOR_SYNC_INTERVAL_SECONDS (0 = off)
+    VECTOR_STORE_DIR: str = "/persistent-storage/chroma_db"
+    VECTOR_SYNC_INTERVAL_SECONDS: int = 0
+    # Incremental passes re-read this much before the watermark (late commits); full reconcile interval
+    VECTOR_SYNC_OVERLAP_SECONDS: int = 60
+    VECTOR_SYNC_RECONCILE_SECONDS: int = 3600
+    # Materialized saved-search results: worker poll interval (0 = off), forced refresh age, sizes
+    SAVED_SEARCH_REFRESH_INTERVAL_SECONDS: int = 0
+    SAVED_SEARCH_MAX_AGE_SECONDS: int = 6 * 3600
+    SAVED_SEARCH_CANDIDATE_LIMIT: int = 200
+    SAVED_SEARCH_RESULT_LIMIT: int = 20
+    SAVED_SEARCH_DEFAULT_RADIUS_KM: float = 10.0
+    # "chroma" (persistent HNSW) or "numpy" (in-memory exact search with metadata pre-filters)
+    VECTOR_BACKEND: Literal["chroma", "numpy"] = "chroma"
+    # Embedding model is loaded on first use; EMBEDDINGS_WARMUP loads it in the background at startup
+    EMBEDDINGS_ENABLED: bool = True
+    EMBEDDINGS_WARMUP: bool = False
+    EMBEDDING_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_DEVICE: str = "cpu"
+    EMBEDDING_BATCH_SIZE: int = 64
+    # Content-addressed on-disk embedding cache shared by workers ("" disables)
+    EMBEDDING_CACHE_DIR: str = "/persistent-storage/embedding_cache"
+    # Batch recommendations: profiles per call, concurrent groups/profiles, salary band width for grouping
+    BATCH_MAX_PROFILES: int = 50
+    BATCH_CONCURRENCY: int = 4
+    BATCH_SALARY_BAND: float = 1000.0
+    # Write-behind persistence of tenant preferences and recommendation logs (ids pre-allocated in blocks)
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_FLUSH_SECONDS: float = 0.5
+    WRITE_BEHIND_MAX_BATCH: int = 200
+    WRITE_BEHIND_MAX_PENDING: int = 2000
+    WRITE_BEHIND_MAX_BACKOFF_SECONDS: float = 30.0
+    WRITE_BEHIND_ID_BLOCK: int = 50
+    # Gemini reason generation
+    GEMINI_TIMEOUT_SECONDS: float = 15.0
+    REASON_CONCURRENCY: int = 3
+    REASON_CACHE_TTL_SECONDS: int = 6 * 3600
+    REASON_CACHE_MAX_ENTRIES: int = 2048
+    REASON_CACHE_REDIS: bool = False
+    # Natural-language search: rule-based parser first, LLM only below this confidence
+    SEARCH_RULES_ENABLED: bool = True
+    SEARCH_RULES_MIN_CONFIDENCE: float = 0.8
+    # Natural-language search -> SQL translation cache
+    SQL_CACHE_TTL_SECONDS: int = 24 * 3600
+    SQL_CACHE_MAX_ENTRIES: int = 1024
+    SQL_CACHE_REDIS: bool = False
+    # Pooled HTTP clients (HTTP/2 needs the optional 'h2' package)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    HTTP2_ENABLED: bool = False
+    GEBETA_TIMEOUT_SECONDS: float = 15.0
+    SEARCH_FILTERS_TIMEOUT_SECONDS: float = 5.0
+    USER_MANAGEMENT_TIMEOUT_SECONDS: float = 5.0
+    # Gebeta distance matrix: waypoints per ONM call and concurrent calls per request
+    GEBETA_MAX_WAYPOINTS: int = 10
+    GEBETA_MATRIX_CONCURRENCY: int = 4
+    # Gazetteer lookups below this confidence fall back to the default city coordinates
+    GEOCODE_MIN_CONFIDENCE: float = 0.5
+    GEOCODE_MEMO_SIZE: int = 4096
+    # Road distances: "gebeta" (network matrix), "local" (haversine x calibrated detour factor only)
+    # or "prerank" (local estimate trims candidates to ROUTING_PRERANK_KEEP before the network call)
+    ROUTING_MODE: Literal["gebeta", "local", "prerank"] = "gebeta"
+    ROUTING_LOCAL_FALLBACK: bool = True
+    ROUTING_PRERANK_KEEP: int = 10
+    DETOUR_FACTOR_PATH: str = "/persistent-storage/detour_factor.json"
+    # Gebeta distance-matrix cache; coordinates are rounded to these decimals for the key
+    MATRIX_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    MATRIX_CACHE_MAX_ENTRIES: int = 50000
+    MATRIX_CACHE_REDIS: bool = False
+    MATRIX_CACHE_ORIGIN_PRECISION: int = 3
+    MATRIX_CACHE_DEST_PRECISION: int = 4
+    # Token verification cache
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_NEGATIVE_CACHE_TTL_SECONDS: int = 5
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
 
     
 
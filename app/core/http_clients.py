@@ -0,0 +1,68 @@
+from typing import Dict
+
+import httpx
+from structlog import get_logger
+
+from app.config import settings
+
+logger = get_logger()
+
+# App-lifetime pooled clients, one per upstream, keyed by name
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _upstream_timeouts() -> Dict[str, float]:
+    return {
+        "gebeta": settings.GEBETA_TIMEOUT_SECONDS,
+        "search_filters": settings.SEARCH_FILTERS_TIMEOUT_SECONDS,
+        "user_management": settings.USER_MANAGEMENT_TIMEOUT_SECONDS,
+    }
+
+
+def _http2_available() -> bool:
+    if not settings.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+
+
+def _build_client(timeout: float) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=_http2_available(),
+    )
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """
+    Return the pooled client for an upstream ("gebeta", "search_filters", "user_management").
+    Clients are normally created by `start_http_clients` on startup; this creates one lazily otherwise.
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client(_upstream_timeouts()[name])
+    return client
+
+
+async def start_http_clients() -> None:
+    for name in _upstream_timeouts():
+        get_http_client(name)
+    logger.info("HTTP client pools started", upstreams=list(_clients))
+
+
+async def close_http_clients() -> None:
+    for name, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning("Failed to close HTTP client", upstream=name, error=str(e))
+    _clients.clear()
@@ -1,7 +1,9 @@
 import ssl
+import time
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
 from app.config import settings
 
 DB_URL = settings.DATABASE_URL
@@ -14,12 +16,63 @@ ssl_ctx = ssl.create_default_context()
 ssl_ctx.check_hostname = False
 ssl_ctx.verify_mode = ssl.CERT_NONE
 
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait to acquire a connection."""
+
+    acquire_count = 0
+    acquire_wait_total = 0.0
+    acquire_wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            cls = type(self)
+            cls.acquire_count += 1
+            cls.acquire_wait_total += waited
+            cls.acquire_wait_max = max(cls.acquire_wait_max, waited)
+
+
+def _behind_transaction_pooler(url: str) -> bool:
+    # PgBouncer/Supabase transaction poolers reuse server connections across clients,
+    # which breaks server-side prepared statements
+    parsed = make_url(url)
+    return parsed.port == 6543 or "pgbouncer" in (parsed.host or "") or "pooler" in (parsed.host or "")
+
+
+def _connect_args() -> dict:
+    args = {"ssl": ssl_ctx}
+    cache_size = settings.DB_STATEMENT_CACHE_SIZE
+    if cache_size is None:
+        cache_size = 0 if _behind_transaction_pooler(DB_URL) else 100
+    args["statement_cache_size"] = cache_size  # asyncpg's own cache
+    args["prepared_statement_cache_size"] = cache_size  # SQLAlchemy asyncpg adapter cache
+    return args
+
+
+def _pool_kwargs() -> dict:
+    if settings.DB_POOL_MODE == "null":
+        # One connection per session; for serverless deployments that cannot hold sockets open
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
 # Create a single, shared async engine for the application
 engine = create_async_engine(
     DB_URL,
-    poolclass=NullPool,  # Recommended for serverless/async environments
-    connect_args={"ssl": ssl_ctx},
+    connect_args=_connect_args(),
     future=True,
+    **_pool_kwargs(),
 )
 
 # Create a session factory to generate new sessions
@@ -29,3 +82,21 @@ AsyncSessionFactory = sessionmaker(engine, class_=AsyncSession, expire_on_commit
 async def get_session() -> AsyncSession:
     async with AsyncSessionFactory() as session:
         yield session
+
+
+def pool_stats() -> dict:
+    """Connection pool counters for the health endpoint."""
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return {"mode": settings.DB_POOL_MODE}
+    count = InstrumentedQueuePool.acquire_count
+    return {
+        "mode": settings.DB_POOL_MODE,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "acquire_count": count,
+        "acquire_wait_avg_ms": round(InstrumentedQueuePool.acquire_wait_total / count * 1000, 3) if count else 0.0,
+        "acquire_wait_max_ms": round(InstrumentedQueuePool.acquire_wait_max * 1000, 3),
+    }
@@ -1,22 +1,71 @@
+import asyncio
+import hashlib
+import time
+from typing import Dict, Optional
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import httpx
+from jose import jwt
 from app.config import settings
 from structlog import get_logger
 from pybreaker import CircuitBreaker
+from app.core.http_clients import get_http_client
+from app.utils.cache import TieredCache
 
 logger = get_logger()
 security = HTTPBearer()
 breaker = CircuitBreaker(fail_max=3, reset_timeout=60)
 
+# Verification results keyed by a hash of the bearer token (raw tokens are never stored)
+verify_cache = TieredCache(
+    "auth_verify",
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+)
+# In-flight upstream verifications, so a burst with one token makes a single call
+_inflight: Dict[str, asyncio.Future] = {}
+
+def _token_ttl(token: str) -> float:
+    """Positive-cache TTL, capped by the token's own `exp` claim when it has one."""
+    ttl = float(settings.AUTH_CACHE_TTL_SECONDS)
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+    except Exception:
+        pass  # Opaque or malformed token; rely on the configured TTL
+    return ttl
+
+async def _verify_upstream(token: str, key: str) -> Optional[dict]:
+    client = get_http_client("user_management")
+    response = await client.get(
+        f"{settings.USER_MANAGEMENT_URL}/auth/verify",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    if response.status_code != 200:
+        logger.error("Token verification failed", status_code=response.status_code)
+        if response.status_code in (401, 403):
+            await verify_cache.set(key, {"valid": False}, ttl=settings.AUTH_NEGATIVE_CACHE_TTL_SECONDS)
+        return None
+    user = response.json()
+    await verify_cache.set(key, {"valid": True, "user": user}, ttl=_token_ttl(token))
+    return user
+
 @breaker
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{settings.USER_MANAGEMENT_URL}/auth/verify",
-            headers={"Authorization": f"Bearer {credentials.credentials}"}
-        )
-        if response.status_code != 200:
-            logger.error("Token verification failed", status_code=response.status_code)
+    token = credentials.credentials
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = await verify_cache.get(key)
+    if cached is not None:
+        if not cached["valid"]:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return response.json()
+        return cached["user"]
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_verify_upstream(token, key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield so one cancelled waiter doesn't cancel the shared upstream call
+    user = await asyncio.shield(task)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user
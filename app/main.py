@@ -1,3 +1,5 @@
+import asyncio
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import recommendation
@@ -6,7 +8,19 @@ from fastapi_limiter import FastAPILimiter
 from redis.asyncio import Redis
 from app.config import settings
 from sqlalchemy import text
-from app.database import AsyncSessionFactory
+from app.database import AsyncSessionFactory, engine, pool_stats
+from app.services.route_index import get_route_index
+from app.services.road_estimator import save_road_estimator
+from app.services.gazetteer import get_gazetteer, refresh_gazetteer
+from app.services.property_search import search_path_stats
+from app.services.rag import sync_vector_store, warm_up_embeddings, embedding_status
+from app.services.saved_search import refresh_saved_searches
+from app.services.write_behind import get_write_behind, start_write_behind, stop_write_behind
+from app.utils.cache import cache_stats
+from app.core.http_clients import start_http_clients, close_http_clients
+from structlog import get_logger
+
+logger = get_logger()
 
 app = FastAPI(title="AI Recommendation Microservice")
 app.add_middleware(
@@ -22,9 +36,57 @@ app.add_middleware(
 )
 app.include_router(recommendation.router)
 
+_background_tasks = []
+# Phase timings of the last startup, reported in the logs and on /health
+startup_report = {}
+
+
+async def _vector_sync_loop(interval: int):
+    # Keep the persistent vector index current; each pass only embeds rows that changed
+    while True:
+        try:
+            async with AsyncSessionFactory() as session:
+                await sync_vector_store(session)
+        except Exception as e:
+            logger.warning("Vector store sync failed", error=str(e))
+        await asyncio.sleep(interval)
+
+async def _saved_search_loop(interval: int):
+    # Keep materialized saved-search results current; cheap when no property changed
+    while True:
+        try:
+            async with AsyncSessionFactory() as session:
+                await refresh_saved_searches(session)
+        except Exception as e:
+            logger.warning("Saved search refresh failed", error=str(e))
+        await asyncio.sleep(interval)
+
 @app.on_event("startup")
 async def startup_event():
+    started = time.perf_counter()
     setup_logging()
+    # Load the transport route index once so requests never touch the JSON file
+    get_route_index()
+    startup_report["route_index_seconds"] = round(time.perf_counter() - started, 3)
+    # Build the place-name gazetteer once; without the database it still covers builtins and stops
+    phase = time.perf_counter()
+    try:
+        async with AsyncSessionFactory() as session:
+            await refresh_gazetteer(session)
+    except Exception as e:
+        logger.warning("Gazetteer built without property locations", error=str(e))
+        get_gazetteer()
+    startup_report["gazetteer_seconds"] = round(time.perf_counter() - phase, 3)
+    await start_http_clients()
+    if settings.WRITE_BEHIND_ENABLED:
+        await start_write_behind(AsyncSessionFactory)
+    if settings.EMBEDDINGS_ENABLED and settings.EMBEDDINGS_WARMUP:
+        # Off the event loop so the worker starts serving while the model loads
+        _background_tasks.append(asyncio.create_task(asyncio.to_thread(warm_up_embeddings)))
+    if settings.EMBEDDINGS_ENABLED and settings.VECTOR_SYNC_INTERVAL_SECONDS > 0:
+        _background_tasks.append(asyncio.create_task(_vector_sync_loop(settings.VECTOR_SYNC_INTERVAL_SECONDS)))
+    if settings.SAVED_SEARCH_REFRESH_INTERVAL_SECONDS > 0:
+        _background_tasks.append(asyncio.create_task(_saved_search_loop(settings.SAVED_SEARCH_REFRESH_INTERVAL_SECONDS)))
     # Initialize rate limiter only if Redis is available; skip gracefully on failure
     try:
         if settings.REDIS_URL:
@@ -33,19 +95,40 @@ async def startup_event():
     except Exception as e:
         # Running without rate limiter
         pass
+    startup_report["total_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info("Startup complete", **startup_report, embeddings=embedding_status()["state"])
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in _background_tasks:
+        task.cancel()
+    await close_http_clients()
+    # Before disposing the engine: pending preference/log rows are written here
+    await stop_write_behind()
+    save_road_estimator()
+    await engine.dispose()
 
 
 @app.get("/health", tags=["health"])
 async def health():
     details = {"status": "ok"}
-    # Check DB connectivity
+    # Check DB connectivity and count approved properties on a single connection
     try:
         async with AsyncSessionFactory() as session:
             await session.execute(text("SELECT 1"))
-        details["database"] = "up"
+            details["database"] = "up"
+            try:
+                result = await session.execute(text("SELECT COUNT(1) FROM properties WHERE status = 'APPROVED'"))
+                count = result.scalar() or 0
+                details["approved_properties_count"] = int(count)
+            except Exception as e:
+                details["approved_properties_count"] = f"error: {str(e)}"
     except Exception as e:
         details["status"] = "degraded"
         details["database"] = f"down: {str(e)}"
+        details["approved_properties_count"] = f"error: {str(e)}"
+    details["database_pool"] = pool_stats()
     # Config presence checks (no secrets exposed)
     details["config"] = {
         "db_url_set": bool(settings.DATABASE_URL),
@@ -53,12 +136,9 @@ async def health():
         "gebeta_key_set": settings.GEBETA_API_KEY not in (None, "", "your_gebeta_key"),
         "gemini_key_set": settings.GEMINI_API_KEY not in (None, "", "your_gemini_key"),
     }
-    # Approved properties count
-    try:
-        async with AsyncSessionFactory() as session:
-            result = await session.execute(text("SELECT COUNT(1) FROM properties WHERE status = 'APPROVED'"))
-            count = result.scalar() or 0
-        details["approved_properties_count"] = int(count)
-    except Exception as e:
-        details["approved_properties_count"] = f"error: {str(e)}"
+    details["caches"] = cache_stats()
+    details["property_search_paths"] = search_path_stats()
+    write_behind = get_write_behind()
+    details["write_behind"] = write_behind.stats() if write_behind else "disabled"
+    details["startup"] = {**startup_report, "embeddings": embedding_status()}
     return details
@@ -1,19 +1,22 @@
-from .tenant_profile import Base, TenantPreference, RecommendationLog
+from .tenant_profile import Base, TenantPreference, RecommendationLog, FeedbackAggregate
 from .user import User
 from .payment import Payment
 from .property import Property
 from .refresh_token import RefreshToken
-from .saved_search import SavedSearch
+from .saved_search import SavedSearch, SavedSearchRefreshState, SavedSearchResult
 from .password_reset import PasswordReset
 
 __all__ = [
     "Base",
     "TenantPreference",
     "RecommendationLog",
+    "FeedbackAggregate",
     "User",
     "Payment",
     "Property",
     "RefreshToken",
     "SavedSearch",
+    "SavedSearchResult",
+    "SavedSearchRefreshState",
     "PasswordReset",
 ]
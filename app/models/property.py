@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Numeric, DateTime, ForeignKey, Text, JSON, Float
+from sqlalchemy import Column, String, Numeric, DateTime, ForeignKey, Text, JSON, Float, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR # TSVECTOR for fts
 from sqlalchemy.orm import relationship
 from .tenant_profile import Base # Assuming Base is still imported from here
@@ -26,6 +26,7 @@ class Property(Base):
     payment_id = Column(UUID(as_uuid=True), ForeignKey("payments.id"), unique=True) # Foreign key to payments.id
     payment_status = Column(String, nullable=False)
     approval_timestamp = Column(DateTime)
+    random_key = Column(Float, nullable=False, server_default=text("random()")) # Uniform sampling key for random search tiers
 
     # Relationships
     user = relationship("User", backref="properties")
@@ -1,7 +1,7 @@
 import uuid # For UUID type, even if not default
 from datetime import datetime
 from sqlalchemy import Column, Integer, String, Float, ARRAY, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID # For user_id if it's UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID # For user_id if it's UUID
 from sqlalchemy.orm import relationship
 from .tenant_profile import Base # Assuming Base is still imported from here
 
@@ -21,3 +21,22 @@ class SavedSearch(Base):
 
     # Relationships
     user = relationship("User", backref="saved_searches")
+
+
+class SavedSearchResult(Base):
+    """Precomputed ranked matches for one saved search, kept current by the refresh worker."""
+    __tablename__ = "SavedSearchResults"
+
+    saved_search_id = Column(Integer, ForeignKey("SavedSearches.id", ondelete="CASCADE"), primary_key=True)
+    recommendations = Column(JSONB, nullable=False)
+    fingerprint = Column(String(64), nullable=False) # hash of criteria + matching rows at refresh time
+    refreshed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class SavedSearchRefreshState(Base):
+    """Properties snapshot the last completed refresh pass applied; one row (id 1) shared by every worker."""
+    __tablename__ = "SavedSearchRefreshState"
+
+    id = Column(Integer, primary_key=True)
+    properties_updated_at = Column(DateTime(timezone=True), nullable=False) # max(properties.updated_at)
+    properties_count = Column(Integer, nullable=False) # count(*) of properties, to notice hard deletes
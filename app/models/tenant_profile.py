@@ -25,3 +25,12 @@ class RecommendationLog(Base):
     recommendation = Column(JSONB)
     feedback = Column(JSONB)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class FeedbackAggregate(Base):
+    """Running like/dislike counts per tenant preference, user or property, updated as feedback arrives."""
+    __tablename__ = "FeedbackAggregates"
+    scope = Column(String(16), primary_key=True) # "preference", "user" or "property"
+    key = Column(String(64), primary_key=True)
+    liked = Column(Integer, nullable=False, default=0)
+    disliked = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
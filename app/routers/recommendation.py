@@ -1,19 +1,25 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List
-from app.schemas.recommendation import RecommendationRequest, RecommendationResponse
+from app.schemas.recommendation import BatchRecommendationRequest, RecommendationRequest, RecommendationResponse
 from app.schemas.property_search import PropertySearchRequest, PropertySearchResponse
-from app.services.langgraph_agent import run_recommendation_agent
-from app.services.rag import save_tenant_preference
+from app.services.langgraph_agent import run_recommendation_agent, run_recommendation_agent_batch, stream_recommendation_agent, to_jsonable
+from app.services.rag import save_tenant_preference, save_tenant_preferences
 from app.config import settings
-from app.services.property_search import generate_sql_query, execute_sql_query
+from app.services.property_search import translate_query, execute_sql_query
+from app.services.saved_search import get_saved_search_results
+from app.services.feedback import record_feedback
+from app.services.write_behind import WriteBehindError, flush_pending_writes
 from app.dependencies.auth import get_current_user
-from app.database import get_session
+from app.database import AsyncSessionFactory, get_session
 from structlog import get_logger
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.tenant_profile import RecommendationLog, TenantPreference
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
 logger = get_logger()
 router = APIRouter(prefix="/api/v1", tags=["recommendation"])
@@ -47,6 +53,90 @@ async def get_recommendations(request: RecommendationRequest, user_coroutine: di
         logger.error("Recommendation failed", user_id=user["user_id"], error=str(e))
         raise HTTPException(status_code=500, detail="Recommendation failed")
 
+@router.post("/recommendations/batch", response_model=dict, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def get_batch_recommendations(batch: BatchRecommendationRequest, user_coroutine: dict = Depends(get_current_user), db: AsyncSession = Depends(get_session)):
+    """
+    Recommendations for several tenant profiles in one call. Results come back in request
+    order; a profile that failed carries an "error" message and "error_code" instead of
+    "recommendations".
+    """
+    user = await user_coroutine
+    if user["role"].lower() != "tenant":
+        raise HTTPException(status_code=403, detail="Only Tenants can get recommendations")
+    if not batch.requests:
+        return {"results": []}
+    if len(batch.requests) > settings.BATCH_MAX_PROFILES:
+        raise HTTPException(status_code=422, detail=f"At most {settings.BATCH_MAX_PROFILES} profiles per batch")
+    try:
+        tenant_preference_ids = await save_tenant_preferences(user["user_id"], batch.requests, db)
+        results = await run_recommendation_agent_batch(
+            [
+                {
+                    "tenant_preference_id": tenant_preference_id,
+                    "user_id": user["user_id"],
+                    "job_school_location": request.job_school_location,
+                    "salary": request.salary,
+                    "house_type": request.house_type,
+                    "family_size": request.family_size,
+                    "preferred_amenities": request.preferred_amenities,
+                    "language": request.language,
+                }
+                for tenant_preference_id, request in zip(tenant_preference_ids, batch.requests)
+            ],
+            AsyncSessionFactory,
+        )
+    except Exception as e:
+        logger.error("Batch recommendation failed", user_id=user["user_id"], error=str(e))
+        raise HTTPException(status_code=500, detail="Recommendation failed")
+    for result, request in zip(results, batch.requests):
+        result["total_budget_suggestion"] = request.salary * 0.3
+    logger.info("Batch recommendations generated", user_id=user["user_id"], count=len(results))
+    return {"results": results}
+
+def _sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], default=to_jsonable)}\n\n"
+
+@router.post("/recommendations/stream", dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def stream_recommendations(request: RecommendationRequest, user_coroutine: dict = Depends(get_current_user), db: AsyncSession = Depends(get_session)):
+    """Server-sent events version of POST /recommendations; see `stream_recommendation_agent` for the events."""
+    user = await user_coroutine
+    if user["role"].lower() != "tenant":
+        raise HTTPException(status_code=403, detail="Only Tenants can get recommendations")
+    try:
+        tenant_preference_id = await save_tenant_preference(user["user_id"], request, db)
+    except Exception as e:
+        logger.error("Recommendation failed", user_id=user["user_id"], error=str(e))
+        raise HTTPException(status_code=500, detail="Recommendation failed")
+
+    async def events():
+        yield _sse({"event": "accepted", "data": {
+            "tenant_preference_id": tenant_preference_id,
+            "total_budget_suggestion": request.salary * 0.3,
+        }})
+        async for event in stream_recommendation_agent(
+            tenant_preference_id=tenant_preference_id,
+            user_id=user["user_id"],
+            job_school_location=request.job_school_location,
+            salary=request.salary,
+            house_type=request.house_type,
+            family_size=request.family_size,
+            preferred_amenities=request.preferred_amenities,
+            language=request.language,
+            db=db
+        ):
+            yield _sse(event)
+        logger.info("Recommendations streamed", user_id=user["user_id"], tenant_preference_id=tenant_preference_id)
+
+    # Disable proxy buffering so events reach the client as they are produced
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _read_your_writes(tenant_preference_id: int | None = None) -> None:
+    # Write queued preference/log rows before reading them back; on failure serve what is stored
+    try:
+        await flush_pending_writes(tenant_preference_id)
+    except WriteBehindError as e:
+        logger.warning("Reading recommendations before queued rows were written", error=str(e))
+
 def _normalize_rec_item(item: dict) -> dict:
     # Map id -> property_id and coerce price to float; keep optional fields if present
     rec = dict(item)
@@ -76,6 +166,7 @@ def _normalize_rec_item(item: dict) -> dict:
 @router.get("/recommendations/latest", response_model=List[dict])
 async def get_latest_recommendations(user_coroutine: dict = Depends(get_current_user), db: AsyncSession = Depends(get_session)):
     user = await user_coroutine
+    await _read_your_writes()
     stmt = (
         select(RecommendationLog.recommendation)
         .join(TenantPreference, TenantPreference.id == RecommendationLog.tenant_preference_id)
@@ -93,10 +184,24 @@ async def get_latest_recommendations(user_coroutine: dict = Depends(get_current_
         logger.error("Failed to fetch latest recommendations", error=str(e))
         return []
 
+# Precomputed matches for one of the current user's saved searches
+@router.get("/saved-searches/{saved_search_id}/recommendations", response_model=dict)
+async def get_saved_search_recommendations(saved_search_id: int, user_coroutine: dict = Depends(get_current_user), db: AsyncSession = Depends(get_session)):
+    user = await user_coroutine
+    try:
+        results = await get_saved_search_results(user["user_id"], saved_search_id, db)
+    except Exception as e:
+        logger.error("Failed to fetch saved search results", saved_search_id=saved_search_id, error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to fetch saved search results")
+    if results is None:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    return results
+
 # All recommendation logs for the current user with metadata
 @router.get("/recommendations/mine", response_model=List[dict])
 async def get_all_my_recommendation_logs(user_coroutine: dict = Depends(get_current_user), db: AsyncSession = Depends(get_session)):
     user = await user_coroutine
+    await _read_your_writes()
     stmt = (
         select(
             RecommendationLog.tenant_preference_id,
@@ -129,6 +234,7 @@ async def get_saved_recommendations(tenant_preference_id: int, user_coroutine: d
     user = await user_coroutine # Await the user coroutine
     if user["role"].lower() != "tenant":
         raise HTTPException(status_code=403, detail="Only Tenants can view recommendations")
+    await _read_your_writes(tenant_preference_id)
     # Get the latest log for this tenant_preference_id
     stmt = (
         select(RecommendationLog.recommendation)
@@ -150,9 +256,13 @@ async def feedback(request: dict, user_coroutine: dict = Depends(get_current_use
     # Feedback is allowed; it writes to logs, not base property data
     if "tenant_preference_id" not in request or "property_id" not in request or "liked" not in request:
         raise HTTPException(status_code=422, detail="Missing required fields")
-    log = RecommendationLog(tenant_preference_id=request["tenant_preference_id"], feedback=request)
-    db.add(log)
-    await db.commit()
+    try:
+        await record_feedback(db, user["user_id"], request)
+    except WriteBehindError as e:
+        logger.error("Feedback deferred preference not written", tenant_preference_id=request["tenant_preference_id"], error=str(e))
+        raise HTTPException(status_code=503, detail="Feedback could not be recorded, please retry")
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Recommendation not found")
     return {"message": "Feedback recorded"}
 
 @router.post("/properties/search", response_model=PropertySearchResponse)
@@ -161,8 +271,8 @@ async def search_properties(request: PropertySearchRequest, user_coroutine: dict
     if user["role"] not in ["Tenant", "Landlord"]: # Allow both tenants and landlords to search
         raise HTTPException(status_code=403, detail="Only Tenants and Landlords can search properties")
     try:
-        sql_query = await generate_sql_query(request.query)
-        properties = await execute_sql_query(sql_query, db)
+        sql_query, params = await translate_query(request.query, db)
+        properties = await execute_sql_query(sql_query, db, params)
         logger.info("Property search executed", user_id=user["user_id"], query=request.query, result_count=len(properties))
         return PropertySearchResponse(results=properties)
     except ValueError as ve:
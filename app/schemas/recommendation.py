@@ -21,6 +21,9 @@ class RecommendationRequest(BaseModel):
             }
         }
 
+class BatchRecommendationRequest(BaseModel):
+    requests: List[RecommendationRequest]
+
 class RecommendationResponse(BaseModel):
     property_id: str
     title: str
@@ -0,0 +1,137 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from structlog import get_logger
+
+from app.config import settings
+
+logger = get_logger()
+
+_ROW_DTYPE = np.float32
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, append-only embedding store on disk.
+
+    Vectors live in one raw float32 file opened as a read-only memmap, so every worker on
+    the host shares the same page-cache copy; `keys.txt` holds one text hash per row.
+    Appends take an exclusive file lock and write vectors before keys, so a reader never
+    sees a key without its row. Entries are scoped to one model via the directory name.
+    """
+
+    def __init__(self, directory: str, model_name: str):
+        self.model_name = model_name
+        self.path = os.path.join(directory, hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.txt")
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._lock_path = os.path.join(self.path, ".lock")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+        self._keys_offset = 0
+        self._matrix: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _refresh(self) -> None:
+        # Pick up rows appended since the last read, by this or another worker
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as f:
+                self.dim = int(json.load(f)["dim"])
+        size = os.path.getsize(self._keys_path) if os.path.exists(self._keys_path) else 0
+        if size <= self._keys_offset:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read(size - self._keys_offset)
+        data = data[:data.rfind(b"\n") + 1]  # complete lines only
+        for line in data.splitlines():
+            self._rows.setdefault(line.decode("ascii"), self._count)
+            self._count += 1
+        self._keys_offset += len(data)
+        if self._count and self.dim:
+            self._matrix = np.memmap(self._vectors_path, dtype=_ROW_DTYPE, mode="r", shape=(self._count, self.dim))
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        with open(self._lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(self._meta_path):
+                with open(self._meta_path, "w") as f:
+                    json.dump({"model": self.model_name, "dim": int(vectors.shape[1])}, f)
+                self.dim = int(vectors.shape[1])
+            rows = 0
+            if os.path.exists(self._keys_path):
+                with open(self._keys_path, "rb") as f:
+                    rows = f.read().count(b"\n")
+            with open(self._vectors_path, "ab") as f:
+                # Drop vectors orphaned by a writer that died before recording their keys
+                f.truncate(rows * self.dim * np.dtype(_ROW_DTYPE).itemsize)
+                f.write(np.ascontiguousarray(vectors, dtype=_ROW_DTYPE).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(("\n".join(keys) + "\n").encode("ascii"))
+
+    def embed(
+        self,
+        texts: List[str],
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        batch_size: int = 64,
+    ) -> List[List[float]]:
+        """Vectors for `texts`, embedding (in batches) and storing only the ones not on disk."""
+        keys = [self.key(t) for t in texts]
+        with self._lock:
+            self._refresh()
+            missing: Dict[str, str] = {}
+            for k, t in zip(keys, texts):
+                if k not in self._rows and k not in missing:
+                    missing[k] = t
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            pending = list(missing)
+            for start in range(0, len(pending), max(1, batch_size)):
+                batch = pending[start:start + batch_size]
+                vectors = np.asarray(embed_fn([missing[k] for k in batch]), dtype=_ROW_DTYPE)
+                self._append(batch, vectors)
+            if pending:
+                self._refresh()
+            if not keys:
+                return []
+            return np.asarray(self._matrix[[self._rows[k] for k in keys]]).tolist()
+
+    def stats(self) -> Dict[str, int]:
+        return {"rows": self._count, "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Shared embedding cache for the configured model, or None when EMBEDDING_CACHE_DIR is unset."""
+    global _cache
+    if not settings.EMBEDDING_CACHE_DIR:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache(settings.EMBEDDING_CACHE_DIR, settings.EMBEDDING_MODEL_NAME)
+                except OSError as e:
+                    logger.warning("Embedding cache unavailable", path=settings.EMBEDDING_CACHE_DIR, error=str(e))
+                    return None
+    return _cache
@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.tenant_profile import FeedbackAggregate, RecommendationLog
+from app.services.write_behind import flush_pending_writes
+
+PREFERENCE, USER, PROPERTY = "preference", "user", "property"
+
+
+def parse_liked(value) -> bool:
+    """The feedback body is untyped: only true/"true"/1/"1" count as a like, as in the counter backfill."""
+    return str(value).strip().lower() in ("true", "1")
+
+
+async def record_feedback(db: AsyncSession, user_id: str, feedback: Dict) -> None:
+    """
+    Store one feedback click: the raw RecommendationLogs row plus an atomic increment of
+    the preference, user and property counters, committed together.
+    """
+    # The preference may still be in the write-behind queue; it must exist before its log row
+    await flush_pending_writes(feedback["tenant_preference_id"])
+    liked = parse_liked(feedback["liked"])
+    now = datetime.utcnow()
+    rows = [
+        {"scope": scope, "key": str(key), "liked": int(liked), "disliked": int(not liked), "updated_at": now}
+        for scope, key in ((PREFERENCE, feedback["tenant_preference_id"]), (USER, user_id), (PROPERTY, feedback["property_id"]))
+    ]
+    stmt = insert(FeedbackAggregate).values(rows)
+    db.add(RecommendationLog(tenant_preference_id=feedback["tenant_preference_id"], feedback=feedback))
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[FeedbackAggregate.scope, FeedbackAggregate.key],
+        set_={
+            "liked": FeedbackAggregate.liked + stmt.excluded.liked,
+            "disliked": FeedbackAggregate.disliked + stmt.excluded.disliked,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+    await db.commit()
+
+
+async def get_feedback_counts(db: AsyncSession, scope: str, key) -> Tuple[int, int]:
+    """(liked, disliked) for one preference, user or property; a single primary-key lookup."""
+    row = (await db.execute(
+        select(FeedbackAggregate.liked, FeedbackAggregate.disliked)
+        .where(FeedbackAggregate.scope == scope, FeedbackAggregate.key == str(key))
+    )).one_or_none()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+async def get_property_popularity(db: AsyncSession, property_ids: Iterable) -> Dict[str, Dict[str, float]]:
+    """
+    Popularity per property id: raw counts and a smoothed like rate (one prior like and
+    one prior dislike), so properties with little feedback stay near 0.5.
+    """
+    keys = [str(pid) for pid in property_ids]
+    if not keys:
+        return {}
+    result = await db.execute(
+        select(FeedbackAggregate.key, FeedbackAggregate.liked, FeedbackAggregate.disliked)
+        .where(FeedbackAggregate.scope == PROPERTY, FeedbackAggregate.key.in_(keys))
+    )
+    counts = {key: (liked, disliked) for key, liked, disliked in result.all()}
+    popularity = {}
+    for key in keys:
+        liked, disliked = counts.get(key, (0, 0))
+        popularity[key] = {"liked": liked, "disliked": disliked, "like_rate": (liked + 1) / (liked + disliked + 2)}
+    return popularity
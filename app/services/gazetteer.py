@@ -0,0 +1,224 @@
+import bisect
+import difflib
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from structlog import get_logger
+
+from app.config import settings
+from app.services.route_index import RouteIndex, get_route_index
+
+logger = get_logger()
+
+# Well-known places seeded before data sources, so common districts resolve even when
+# neither the route data nor the properties table mention them
+BUILTIN_PLACES: Dict[str, Tuple[float, float]] = {
+    "Addis Ababa": (9.0108, 38.7613),
+    "Bole": (8.9956, 38.7896),
+    "Piazza": (9.0336, 38.7506),
+    "Mexico": (9.0105, 38.7454),
+    "Sarbet": (8.9953, 38.7365),
+    "CMC": (9.0211, 38.8455),
+    "Megenagna": (9.0200, 38.8011),
+    "Merkato": (9.0353, 38.7380),
+    "Kazanchis": (9.0139, 38.7681),
+    "Adama": (8.5400, 39.2700),
+}
+
+# Amharic (Ge'ez script) and Afaan Oromo spellings mapped to the canonical place name
+ALIASES: Dict[str, str] = {
+    "አዲስ አበባ": "Addis Ababa",
+    "ፊንፊኔ": "Addis Ababa",
+    "Finfinnee": "Addis Ababa",
+    "Addis": "Addis Ababa",
+    "ቦሌ": "Bole",
+    "Boolee": "Bole",
+    "ፒያሳ": "Piazza",
+    "Piassa": "Piazza",
+    "Piyaassaa": "Piazza",
+    "ሜክሲኮ": "Mexico",
+    "ሳር ቤት": "Sarbet",
+    "ሳርቤት": "Sarbet",
+    "ሲኤምሲ": "CMC",
+    "መገናኛ": "Megenagna",
+    "Megenya": "Megenagna",
+    "መርካቶ": "Merkato",
+    "Mercato": "Merkato",
+    "ካዛንቺስ": "Kazanchis",
+    "አዳማ": "Adama",
+    "Adaamaa": "Adama",
+    "Nazret": "Adama",
+    "Nazareth": "Adama",
+    "ናዝሬት": "Adama",
+    "ፖስታ": "Posta",
+    "ሃራምቤ": "Harambee",
+}
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACE = re.compile(r"\s+")
+_REPEAT = re.compile(r"(.)\1+")
+
+
+def normalize(name: str) -> str:
+    """Case-folded, punctuation-free, whitespace-collapsed form of a place name."""
+    name = unicodedata.normalize("NFKC", name or "").casefold()
+    return _SPACE.sub(" ", _PUNCT.sub(" ", name)).strip()
+
+
+def fold(name: str) -> str:
+    """
+    Spelling-insensitive key: doubled letters collapsed, so Afaan Oromo long vowels and
+    geminates ("Adaamaa", "Finfinnee") meet their English spellings.
+    """
+    return _REPEAT.sub(r"\1", normalize(name))
+
+
+@dataclass(frozen=True)
+class GeoMatch:
+    name: str
+    lat: float
+    lon: float
+    confidence: float
+    method: str
+
+
+class Gazetteer:
+    """
+    Immutable place-name index built once from property locations, the builtin places and
+    transport stops. Lookups try, in order: normalized name (exact, then spelling-folded),
+    alias, token/prefix match and finally fuzzy match, and are memoized per instance.
+    """
+
+    def __init__(self, sources: Iterable[Iterable[Tuple[str, float, float, float]]]):
+        # Sources are in priority order: a name claimed by one source is not averaged with
+        # same-named places from later ones (e.g. a "Bole" stop in another city)
+        sums: Dict[str, List[float]] = {}
+        names: Dict[str, str] = {}
+        for places in sources:
+            claimed = set(sums)
+            for name, lat, lon, weight in places:
+                key = fold(name)
+                if not key or key in claimed or lat is None or lon is None or weight <= 0:
+                    continue
+                acc = sums.setdefault(key, [0.0, 0.0, 0.0])
+                acc[0] += lat * weight
+                acc[1] += lon * weight
+                acc[2] += weight
+                names.setdefault(key, name)
+        self._places: Dict[str, Tuple[str, float, float]] = {
+            key: (names[key], acc[0] / acc[2], acc[1] / acc[2]) for key, acc in sums.items()
+        }
+        self._aliases: Dict[str, str] = {fold(a): fold(c) for a, c in ALIASES.items() if fold(c) in self._places}
+        self._sorted_keys: List[str] = sorted(self._places)
+        tokens: Dict[str, List[str]] = {}
+        for key in self._sorted_keys:
+            for token in set(key.split()):
+                tokens.setdefault(token, []).append(key)
+        self._tokens: Dict[str, Tuple[str, ...]] = {t: tuple(keys) for t, keys in tokens.items()}
+        self.lookup = lru_cache(maxsize=settings.GEOCODE_MEMO_SIZE)(self._lookup)
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def _match(self, key: str, confidence: float, method: str) -> GeoMatch:
+        name, lat, lon = self._places[key]
+        return GeoMatch(name=name, lat=lat, lon=lon, confidence=round(confidence, 3), method=method)
+
+    def _token_match(self, query: str) -> Optional[GeoMatch]:
+        q_tokens = set(query.split())
+        overlap: Dict[str, int] = {}
+        for token in q_tokens:
+            for key in self._tokens.get(token, ()):
+                overlap[key] = overlap.get(key, 0) + 1
+        if not overlap:
+            return None
+        # Score by coverage of both the query and the place name; ties go to the shorter name
+        key, score = max(
+            ((k, (n / len(q_tokens) + n / len(k.split())) / 2) for k, n in overlap.items()),
+            key=lambda item: (item[1], -len(item[0])),
+        )
+        return self._match(key, 0.85 * score, "token")
+
+    def _prefix_match(self, query: str) -> Optional[GeoMatch]:
+        start = bisect.bisect_left(self._sorted_keys, query)
+        best = None
+        for key in self._sorted_keys[start:start + 50]:
+            if not key.startswith(query):
+                break
+            if best is None or len(key) < len(best):
+                best = key
+        if best is None:
+            return None
+        return self._match(best, 0.85 * len(query) / len(best), "prefix")
+
+    def _lookup(self, location: str) -> Optional[GeoMatch]:
+        raw = normalize(location)
+        key = fold(location)
+        if not key:
+            return None
+        if key in self._places:
+            if raw == normalize(self._places[key][0]):
+                return self._match(key, 1.0, "exact")
+            return self._match(key, 0.95, "spelling")
+        if key in self._aliases:
+            return self._match(self._aliases[key], 0.95, "alias")
+        candidates = [m for m in (self._token_match(key), self._prefix_match(key)) if m is not None]
+        if candidates:
+            return max(candidates, key=lambda m: m.confidence)
+        close = difflib.get_close_matches(key, self._sorted_keys, n=1, cutoff=0.75)
+        if close:
+            ratio = difflib.SequenceMatcher(None, key, close[0]).ratio()
+            return self._match(close[0], 0.8 * ratio, "fuzzy")
+        return None
+
+    @classmethod
+    def build(
+        cls,
+        route_index: RouteIndex,
+        property_locations: Iterable[Tuple[str, float, float, int]] = (),
+    ) -> "Gazetteer":
+        properties = [(name, lat, lon, float(count)) for name, lat, lon, count in property_locations]
+        builtins = [(name, lat, lon, 1.0) for name, (lat, lon) in BUILTIN_PLACES.items()]
+        stops = []
+        for r in route_index.routes:
+            stops.append((r.source, r.source_lat, r.source_lon, 1.0))
+            stops.append((r.destination, r.dest_lat, r.dest_lon, 1.0))
+        return cls([properties, builtins, stops])
+
+
+async def load_property_locations(db: AsyncSession) -> List[Tuple[str, float, float, int]]:
+    result = await db.execute(text(
+        "SELECT location, AVG(lat), AVG(lon), COUNT(*) FROM properties "
+        "WHERE status = 'APPROVED' AND lat IS NOT NULL AND lon IS NOT NULL AND location IS NOT NULL "
+        "GROUP BY location"
+    ))
+    return [(loc, float(lat), float(lon), int(n)) for loc, lat, lon, n in result.fetchall()]
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    """Return the shared gazetteer, building it from builtins and route stops on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.build(get_route_index())
+    return _gazetteer
+
+
+async def refresh_gazetteer(db: AsyncSession) -> Gazetteer:
+    """Rebuild the shared gazetteer including property locations and swap it in."""
+    global _gazetteer
+    gazetteer = Gazetteer.build(get_route_index(), await load_property_locations(db))
+    _gazetteer = gazetteer
+    logger.info("Gazetteer built", places=len(gazetteer))
+    return gazetteer
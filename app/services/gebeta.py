@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Optional, List, Tuple, Dict, Any
 
@@ -7,6 +8,9 @@ from pybreaker import CircuitBreaker
 
 from app.config import settings
 from app.utils.retry import retry_api
+from app.core.http_clients import get_http_client
+from app.utils.cache import TieredCache
+from app.services.road_estimator import get_road_estimator
 
 logger = get_logger(__name__)
 breaker = CircuitBreaker(fail_max=3, reset_timeout=60)
@@ -23,9 +27,102 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+# Per-pair distances (meters) keyed by rounded origin/destination coordinates
+matrix_cache = TieredCache(
+    "gebeta_matrix",
+    maxsize=settings.MATRIX_CACHE_MAX_ENTRIES,
+    ttl=settings.MATRIX_CACHE_TTL_SECONDS,
+    use_redis=settings.MATRIX_CACHE_REDIS,
+)
+
+def valid_pair(a: float, b: float) -> bool:
+    try:
+        return -90.0 <= float(a) <= 90.0 and -180.0 <= float(b) <= 180.0
+    except Exception:
+        return False
+
+def _pair_key(o_lat: float, o_lon: float, d_lat: float, d_lon: float) -> str:
+    op, dp = settings.MATRIX_CACHE_ORIGIN_PRECISION, settings.MATRIX_CACHE_DEST_PRECISION
+    return f"{round(o_lat, op)},{round(o_lon, op)}:{round(d_lat, dp)},{round(d_lon, dp)}"
+
+
+async def get_matrix_batch(
+    lat: float,
+    lon: float,
+    destinations: Dict[str, Tuple[float, float]],
+) -> Dict[str, float]:
+    """
+    Road distances in meters from the origin to any number of destinations keyed by id
+    (e.g. property id). Cached pairs are served locally; the rest are split into
+    provider-sized chunks (GEBETA_MAX_WAYPOINTS) fetched concurrently under
+    GEBETA_MATRIX_CONCURRENCY. Ids with invalid coordinates, no provider path or a failed
+    chunk are omitted; a chunk error is raised only when no distance is known at all.
+    """
+    try:
+        o_lat, o_lon = float(lat), float(lon)
+    except Exception:
+        raise ValueError("Origin coordinates invalid")
+    valid = {
+        key: (float(d[0]), float(d[1])) for key, d in destinations.items()
+        if isinstance(d, (list, tuple)) and len(d) == 2 and valid_pair(d[0], d[1])
+    }
+    if not valid:
+        raise ValueError("No valid destination coordinates for ONM")
+    pair_keys = {key: _pair_key(o_lat, o_lon, *coords) for key, coords in valid.items()}
+    distances: Dict[str, float] = {}
+    missing: List[str] = []
+    for key, pair_key in pair_keys.items():
+        cached = await matrix_cache.get(pair_key)
+        if cached is None:
+            missing.append(key)
+        else:
+            distances[key] = cached
+
+    size = max(1, settings.GEBETA_MAX_WAYPOINTS)
+    chunks = [missing[i:i + size] for i in range(0, len(missing), size)]
+    semaphore = asyncio.Semaphore(max(1, settings.GEBETA_MATRIX_CONCURRENCY))
+    estimator = get_road_estimator()
+    async def fetch_chunk(chunk: List[str]) -> List[Dict[str, float]]:
+        async with semaphore:
+            return await _fetch_matrix(o_lat, o_lon, [valid[key] for key in chunk])
+    results = await asyncio.gather(*(fetch_chunk(c) for c in chunks), return_exceptions=True)
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if chunks and len(errors) == len(chunks) and not distances:
+        raise errors[0]
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, BaseException):
+            logger.warning("ONM matrix chunk failed", size=len(chunk), error=str(result))
+            continue
+        for key, item in zip(chunk, result):
+            # Zero means the provider returned no path for this pair; leave it to the caller's fallback
+            if item["distance"] > 0:
+                distances[key] = item["distance"]
+                await matrix_cache.set(pair_keys[key], item["distance"])
+                estimator.observe(o_lat, o_lon, *valid[key], item["distance"])
+    if missing:
+        logger.debug("ONM matrix fetched", cached=len(valid) - len(missing), fetched=len(missing), chunks=len(chunks), failed_chunks=len(errors))
+    return distances
+
+
+async def get_matrix(
+    lat: float,
+    lon: float,
+    destinations: List[Tuple[float, float]],
+) -> Optional[List[Dict[str, float]]]:
+    """
+    List form of `get_matrix_batch`: one {"distance": meters} dict per valid destination,
+    in input order (0.0 where no distance is available).
+    """
+    keyed = {str(i): d for i, d in enumerate(destinations)
+             if isinstance(d, (list, tuple)) and len(d) == 2 and valid_pair(d[0], d[1])}
+    distances = await get_matrix_batch(lat, lon, keyed)
+    return [{"distance": distances.get(key, 0.0)} for key in keyed]
+
+
 @retry_api(tries=3, delay=1, backoff=2)
 @breaker
-async def get_matrix(
+async def _fetch_matrix(
     lat: float,
     lon: float,
     destinations: List[Tuple[float, float]],
@@ -35,19 +132,13 @@ async def get_matrix(
     Raises AuthError for 401/403 (no retries). Raises RequestError for network transient errors.
     """
     url = f"{API_BASE}{ONM_PATH}"
-    # Sanitize coordinates
-    def valid_pair(a: float, b: float) -> bool:
-        try:
-            return -90.0 <= float(a) <= 90.0 and -180.0 <= float(b) <= 180.0
-        except Exception:
-            return False
     try:
         o_lat = round(float(lat), 6)
         o_lon = round(float(lon), 6)
     except Exception:
         raise ValueError("Origin coordinates invalid")
-    # Enforce waypoint limit per provider docs (<= 10)
-    max_waypoints = 10
+    # Enforce waypoint limit per provider docs (<= 10); get_matrix_batch chunks larger requests
+    max_waypoints = settings.GEBETA_MAX_WAYPOINTS
     dest_list = []
     for d in destinations[:max_waypoints]:
         if isinstance(d, (list, tuple)) and len(d) == 2 and valid_pair(d[0], d[1]):
@@ -63,67 +154,67 @@ async def get_matrix(
     base_params = {"origin": f"{o_lat},{o_lon}", "apiKey": settings.GEBETA_API_KEY}
 
     try:
-        async with httpx.AsyncClient() as client:
-            # Try doc-style first
-            params_a = {**base_params, "json": doc_style}
-            resp = await client.get(url, params=params_a, timeout=15.0, follow_redirects=True)
+        client = get_http_client("gebeta")
+        # Try doc-style first
+        params_a = {**base_params, "json": doc_style}
+        resp = await client.get(url, params=params_a, follow_redirects=True)
+        status = resp.status_code
+        text = resp.text
+
+        if status in (401, 403):
+            # try to extract provider message
+            try:
+                j = resp.json()
+                provider_msg = (j.get("error") or {}).get("message") or j.get("message") or json.dumps(j)
+            except Exception:
+                provider_msg = text or f"HTTP {status}"
+            logger.error("ONM auth error", status_code=status, text=provider_msg)
+            raise AuthError(message=f"ONM auth error: {provider_msg}", status_code=status)
+
+        if status == 422 or status == 400:
+            # Fallback to JSON object style
+            params_b = {**base_params, "json": json_style}
+            resp = await client.get(url, params=params_b, follow_redirects=True)
             status = resp.status_code
             text = resp.text
+        if status != 200:
+            logger.error("ONM API failed", status_code=status, text=text)
+            raise ValueError(f"ONM API failed with status {status}")
 
-            if status in (401, 403):
-                # try to extract provider message
+        onm_response = resp.json()
+        distances: List[Dict[str, float]] = []
+        if isinstance(onm_response, dict) and "directions" in onm_response and isinstance(onm_response["directions"], list):
+            # Legacy/alternative format with 'directions'
+            for direction in onm_response["directions"]:
+                dist = direction.get("totalDistance") or direction.get("distance") or 0
+                try:
+                    dist = float(dist)
+                except Exception:
+                    dist = 0.0
+                distances.append({"distance": dist})
+        elif isinstance(onm_response, dict) and "origin_to_destination" in onm_response:
+            # Matrix format: origins/destinations + origin_to_destination
+            o2d = onm_response.get("origin_to_destination") or []
+            # Build a map (from_idx, to_idx) -> distance_km
+            matrix = {}
+            for entry in o2d:
                 try:
-                    j = resp.json()
-                    provider_msg = (j.get("error") or {}).get("message") or j.get("message") or json.dumps(j)
+                    f = int(entry.get("from", 0))
+                    t = int(entry.get("to", 0))
+                    d_km = float(entry.get("distance", 0.0))
                 except Exception:
-                    provider_msg = text or f"HTTP {status}"
-                logger.error("ONM auth error", status_code=status, text=provider_msg)
-                raise AuthError(message=f"ONM auth error: {provider_msg}", status_code=status)
-
-            if status == 422 or status == 400:
-                # Fallback to JSON object style
-                params_b = {**base_params, "json": json_style}
-                resp = await client.get(url, params=params_b, timeout=15.0, follow_redirects=True)
-                status = resp.status_code
-                text = resp.text
-            if status != 200:
-                logger.error("ONM API failed", status_code=status, text=text)
-                raise ValueError(f"ONM API failed with status {status}")
-
-            onm_response = resp.json()
-            distances: List[Dict[str, float]] = []
-            if isinstance(onm_response, dict) and "directions" in onm_response and isinstance(onm_response["directions"], list):
-                # Legacy/alternative format with 'directions'
-                for direction in onm_response["directions"]:
-                    dist = direction.get("totalDistance") or direction.get("distance") or 0
-                    try:
-                        dist = float(dist)
-                    except Exception:
-                        dist = 0.0
-                    distances.append({"distance": dist})
-            elif isinstance(onm_response, dict) and "origin_to_destination" in onm_response:
-                # Matrix format: origins/destinations + origin_to_destination
-                o2d = onm_response.get("origin_to_destination") or []
-                # Build a map (from_idx, to_idx) -> distance_km
-                matrix = {}
-                for entry in o2d:
-                    try:
-                        f = int(entry.get("from", 0))
-                        t = int(entry.get("to", 0))
-                        d_km = float(entry.get("distance", 0.0))
-                    except Exception:
-                        continue
-                    matrix[(f, t)] = d_km
-                # We have single origin (index 0). Map to each destination index in our list order.
-                for idx in range(len(dest_list)):
-                    d_km = matrix.get((0, idx), 0.0)
-                    # Convert km -> meters to keep internal convention
-                    distances.append({"distance": d_km * 1000.0})
-            else:
-                logger.error("ONM API response missing expected keys", response=onm_response)
-                raise ValueError("ONM API response invalid")
-
-            return distances
+                    continue
+                matrix[(f, t)] = d_km
+            # We have single origin (index 0). Map to each destination index in our list order.
+            for idx in range(len(dest_list)):
+                d_km = matrix.get((0, idx), 0.0)
+                # Convert km -> meters to keep internal convention
+                distances.append({"distance": d_km * 1000.0})
+        else:
+            logger.error("ONM API response missing expected keys", response=onm_response)
+            raise ValueError("ONM API response invalid")
+
+        return distances
 
     except httpx.RequestError as exc:
         logger.exception("HTTPX request error during ONM call", exc_info=exc)
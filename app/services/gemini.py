@@ -1,14 +1,36 @@
+import asyncio
 import google.generativeai as genai
+from typing import AsyncIterator
 from app.config import settings
 from structlog import get_logger
 from pybreaker import CircuitBreaker
-from app.services.promttemplet import build_reason_prompt
+from app.services.promttemplet import LANG_MAP, build_reason_prompt
+from app.services.reason_cache import reason_cache, reason_cache_key
 
 logger = get_logger()
 breaker = CircuitBreaker(fail_max=3, reset_timeout=60)
 
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
+_models: dict = {}
+# Reason models in order of preference
+REASON_MODELS = ('gemini-2.0-flash', 'gemini-1.5-flash-latest')
+
+def _get_model(name: str) -> genai.GenerativeModel:
+    # GenerativeModel is a thin stateless wrapper; reuse one per model name
+    model = _models.get(name)
+    if model is None:
+        model = _models[name] = genai.GenerativeModel(name)
+    return model
+
+async def generate_text(model_name: str, prompt: str) -> str:
+    """Non-blocking Gemini call bounded by GEMINI_TIMEOUT_SECONDS."""
+    response = await asyncio.wait_for(
+        _get_model(model_name).generate_content_async(prompt),
+        timeout=settings.GEMINI_TIMEOUT_SECONDS,
+    )
+    return response.text
+
 @breaker
 async def generate_reason(tenant_profile: dict,
                           property: dict,
@@ -16,21 +38,69 @@ async def generate_reason(tenant_profile: dict,
                           language: str,
                           context: dict | None = None) -> str:
     # Prefer Gemini 2.0 Flash, fall back to 1.5 Flash if unavailable
-    primary_model = 'gemini-2.0-flash'
-    fallback_model = 'gemini-1.5-flash-latest'
-    lang_map = {"en": "English", "am": "Amharic", "or": "Afaan Oromo"}
+    primary_model, fallback_model = REASON_MODELS
+    cache_key = reason_cache_key(property, language, context)
+    cached = await reason_cache.get(cache_key)
+    if cached is not None:
+        return cached
     prompt = build_reason_prompt(tenant_profile, property, context, language)
     try:
-        model = genai.GenerativeModel(primary_model)
-        response = model.generate_content(prompt)
-        return response.text
+        text = await generate_text(primary_model, prompt)
+        await reason_cache.set(cache_key, text)
+        return text
     except Exception as e:
-        # Fallback if the primary model is not available in current region/version
-        logger.error("Gemini API failed on primary model", error=str(e), model=primary_model)
+        # Fallback if the primary model is not available in current region/version or timed out
+        logger.error("Gemini API failed on primary model", error=str(e) or type(e).__name__, model=primary_model)
         try:
-            model = genai.GenerativeModel(fallback_model)
-            response = model.generate_content(prompt)
-            return response.text
+            text = await generate_text(fallback_model, prompt)
+            await reason_cache.set(cache_key, text)
+            return text
         except Exception as e2:
-            logger.error("Gemini API failed on fallback model", error=str(e2), model=fallback_model)
-            return f"Reason generation failed in {lang_map[language]}."
+            logger.error("Gemini API failed on fallback model", error=str(e2) or type(e2).__name__, model=fallback_model)
+            return f"Reason generation failed in {LANG_MAP.get(language, 'English')}."
+
+async def stream_reason(tenant_profile: dict,
+                        property: dict,
+                        transport_cost: float,
+                        language: str,
+                        context: dict | None = None) -> AsyncIterator[str]:
+    """
+    Streaming form of `generate_reason`: yields text chunks as Gemini produces them.
+    Cached reasons are yielded whole. A model is only swapped for the fallback before
+    its first chunk; an error (including running past GEMINI_TIMEOUT_SECONDS) after
+    that propagates to the caller.
+    """
+    cache_key = reason_cache_key(property, language, context)
+    cached = await reason_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    prompt = build_reason_prompt(tenant_profile, property, context, language)
+    loop = asyncio.get_running_loop()
+    for model_name in REASON_MODELS:
+        parts = []
+        # GEMINI_TIMEOUT_SECONDS bounds the whole generation; time the caller spends between
+        # chunks is not counted, and no timer is left armed while this generator is suspended
+        deadline = loop.time() + settings.GEMINI_TIMEOUT_SECONDS
+        try:
+            response = await asyncio.wait_for(
+                _get_model(model_name).generate_content_async(prompt, stream=True),
+                timeout=settings.GEMINI_TIMEOUT_SECONDS,
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+        except Exception as e:
+            if parts:
+                raise
+            logger.error("Gemini streaming failed", error=str(e) or type(e).__name__, model=model_name)
+            continue
+        await reason_cache.set(cache_key, "".join(parts))
+        return
+    yield f"Reason generation failed in {LANG_MAP.get(language, 'English')}."
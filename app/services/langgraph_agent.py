@@ -1,20 +1,29 @@
 from langgraph.graph import StateGraph, END
-from app.services.gebeta import get_matrix
+from app.services.gebeta import get_matrix_batch
 from app.services.rag import retrieve_relevant_properties, setup_vector_store
-from app.services.gemini import generate_reason
+from app.services.gemini import generate_reason, stream_reason
+from app.services.promttemplet import LANG_MAP
 from app.services.search import search_properties
+from app.services.route_index import get_route_index
+from app.services.gazetteer import fold, get_gazetteer
+from app.services.road_estimator import get_road_estimator
 from app.models.tenant_profile import RecommendationLog
+from app.services.write_behind import get_write_behind
+from app.services.feedback import PREFERENCE, get_feedback_counts
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
 from app.config import settings
 from structlog import get_logger
-from typing import Dict, List, Any
+from typing import AsyncIterator, Callable, Dict, List, Any
 from pydantic import BaseModel
 import json
-import pandas as pd
+import asyncio
+import random
 from langchain_core.runnables import RunnableLambda # Added import
 from uuid import UUID
 from decimal import Decimal
+from datetime import datetime
 
 logger = get_logger()
 
@@ -38,56 +47,98 @@ class AgentState(BaseModel):
         arbitrary_types_allowed = True # Still needed for other arbitrary types if any
 
 async def geocode_step(state: AgentState, config: Dict[str, Any]):
-    db: AsyncSession = config["configurable"]["db"]
-    # Prefer well-known Addis coordinates for common districts to avoid wrong city inference
-    loc_lower = (state.job_school_location or "").strip().lower()
-    if any(k in loc_lower for k in ["bole", "addis", "piazza", "mexico", "sarbet", "cmc", "megenagna"]):
-        state.coords = {"lat": 9.0, "lon": 38.7}
-        logger.debug("Geocoding shortcut for Addis area", location=state.job_school_location, coords=state.coords)
-        return state
-    # Try to infer coordinates from local transport data if available
-    inferred = None
+    match = None
     try:
-        with open("train_data/transport_price_data.json", "r") as f:
-            transport_data = pd.DataFrame(json.load(f))
-        loc = (state.job_school_location or "").strip()
-        if loc and not transport_data.empty:
-            mask = (
-                transport_data["source"].astype(str).str.contains(loc, case=False, na=False) |
-                transport_data["destination"].astype(str).str.contains(loc, case=False, na=False)
-            )
-            matches = transport_data[mask]
-            candidates = []
-            for _, row in matches.iterrows():
-                # Prefer exact side matches if possible
-                if isinstance(row.get("source"), str) and loc.lower() in row.get("source").lower():
-                    if pd.notna(row.get("source_lat")) and pd.notna(row.get("source_lon")):
-                        candidates.append((float(row.get("source_lat")), float(row.get("source_lon"))))
-                if isinstance(row.get("destination"), str) and loc.lower() in row.get("destination").lower():
-                    if pd.notna(row.get("dest_lat")) and pd.notna(row.get("dest_lon")):
-                        candidates.append((float(row.get("dest_lat")), float(row.get("dest_lon"))))
-            if not candidates:
-                # Fall back to any lat/lon from matches
-                for _, row in matches.iterrows():
-                    if pd.notna(row.get("source_lat")) and pd.notna(row.get("source_lon")):
-                        candidates.append((float(row.get("source_lat")), float(row.get("source_lon"))))
-                    if pd.notna(row.get("dest_lat")) and pd.notna(row.get("dest_lon")):
-                        candidates.append((float(row.get("dest_lat")), float(row.get("dest_lon"))))
-            if candidates:
-                avg_lat = sum(c[0] for c in candidates) / len(candidates)
-                avg_lon = sum(c[1] for c in candidates) / len(candidates)
-                inferred = {"lat": avg_lat, "lon": avg_lon}
+        match = get_gazetteer().lookup(state.job_school_location or "")
     except Exception as e:
-        logger.warning("Local geocode inference failed, will use fallback", error=str(e))
+        logger.warning("Gazetteer lookup failed, will use fallback", error=str(e))
 
-    if inferred:
-        state.coords = inferred
-        logger.debug("Geocoding inferred from transport data", location=state.job_school_location, coords=state.coords)
+    if match and match.confidence >= settings.GEOCODE_MIN_CONFIDENCE:
+        state.coords = {"lat": match.lat, "lon": match.lon}
+        logger.debug("Geocoded from gazetteer", location=state.job_school_location, place=match.name, method=match.method, confidence=match.confidence, coords=state.coords)
     else:
         state.coords = {"lat": 9.0, "lon": 38.7} # Fallback coordinates
-        logger.warning("Geocoding skipped, using fallback coordinates", location=state.job_school_location, coords=state.coords)
+        logger.warning("Geocoding skipped, using fallback coordinates", location=state.job_school_location, confidence=match.confidence if match else None, coords=state.coords)
     return state
 
+# Candidate search tiers, most specific first: (tier, price band as salary fraction, match location, order, limit).
+# The primary tier additionally filters on house_type and amenities when provided. Tiers ordered by
+# RANDOM_ORDER are random samples; see SEARCH_SAMPLING_MODE.
+RANDOM_ORDER = "random()"
+SEARCH_TIERS = [
+    (1, (0.2, 0.3), True, "price ASC, updated_at DESC", 20),
+    (2, (0.1, 0.5), True, "price ASC, updated_at DESC", 30),
+    (3, (0.1, 0.6), True, RANDOM_ORDER, 10),
+    (4, (0.1, 0.7), False, RANDOM_ORDER, 20),
+    (5, None, False, RANDOM_ORDER, 20),
+]
+SEARCH_COLUMNS = "id, title, location, price, house_type, amenities, photos, lat, lon, status"
+# Set once the database turns out not to have properties.random_key (sampling migration not run);
+# random tiers then use ORDER BY random() for the rest of the process
+_random_key_missing = False
+
+def _sampling_mode() -> str:
+    return "random" if _random_key_missing else settings.SEARCH_SAMPLING_MODE
+
+def _is_missing_random_key(error: Exception) -> bool:
+    return isinstance(error, ProgrammingError) and '"random_key" does not exist' in str(error.orig)
+
+def _tier_select(tier: int, where_sql: str, order_by: str, limit: int) -> str:
+    # Tiers after the first only run while the earlier ones hold fewer than 3 distinct
+    # candidates: the guard is a one-time filter, so Postgres skips the tier's scan entirely
+    if tier > 1:
+        earlier = " UNION ALL ".join(f"SELECT id FROM tier{t}" for t in range(1, tier))
+        where_sql = f"{where_sql} AND (SELECT count(DISTINCT id) FROM ({earlier}) AS earlier) < 3"
+    if order_by == RANDOM_ORDER and _sampling_mode() == "random_key":
+        # Random keyset seek on the indexed random_key column: read `limit` rows at or after a
+        # random seed, wrapping around to the start of the key space if the tail is short
+        source = f"""(
+                (SELECT {SEARCH_COLUMNS}, random_key, 0 AS wrap FROM properties
+                 WHERE {where_sql} AND random_key >= :sample_seed ORDER BY random_key LIMIT {limit})
+                UNION ALL
+                (SELECT {SEARCH_COLUMNS}, random_key, 1 AS wrap FROM properties
+                 WHERE {where_sql} AND random_key < :sample_seed ORDER BY random_key LIMIT {limit})
+             ) AS sampled"""
+        where_sql, order_by = "TRUE", "wrap, random_key"
+    else:
+        source = "properties"
+    return f"""
+            tier{tier} AS (SELECT {tier} AS tier, row_number() OVER (ORDER BY {order_by}) AS tier_pos,
+                    id, title, location, price, house_type, amenities, photos AS images, lat, lon, status
+             FROM {source}
+             WHERE {where_sql}
+             ORDER BY tier_pos
+             LIMIT {limit})"""
+
+def build_tiered_search_query(state: AgentState):
+    """
+    Build one query returning every tier's candidates tagged with tier and in-tier position.
+    Each tier is a CTE that only runs when the tiers before it found fewer than 3 candidates.
+    """
+    params: Dict[str, Any] = {"loc": f"%{state.job_school_location}%" if state.job_school_location else ""}
+    ctes = []
+    for tier, band, match_location, order_by, limit in SEARCH_TIERS:
+        where_clauses = ["status = 'APPROVED'"]
+        if band:
+            params[f"min_price_{tier}"] = band[0] * state.salary
+            params[f"max_price_{tier}"] = band[1] * state.salary
+            where_clauses.append(f"price BETWEEN :min_price_{tier} AND :max_price_{tier}")
+        if match_location:
+            where_clauses.append("(location ILIKE :loc OR :loc = '')")
+        if tier == 1:
+            if state.house_type:
+                where_clauses.append("house_type = :house_type")
+                params["house_type"] = state.house_type
+            if state.preferred_amenities:
+                params["amenities"] = json.dumps(state.preferred_amenities)
+                where_clauses.append("amenities @> CAST(:amenities AS JSONB)")
+        ctes.append(_tier_select(tier, " AND ".join(where_clauses), order_by, limit))
+    if _sampling_mode() == "random_key":
+        params["sample_seed"] = random.random()
+    union = " UNION ALL ".join(f"SELECT * FROM tier{tier}" for tier, *_ in SEARCH_TIERS)
+    sql = text("WITH " + ",".join(ctes) + f"\n            {union} ORDER BY tier, tier_pos")
+    return sql, params
+
 async def search_step(state: AgentState, config: Dict[str, Any]): # Added config
     db: AsyncSession = config["configurable"]["db"] # Access db from config
     results: List[Dict[str, Any]] = []
@@ -104,157 +155,43 @@ async def search_step(state: AgentState, config: Dict[str, Any]): # Added config
                 except Exception:
                     pass
         return q
-    # Primary DB search (narrow band, APPROVED)
+    # All search tiers run as one round trip; tiers are then applied in order, each only while
+    # fewer than 3 candidates have been collected (same as sequential fallbacks)
+    global _random_key_missing
     try:
-        min_p = 0.2 * state.salary
-        max_p = 0.3 * state.salary
-        loc_pattern = f"%{state.job_school_location}%" if state.job_school_location else ""
-        where_clauses = [
-            "status = 'APPROVED'",
-            "price BETWEEN :min_price AND :max_price",
-        ]
-        params = {"min_price": min_p, "max_price": max_p}
-        # Optional location
-        where_clauses.append("(location ILIKE :loc OR :loc = '')")
-        params["loc"] = loc_pattern
-        # Optional house_type
-        if state.house_type:
-            where_clauses.append("house_type = :house_type")
-            params["house_type"] = state.house_type
-        # Optional amenities containment
-        if state.preferred_amenities:
-            params["amenities"] = json.dumps(state.preferred_amenities)
-            where_clauses.append("amenities @> CAST(:amenities AS JSONB)")
-        where_sql = " AND ".join(where_clauses)
-        sql_primary = text(f"""
-            SELECT id, title, location, price, house_type, amenities, photos AS images, lat, lon, status
-            FROM properties
-            WHERE {where_sql}
-            ORDER BY price ASC, updated_at DESC
-            LIMIT 20
-        """)
-        result = await db.execute(sql_primary, params)
-        rows = result.fetchall()
-        cols = result.keys()
-        primary = [norm_prop(dict(zip(cols, row))) for row in rows]
-        results.extend(primary)
-    except Exception as e:
-        await db.rollback()
-        logger.warning("Primary DB search failed; will attempt fallbacks", user_id=state.user_id, error=str(e))
-
-    # Fallback 1: Broadened DB search (wider price, relax house_type/bedrooms/amenities)
-    if len(results) < 3:
-        try:
-            min_p = 0.1 * state.salary
-            max_p = 0.5 * state.salary
-            loc_pattern = f"%{state.job_school_location}%" if state.job_school_location else ""
-            sql_broaden = text(
-                """
-                SELECT id, title, location, price, house_type, amenities, photos AS images, lat, lon, status
-                FROM properties
-                WHERE status = 'APPROVED'
-                  AND price BETWEEN :min_price AND :max_price
-                  AND (location ILIKE :loc OR :loc = '')
-                ORDER BY price ASC, updated_at DESC
-                LIMIT 30
-                """
-            )
-            result = await db.execute(sql_broaden, {"min_price": min_p, "max_price": max_p, "loc": loc_pattern})
-            rows = result.fetchall()
-            cols = result.keys()
-            broader = [norm_prop(dict(zip(cols, row))) for row in rows]
-            seen = {p.get("id") for p in results}
-            for p in broader:
-                if p.get("id") not in seen:
-                    results.append(p)
-                    seen.add(p.get("id"))
-        except Exception as ee:
-            await db.rollback()
-            logger.warning("Broader search failed", user_id=state.user_id, error=str(ee))
-
-    # Fallback 2: DB-level query
-    if len(results) < 3:
+        sql, params = build_tiered_search_query(state)
         try:
-            min_p = 0.1 * state.salary
-            max_p = 0.6 * state.salary
-            sql = text(
-                """
-                SELECT id, title, location, price, house_type, amenities, lat, lon, status
-                FROM properties
-                WHERE status = 'APPROVED'
-                  AND price BETWEEN :min_price AND :max_price
-                  AND (location ILIKE :loc OR :loc = '')
-                ORDER BY random()
-                LIMIT 10
-                """
-            )
-            loc_pattern = f"%{state.job_school_location}%" if state.job_school_location else ""
-            result = await db.execute(sql, {"min_price": min_p, "max_price": max_p, "loc": loc_pattern})
-            rows = result.fetchall()
-            cols = result.keys()
-            db_props = [norm_prop(dict(zip(cols, row))) for row in rows]
-            seen = {p.get("id") for p in results}
-            for p in db_props:
-                if p.get("id") not in seen:
-                    results.append(p)
-                    seen.add(p.get("id"))
-        except Exception as ee:
-            await db.rollback()
-            logger.warning("DB fallback search failed", user_id=state.user_id, error=str(ee))
-
-    # Fallback 3: DB wide query ignoring location (still APPROVED). First within wide price range, then any APPROVED.
-    if len(results) < 3:
-        try:
-            min_p = 0.1 * state.salary
-            max_p = 0.7 * state.salary
-            sql_wide = text(
-                """
-                SELECT id, title, location, price, house_type, amenities, lat, lon, status
-                FROM properties
-                WHERE status = 'APPROVED'
-                  AND price BETWEEN :min_price AND :max_price
-                ORDER BY random()
-                LIMIT 20
-                """
-            )
-            result = await db.execute(sql_wide, {"min_price": min_p, "max_price": max_p})
-            rows = result.fetchall()
-            cols = result.keys()
-            wide_props = [norm_prop(dict(zip(cols, row))) for row in rows]
-            seen = {p.get("id") for p in results}
-            for p in wide_props:
-                if p.get("id") not in seen:
-                    results.append(p)
-                    seen.add(p.get("id"))
-        except Exception as ee:
+            result = await db.execute(sql, params)
+        except ProgrammingError as e:
+            if _sampling_mode() != "random_key" or not _is_missing_random_key(e):
+                raise
             await db.rollback()
-            logger.warning("DB wide fallback failed", user_id=state.user_id, error=str(ee))
-
-    if len(results) < 3:
-        try:
-            sql_any = text(
-                """
-                SELECT id, title, location, price, house_type, amenities, lat, lon, status
-                FROM properties
-                WHERE status = 'APPROVED'
-                ORDER BY random()
-                LIMIT 20
-                """
-            )
-            result = await db.execute(sql_any)
-            rows = result.fetchall()
-            cols = result.keys()
-            any_props = [norm_prop(dict(zip(cols, row))) for row in rows]
-            seen = {p.get("id") for p in results}
-            for p in any_props:
+            _random_key_missing = True
+            logger.error("properties.random_key missing, sampling with ORDER BY random() until the sampling migration runs", error=str(e.orig))
+            sql, params = build_tiered_search_query(state)
+            result = await db.execute(sql, params)
+        rows = result.fetchall()
+        cols = list(result.keys())
+        by_tier: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            rec = dict(zip(cols, row))
+            tier = rec.pop("tier")
+            rec.pop("tier_pos", None)
+            by_tier.setdefault(tier, []).append(norm_prop(rec))
+        seen = set()
+        for tier, *_ in SEARCH_TIERS:
+            if len(results) >= 3:
+                break
+            for p in by_tier.get(tier, []):
                 if p.get("id") not in seen:
                     results.append(p)
                     seen.add(p.get("id"))
-        except Exception as ee:
-            await db.rollback()
-            logger.warning("DB any-approved fallback failed", user_id=state.user_id, error=str(ee))
+        logger.debug("Tiered search completed", user_id=state.user_id, tier_counts={t: len(v) for t, v in by_tier.items()})
+    except Exception as e:
+        await db.rollback()
+        logger.warning("Tiered DB search failed", user_id=state.user_id, error=str(e))
 
-    state.properties = results[:10] or []
+    state.properties = results[:settings.SEARCH_CANDIDATE_LIMIT] or []
     logger.debug(
         "Search properties results",
         user_id=state.user_id,
@@ -264,64 +201,77 @@ async def search_step(state: AgentState, config: Dict[str, Any]): # Added config
     )
     return state
 
+def prerank_by_estimated_distance(coords: Dict[str, float], properties: List[Dict[str, Any]], keep: int) -> List[Dict[str, Any]]:
+    """Keep the `keep` properties closest by local road estimate; ones without coordinates go last."""
+    estimator = get_road_estimator()
+    located = [p for p in properties if p.get("lat") and p.get("lon")]
+    unlocated = [p for p in properties if not (p.get("lat") and p.get("lon"))]
+    located.sort(key=lambda p: estimator.estimate_m(coords["lat"], coords["lon"], float(p["lat"]), float(p["lon"])))
+    return (located + unlocated)[:keep]
+
+async def road_distances(lat: float, lon: float, destinations: Dict[str, Any], user_id: str) -> Dict[str, float]:
+    """
+    Road distances in meters keyed by property id according to ROUTING_MODE. Destinations
+    Gebeta could not price (or all of them, when it fails) are estimated locally if
+    ROUTING_LOCAL_FALLBACK is set; otherwise a Gebeta failure propagates.
+    """
+    distances: Dict[str, float] = {}
+    if settings.ROUTING_MODE != "local":
+        try:
+            distances = await get_matrix_batch(lat, lon, destinations)
+        except Exception as e:
+            if not settings.ROUTING_LOCAL_FALLBACK:
+                raise
+            logger.warning("Matrix API failed, estimating road distances locally", user_id=user_id, error=str(e))
+    if settings.ROUTING_MODE == "local" or settings.ROUTING_LOCAL_FALLBACK:
+        estimator = get_road_estimator()
+        for pid, (d_lat, d_lon) in destinations.items():
+            if pid not in distances:
+                distances[pid] = estimator.estimate_m(lat, lon, float(d_lat), float(d_lon))
+    return distances
+
 async def transport_cost_step(state: AgentState, config: Dict[str, Any]): # Added config
     db: AsyncSession = config["configurable"]["db"] # Access db from config
     if not state.properties:
         state.transport_costs = []
         logger.debug("No properties found, skipping transport cost calculation", user_id=state.user_id)
         return state
-    with open("train_data/transport_price_data.json", "r") as f:
-        transport_data = pd.DataFrame(json.load(f))
-    destinations = [(p["lat"], p["lon"]) for p in state.properties if p.get("lat") and p.get("lon")]
+    route_index = get_route_index()
+    if settings.ROUTING_MODE == "prerank" and len(state.properties) > settings.ROUTING_PRERANK_KEEP:
+        state.properties = prerank_by_estimated_distance(state.coords, state.properties, settings.ROUTING_PRERANK_KEEP)
+    destinations = {str(p["id"]): (p["lat"], p["lon"]) for p in state.properties if p.get("lat") and p.get("lon")}
     state.transport_costs = []
     if destinations:
         try:
-            distances = await get_matrix(state.coords["lat"], state.coords["lon"], destinations)
-            logger.debug("Get matrix results", user_id=state.user_id, distances_type=type(distances), distances_len=len(distances) if distances else 0)
-            # Helper: haversine distance in km
-            def haversine(lat1, lon1, lat2, lon2):
-                from math import radians, sin, cos, sqrt, atan2
-                R = 6371.0
-                dlat = radians(lat2 - lat1)
-                dlon = radians(lon2 - lon1)
-                a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-                c = 2 * atan2(sqrt(a), sqrt(1 - a))
-                return R * c
-
-            for prop, distance in zip(state.properties, distances):
-                distance_km = distance["distance"] / 1000
-                route = f"{state.job_school_location} to {prop['location']}"
-                matching_routes = transport_data[
-                    (transport_data["source"].str.contains(state.job_school_location, case=False)) &
-                    (transport_data["destination"].str.contains(prop["location"], case=False))
-                ]
-                # If no name match, try nearest-route matching using coordinates
-                if matching_routes.empty:
-                    try:
-                        # Ensure numeric columns exist
-                        td = transport_data.copy()
-                        for col in ["source_lat", "source_lon", "dest_lat", "dest_lon"]:
-                            if col not in td.columns:
-                                td[col] = None
-                        td = td.dropna(subset=["source_lat", "source_lon", "dest_lat", "dest_lon"])
-                        if not td.empty and prop.get("lat") and prop.get("lon"):
-                            # Compute distance from user to source stop + property to dest stop
-                            td = td.assign(
-                                user_to_source_km=td.apply(lambda r: haversine(state.coords["lat"], state.coords["lon"], float(r["source_lat"]), float(r["source_lon"])), axis=1),
-                            )
-                            td = td.assign(
-                                prop_to_dest_km=td.apply(lambda r: haversine(prop["lat"], prop["lon"], float(r["dest_lat"]), float(r["dest_lon"])), axis=1),
-                            )
-                            td = td.assign(total_nearness_km=td["user_to_source_km"] + td["prop_to_dest_km"])
-                            # Choose the route with minimal total nearness
-                            best = td.sort_values("total_nearness_km").head(1)
-                            matching_routes = best
-                    except Exception as ex:
-                        logger.warning("Nearest-route matching failed", user_id=state.user_id, error=str(ex))
-
-                fare = matching_routes["price"].iloc[0] if not matching_routes.empty else 10.0
-                route_source = matching_routes["source"].iloc[0] if not matching_routes.empty else state.job_school_location
-                route_destination = matching_routes["destination"].iloc[0] if not matching_routes.empty else prop["location"]
+            distances = await road_distances(state.coords["lat"], state.coords["lon"], destinations, state.user_id)
+            logger.debug("Road distances resolved", user_id=state.user_id, routing_mode=settings.ROUTING_MODE, destinations_len=len(destinations), distances_len=len(distances))
+            # Resolve routes by name first, then score every unmatched property against
+            # all routes in one batched nearest-route pass
+            best_routes = {}
+            unmatched = []
+            for i, prop in enumerate(state.properties):
+                matching_routes = route_index.match(state.job_school_location, prop["location"])
+                if matching_routes:
+                    best_routes[i] = matching_routes[0]
+                elif prop.get("lat") and prop.get("lon"):
+                    unmatched.append(i)
+            if unmatched:
+                try:
+                    nearest = route_index.nearest_routes(
+                        state.coords["lat"], state.coords["lon"],
+                        [(float(state.properties[i]["lat"]), float(state.properties[i]["lon"])) for i in unmatched],
+                    )
+                    best_routes.update(zip(unmatched, nearest))
+                except Exception as ex:
+                    logger.warning("Nearest-route matching failed", user_id=state.user_id, error=str(ex))
+
+            for i, prop in enumerate(state.properties):
+                distance_m = distances.get(str(prop["id"]))
+                distance_km = distance_m / 1000 if distance_m is not None else 5.0
+                best = best_routes.get(i)
+                fare = best.price if best else 10.0
+                route_source = best.source if best else state.job_school_location
+                route_destination = best.destination if best else prop["location"]
                 monthly_cost = fare * 2 * 20  # Round-trip, 20 days/month
                 state.transport_costs.append({
                     "property_id": prop["id"],
@@ -353,11 +303,7 @@ async def rank_step(state: AgentState, config: Dict[str, Any]): # Added config
         return state
     # Adjust weights based on feedback (example: increase proximity if preferred)
     feedback_weights = {"proximity": 0.4, "affordability": 0.3, "family_fit": 0.3}
-    feedback_logs = await db.execute(
-        select(RecommendationLog.feedback).where(RecommendationLog.tenant_preference_id == state.tenant_preference_id)
-    )
-    feedbacks = feedback_logs.scalars().all()
-    liked_count = sum(1 for f in feedbacks if f and f.get("liked", False))
+    liked_count, _ = await get_feedback_counts(db, PREFERENCE, state.tenant_preference_id)
     if liked_count > 0:
         feedback_weights["proximity"] += 0.1
         feedback_weights["affordability"] -= 0.05
@@ -387,6 +333,45 @@ async def rank_step(state: AgentState, config: Dict[str, Any]): # Added config
     logger.debug("Properties ranked", user_id=state.user_id, state_recommendations_len=len(state.recommendations))
     return state
 
+def to_jsonable(obj: Any):
+    """json.dumps default for UUID/Decimal values coming from the database."""
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        try:
+            return float(obj)
+        except Exception:
+            return str(obj)
+    return obj
+
+def build_recommendation(
+    state: AgentState, prop: Dict[str, Any], tc: Dict[str, Any] | None, transport_cost: float,
+    distance_km: float, fare: float, context: Dict[str, Any], reason_text: str | None,
+) -> Dict[str, Any]:
+    """Recommendation payload for one ranked property; `reason_text` is None until generated."""
+    return {
+        **prop,
+        "transport_cost": transport_cost,
+        "affordability_score": 1 - (float(prop.get("price", 0.0)) / float((state.salary or 1.0) * 0.3)),
+        "reason": reason_text,
+        "reason_details": context,
+        "map_url": f"https://api.gebeta.app/tiles/{prop['lat']}/{prop['lon']}/15",
+        "images": prop.get("photos") or prop.get("images") or [],
+        "details": {
+            "bedrooms": prop.get("bedrooms"),
+            "house_type": prop.get("house_type"),
+            "amenities": prop.get("amenities", []),
+            "location": prop.get("location"),
+        },
+        "route": {
+            "source": tc.get("route_source") if tc else state.job_school_location,
+            "destination": tc.get("route_destination") if tc else prop.get("location", ""),
+            "distance_km": distance_km,
+            "fare": fare,
+            "monthly_cost": transport_cost,
+        }
+    }
+
 async def reason_step(state: AgentState, config: Dict[str, Any]): # Added config
     db: AsyncSession = config["configurable"]["db"] # Access db from config
     if not state.recommendations:
@@ -394,6 +379,7 @@ async def reason_step(state: AgentState, config: Dict[str, Any]): # Added config
         logger.debug("No recommendations to reason about", user_id=state.user_id)
         return state
     
+    prepared = []
     new_recommendations = []
     for prop in state.recommendations:
         tc = next((tc for tc in state.transport_costs if tc["property_id"] == prop["id"]), None)
@@ -419,60 +405,92 @@ async def reason_step(state: AgentState, config: Dict[str, Any]): # Added config
             "amenities": prop.get("amenities", []),
             "house_type": prop.get("house_type"),
         }
-        reason_text = await generate_reason(state, prop, transport_cost, state.language, context)
+        prepared.append((prop, tc, transport_cost, distance_km, fare, context))
+
+    # Streaming callers get the ranked list (with transport costs) before any reason is ready
+    emit = config["configurable"].get("emit")
+    if emit is not None:
+        emit({"event": "recommendations", "data": [build_recommendation(state, *p, None) for p in prepared]})
+
+    # Generate all reasons concurrently; the cap keeps one request from flooding Gemini
+    semaphore = asyncio.Semaphore(max(1, settings.REASON_CONCURRENCY))
+    failed_reason = f"Reason generation failed in {LANG_MAP.get(state.language, 'English')}."
+    async def reason_for(prop: Dict[str, Any], transport_cost: float, context: Dict[str, Any]) -> str:
+        async with semaphore:
+            if emit is None:
+                try:
+                    return await generate_reason(state, prop, transport_cost, state.language, context)
+                except Exception as e:
+                    logger.warning("Reason generation failed", user_id=state.user_id, property_id=prop.get("id"), error=str(e))
+                    return failed_reason
+            property_id = str(prop.get("id"))
+            parts: List[str] = []
+            try:
+                async for chunk in stream_reason(state, prop, transport_cost, state.language, context):
+                    parts.append(chunk)
+                    emit({"event": "reason_delta", "data": {"property_id": property_id, "text": chunk}})
+            except Exception as e:
+                logger.warning("Reason streaming failed", user_id=state.user_id, property_id=property_id, error=str(e))
+            reason_text = "".join(parts) or failed_reason
+            emit({"event": "reason", "data": {"property_id": property_id, "reason": reason_text}})
+            return reason_text
+    reasons = await asyncio.gather(*(reason_for(prop, cost, ctx) for prop, _, cost, _, _, ctx in prepared))
+
+    for (prop, tc, transport_cost, distance_km, fare, context), reason_text in zip(prepared, reasons):
         logger.debug("Generated reason for property", user_id=state.user_id, property_id=prop.get("id"), reason=reason_text)
-        new_recommendations.append(
-            {
-                **prop,
-                "transport_cost": transport_cost,
-                "affordability_score": 1 - (float(prop.get("price", 0.0)) / float((state.salary or 1.0) * 0.3)),
-                "reason": reason_text,
-                "reason_details": context,
-                "map_url": f"https://api.gebeta.app/tiles/{prop['lat']}/{prop['lon']}/15",
-                "images": prop.get("photos") or prop.get("images") or [],
-                "details": {
-                    "bedrooms": prop.get("bedrooms"),
-                    "house_type": prop.get("house_type"),
-                    "amenities": prop.get("amenities", []),
-                    "location": prop.get("location"),
-                },
-                "route": {
-                    "source": tc.get("route_source") if tc else state.job_school_location,
-                    "destination": tc.get("route_destination") if tc else prop.get("location", ""),
-                    "distance_km": distance_km,
-                    "fare": fare,
-                    "monthly_cost": transport_cost,
-                }
-            }
-        )
+        new_recommendations.append(build_recommendation(state, prop, tc, transport_cost, distance_km, fare, context, reason_text))
     state.recommendations = new_recommendations
     
     # Ensure JSON-serializable payload (convert UUID/Decimal)
-    def to_jsonable(obj: Any):
-        if isinstance(obj, UUID):
-            return str(obj)
-        if isinstance(obj, Decimal):
-            try:
-                return float(obj)
-            except Exception:
-                return str(obj)
-        return obj
     try:
         serialized_recs = json.loads(json.dumps(state.recommendations, default=to_jsonable))
     except Exception:
         # As a last resort, stringify everything
         serialized_recs = json.loads(json.dumps(state.recommendations, default=str))
 
-    log = RecommendationLog(
-        tenant_preference_id=state.tenant_preference_id,
-        recommendation=serialized_recs,
-        feedback=None
-    )
-    db.add(log)
-    await db.commit()
+    queue = get_write_behind()
+    if queue is not None:
+        await queue.add_recommendation_log({
+            "tenant_preference_id": state.tenant_preference_id,
+            "recommendation": serialized_recs,
+            "feedback": None,
+            "created_at": datetime.utcnow(),
+        })
+    else:
+        log = RecommendationLog(
+            tenant_preference_id=state.tenant_preference_id,
+            recommendation=serialized_recs,
+            feedback=None
+        )
+        db.add(log)
+        await db.commit()
     logger.debug("Recommendations and reasons generated and logged", user_id=state.user_id, state_recommendations_len=len(state.recommendations))
     return state
 
+def _build_linear_graph(steps):
+    graph = StateGraph(AgentState)
+    for name, step in steps:
+        graph.add_node(name, RunnableLambda(step)) # Wrapped with RunnableLambda
+    for (name, _), (next_name, _) in zip(steps, steps[1:]):
+        graph.add_edge(name, next_name)
+    graph.add_edge(steps[-1][0], END)
+    graph.set_entry_point(steps[0][0])
+    return graph.compile()
+
+# Candidate stages depend only on location, salary band and listing filters; profile stages on the tenant
+CANDIDATE_STEPS = [("geocode", geocode_step), ("search", search_step), ("transport_cost", transport_cost_step)]
+PROFILE_STEPS = [("rank", rank_step), ("reason", reason_step)]
+
+def build_recommendation_graph():
+    """Build and compile the recommendation workflow. Per-request state (the db session) travels in config."""
+    return _build_linear_graph(CANDIDATE_STEPS + PROFILE_STEPS)
+
+# Compiled once at import and shared by all requests; the graph holds no per-request state
+recommendation_graph = build_recommendation_graph()
+# Halves of the same workflow, used by the batch entry point to share candidate work across profiles
+candidate_graph = _build_linear_graph(CANDIDATE_STEPS)
+profile_graph = _build_linear_graph(PROFILE_STEPS)
+
 async def run_recommendation_agent(
     tenant_preference_id: int, user_id: str, job_school_location: str, salary: float,
     house_type: str, family_size: int, preferred_amenities: List[str], language: str,
@@ -489,21 +507,8 @@ async def run_recommendation_agent(
         language=language,
         # db=db # Removed from state initialization
     )
-    graph = StateGraph(AgentState)
-    graph.add_node("geocode", RunnableLambda(geocode_step)) # Wrapped with RunnableLambda
-    graph.add_node("search", RunnableLambda(search_step)) # Wrapped with RunnableLambda
-    graph.add_node("transport_cost", RunnableLambda(transport_cost_step)) # Wrapped with RunnableLambda
-    graph.add_node("rank", RunnableLambda(rank_step)) # Wrapped with RunnableLambda
-    graph.add_node("reason", RunnableLambda(reason_step)) # Wrapped with RunnableLambda
-    graph.add_edge("geocode", "search")
-    graph.add_edge("search", "transport_cost")
-    graph.add_edge("transport_cost", "rank")
-    graph.add_edge("rank", "reason")
-    graph.add_edge("reason", END)
-    graph.set_entry_point("geocode")
-    compiled_graph = graph.compile()
     try:
-        result = await compiled_graph.ainvoke(state, config={"configurable": {"db": db}})
+        result = await recommendation_graph.ainvoke(state, config={"configurable": {"db": db}})
         # Handle both AgentState and plain dict returns
         recs: List[dict] = []
         if result:
@@ -518,3 +523,134 @@ async def run_recommendation_agent(
     except Exception as e:
         logger.error("Langgraph ainvoke failed", user_id=user_id, error=str(e))
         raise # Re-raise the exception to be caught by the FastAPI endpoint
+
+async def stream_recommendation_agent(
+    tenant_preference_id: int, user_id: str, job_school_location: str, salary: float,
+    house_type: str, family_size: int, preferred_amenities: List[str], language: str,
+    db: AsyncSession
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the recommendation graph and yield events as it progresses: a "stage" event per
+    finished node, "recommendations" once ranking is done (transport costs included, no
+    reasons yet), "reason_delta"/"reason" per property as text arrives, then "done" with
+    the final list, or "error".
+    """
+    state = AgentState(
+        tenant_preference_id=tenant_preference_id,
+        user_id=user_id,
+        job_school_location=job_school_location,
+        salary=salary,
+        house_type=house_type,
+        family_size=family_size,
+        preferred_amenities=preferred_amenities,
+        language=language,
+    )
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        config = {"configurable": {"db": db, "emit": queue.put_nowait}}
+        recs: List[dict] = []
+        try:
+            async for update in recommendation_graph.astream(state, config=config, stream_mode="updates"):
+                for node, output in update.items():
+                    queue.put_nowait({"event": "stage", "data": {"stage": node}})
+                    if node == "reason":
+                        recs = (output.get("recommendations") if isinstance(output, dict) else getattr(output, "recommendations", None)) or []
+            queue.put_nowait({"event": "done", "data": {"tenant_preference_id": tenant_preference_id, "recommendations": recs}})
+        except Exception as e:
+            logger.error("Langgraph astream failed", user_id=user_id, error=str(e))
+            queue.put_nowait({"event": "error", "data": {"detail": "Recommendation failed"}})
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+    finally:
+        # Client went away mid-stream: stop generating reasons nobody will read
+        if not task.done():
+            task.cancel()
+
+
+def batch_group_key(profile: Dict[str, Any]) -> tuple:
+    """Profiles with the same key share geocoding, candidate search and the distance matrix."""
+    band = int(float(profile["salary"] or 0.0) // settings.BATCH_SALARY_BAND)
+    amenities = tuple(sorted(str(a).lower() for a in (profile.get("preferred_amenities") or [])))
+    return (fold(profile["job_school_location"] or ""), band, (profile["house_type"] or "").lower(), amenities)
+
+def _result_value(result: Any, key: str) -> Any:
+    # ainvoke may return the state model or a plain dict of channel values
+    return result.get(key) if isinstance(result, dict) else getattr(result, key, None)
+
+# error_code -> message returned for a failed batch profile
+_BATCH_ERRORS = {
+    "candidate_search_failed": "Could not search properties for this profile.",
+    "recommendation_failed": "Could not generate recommendations for this profile.",
+}
+
+async def run_recommendation_agent_batch(
+    profiles: List[Dict[str, Any]],
+    session_factory: Callable[[], AsyncSession],
+) -> List[Dict[str, Any]]:
+    """
+    Recommendations for many tenant profiles (dicts of `run_recommendation_agent` arguments
+    without `db`). Profiles are grouped by `batch_group_key`; each group runs the candidate
+    stages once, at the middle of its salary band, then every profile is ranked and reasoned
+    individually. Groups and profiles each run under BATCH_CONCURRENCY, each on its own
+    session. Returns one result per profile, in input order, with "error" and "error_code"
+    (see `_BATCH_ERRORS`) instead of "recommendations" when that profile (or its group) failed.
+    """
+    results: List[Dict[str, Any]] = [{} for _ in profiles]
+    groups: Dict[tuple, List[int]] = {}
+    for i, profile in enumerate(profiles):
+        groups.setdefault(batch_group_key(profile), []).append(i)
+    group_semaphore = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+    profile_semaphore = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+
+    def fail(i: int, error: Exception, code: str) -> None:
+        # Details stay in the logs; callers get a generic message and a stable code
+        logger.error("Batch recommendation failed", user_id=profiles[i]["user_id"], index=i, error_code=code, exc_info=error)
+        results[i] = {
+            "index": i,
+            "tenant_preference_id": profiles[i]["tenant_preference_id"],
+            "error": _BATCH_ERRORS[code],
+            "error_code": code,
+        }
+
+    async def run_profile(i: int, shared: Any) -> None:
+        async with profile_semaphore:
+            try:
+                state = AgentState(
+                    **profiles[i],
+                    coords=_result_value(shared, "coords"),
+                    properties=list(_result_value(shared, "properties") or []),
+                    transport_costs=list(_result_value(shared, "transport_costs") or []),
+                )
+                async with session_factory() as db:
+                    result = await profile_graph.ainvoke(state, config={"configurable": {"db": db}})
+                results[i] = {
+                    "index": i,
+                    "tenant_preference_id": profiles[i]["tenant_preference_id"],
+                    "recommendations": _result_value(result, "recommendations") or [],
+                }
+            except Exception as e:
+                fail(i, e, "recommendation_failed")
+
+    async def run_group(key: tuple, members: List[int]) -> None:
+        lead = profiles[members[0]]
+        async with group_semaphore:
+            try:
+                state = AgentState(**{**lead, "salary": (key[1] + 0.5) * settings.BATCH_SALARY_BAND})
+                async with session_factory() as db:
+                    shared = await candidate_graph.ainvoke(state, config={"configurable": {"db": db}})
+            except Exception as e:
+                for i in members:
+                    fail(i, e, "candidate_search_failed")
+                return
+        await asyncio.gather(*(run_profile(i, shared) for i in members))
+
+    await asyncio.gather(*(run_group(key, members) for key, members in groups.items()))
+    logger.info("Batch recommendations completed", profiles=len(profiles), groups=len(groups),
+                failed=sum(1 for r in results if "error" in r))
+    return results
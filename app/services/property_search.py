@@ -1,14 +1,20 @@
-import google.generativeai as genai
+import hashlib
 from app.config import settings
 from structlog import get_logger
 from pybreaker import CircuitBreaker
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from typing import List, Dict
+from typing import Any, List, Dict, Optional, Tuple
+from app.services.gemini import generate_text
+from app.services.sql_cache import get_schema_version, sql_cache, sql_cache_key
+from app.services.query_parser import parse_search_query
 
 logger = get_logger()
 breaker = CircuitBreaker(fail_max=3, reset_timeout=60)
 
+# Searches served per path: deterministic rules, cached translation, or a Gemini call
+_path_counts = {"rules": 0, "cache": 0, "llm": 0}
+
 # Define the properties table schema as a string for Gemini's knowledge base
 PROPERTIES_TABLE_SCHEMA = """
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
@@ -76,17 +82,12 @@ BEFORE INSERT OR UPDATE ON properties
 FOR EACH ROW EXECUTE PROCEDURE update_fts_column();
 """
 
-@breaker
-async def generate_sql_query(user_query: str) -> str:
-    """
-    Generates an SQL query based on the user's natural language query and the properties table schema.
-    """
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    prompt = f"""
+SQL_MODEL = 'gemini-1.5-flash'
+SQL_PROMPT_TEMPLATE = """
     You are an expert in PostgreSQL. Your task is to convert a natural language query into an SQL SELECT statement for the 'properties' table.
     The table schema is as follows:
 
-    {PROPERTIES_TABLE_SCHEMA}
+    {schema}
 
     Consider the 'fts' column for full-text search when relevant.
     Ensure the generated SQL query is valid PostgreSQL syntax and only selects relevant columns.
@@ -96,28 +97,69 @@ async def generate_sql_query(user_query: str) -> str:
 
     SQL Query:
     """
+# Part of the translation cache key: editing the prompt or schema text invalidates cached SQL
+PROMPT_FINGERPRINT = hashlib.sha256(
+    (SQL_MODEL + SQL_PROMPT_TEMPLATE + PROPERTIES_TABLE_SCHEMA).encode("utf-8")
+).hexdigest()[:16]
+
+@breaker
+async def generate_sql_query(user_query: str) -> str:
+    """
+    Generates an SQL query based on the user's natural language query and the properties table schema.
+    """
+    prompt = SQL_PROMPT_TEMPLATE.format(schema=PROPERTIES_TABLE_SCHEMA, user_query=user_query)
     try:
-        response = model.generate_content(prompt)
-        sql_query = response.text.strip()
+        sql_query = (await generate_text(SQL_MODEL, prompt)).strip()
         # Basic validation to ensure it's a SELECT query
         if not sql_query.lower().startswith("select"):
             raise ValueError("Generated query is not a SELECT statement.")
         return sql_query
     except Exception as e:
-        await logger.error("Gemini API failed to generate SQL query", error=str(e))
+        logger.error("Gemini API failed to generate SQL query", error=str(e) or type(e).__name__)
         raise
 
-async def execute_sql_query(sql_query: str, db: AsyncSession) -> List[Dict]:
+def search_path_stats() -> Dict[str, Any]:
+    """How many searches each path served (rules / cache / llm) and their shares."""
+    total = sum(_path_counts.values())
+    return {
+        "counts": dict(_path_counts),
+        "shares": {path: round(n / total, 4) if total else 0.0 for path, n in _path_counts.items()},
+    }
+
+async def translate_query(user_query: str, db: AsyncSession) -> Tuple[str, Dict[str, Any]]:
+    """
+    Parameterized SQL for a natural-language search. Queries the rule-based parser
+    understands with enough confidence never reach the LLM; the rest are served from the
+    translation cache when the same (normalized) query was translated before under the
+    current schema version, and only then sent to Gemini.
+    """
+    if settings.SEARCH_RULES_ENABLED:
+        parsed = parse_search_query(user_query)
+        if parsed.has_criteria and parsed.confidence >= settings.SEARCH_RULES_MIN_CONFIDENCE:
+            _path_counts["rules"] += 1
+            return parsed.to_sql()
+        logger.debug("Search query needs the LLM", unparsed=parsed.unparsed, confidence=parsed.confidence)
+    key = sql_cache_key(user_query, await get_schema_version(db, PROMPT_FINGERPRINT))
+    cached = await sql_cache.get(key)
+    if cached is not None:
+        _path_counts["cache"] += 1
+        return cached, {}
+    sql_query = await generate_sql_query(user_query)
+    _path_counts["llm"] += 1
+    await sql_cache.set(key, sql_query)
+    return sql_query, {}
+
+async def execute_sql_query(sql_query: str, db: AsyncSession, params: Optional[Dict[str, Any]] = None) -> List[Dict]:
     """
     Executes the given SQL query against the PostgreSQL database and returns the results.
     """
     try:
-        result = await db.execute(text(sql_query))
+        result = await db.execute(text(sql_query), params or {})
         # For SELECT statements, fetch all rows
         rows = result.fetchall()
         # Convert Row objects to dictionaries
         columns = result.keys()
         return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
-        await logger.error("Failed to execute SQL query", sql_query=sql_query, error=str(e))
+        logger.error("Failed to execute SQL query", sql_query=sql_query, error=str(e))
         raise
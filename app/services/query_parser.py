@@ -0,0 +1,170 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.gazetteer import get_gazetteer
+from app.services.sql_cache import normalize_query
+
+# Canonical house_type values and the words (and stored spellings) that mean them
+HOUSE_TYPES: Dict[str, str] = {
+    "apartment": "apartment", "apartments": "apartment", "apt": "apartment", "flat": "apartment",
+    "condominium": "condominium", "condominiums": "condominium", "condo": "condominium", "condos": "condominium",
+    "villa": "villa", "villas": "villa",
+    "studio": "studio", "studios": "studio",
+    "house": "house", "houses": "house",
+    "room": "room", "rooms": "room",
+}
+AMENITIES: Dict[str, str] = {
+    "wifi": "wifi", "wi-fi": "wifi", "internet": "wifi",
+    "parking": "parking", "garage": "parking",
+    "water": "water", "electricity": "electricity", "generator": "generator",
+    "furnished": "furnished", "security": "security", "guard": "security",
+    "balcony": "balcony", "garden": "garden", "elevator": "elevator", "lift": "elevator",
+    "kitchen": "kitchen", "gym": "gym", "pool": "pool",
+}
+# Words that carry no search criteria of their own
+FILLER = {
+    "a", "an", "the", "for", "rent", "rental", "to", "with", "and", "or", "in", "near", "around", "at",
+    "close", "by", "next", "etb", "birr", "per", "month", "monthly", "me", "i", "want", "need",
+    "looking", "find", "show", "search", "available", "of", "price", "priced", "cost", "costing",
+}
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+
+_CURRENCY = r"(?:\s*(?:birr|etb))?"
+_BETWEEN = re.compile(rf"\b(?:between|from)\s+(\d+){_CURRENCY}\s+(?:and|to)\s+(\d+){_CURRENCY}\b")
+_RANGE = re.compile(rf"\b(\d+){_CURRENCY}\s*(?:-|to)\s*(\d+){_CURRENCY}\b")
+_MAX_PRICE = re.compile(rf"(?:\b(?:under|below|less than|cheaper than|max(?:imum)?|up to|at most|within)\s+|<\s*)(\d+){_CURRENCY}\b")
+_MIN_PRICE = re.compile(rf"(?:\b(?:over|above|more than|min(?:imum)?|at least|from|starting at)\s+|>\s*)(\d+){_CURRENCY}\b")
+_BARE_PRICE = re.compile(r"\b(\d+)\s*(?:birr|etb)\b")
+_BEDROOMS = re.compile(r"\b(\d+|one|two|three|four|five|six)\s*-?\s*(?:bed(?:room)?s?|br|bdrm?s?)\b")
+_LOCATION = re.compile(
+    r"\b(?:in|near|around|at|close to|next to)\s+(.+?)"
+    r"(?=\s+(?:under|below|over|above|with|for|between|less|more|max|min|from|up|within|in|near|around)\b|$)"
+)
+_TOKEN = re.compile(r"[^\s,]+")
+
+SEARCH_SELECT = "SELECT id, title, description, location, price, house_type, amenities, photos, lat, lon FROM properties"
+RESULT_LIMIT = 50
+
+
+@dataclass
+class ParsedSearch:
+    location: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    house_type: Optional[str] = None
+    bedrooms: Optional[int] = None
+    amenities: List[str] = field(default_factory=list)
+    unparsed: List[str] = field(default_factory=list)
+    confidence: float = 0.0
+    # (min_lat, min_lon, max_lat, max_lon); set by callers that search by radius rather than by name
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    limit: int = RESULT_LIMIT
+
+    @property
+    def has_criteria(self) -> bool:
+        return any(v is not None for v in (self.location, self.min_price, self.max_price, self.house_type, self.bedrooms)) or bool(self.amenities)
+
+    def to_sql(self) -> Tuple[str, Dict[str, Any]]:
+        """Parameterized SELECT over approved properties matching the parsed criteria."""
+        conditions = ["status = 'APPROVED'"]
+        params: Dict[str, Any] = {"limit": self.limit}
+        if self.location:
+            conditions.append("location ILIKE :location")
+            params["location"] = f"%{self.location}%"
+        if self.min_price is not None:
+            conditions.append("price >= :min_price")
+            params["min_price"] = self.min_price
+        if self.max_price is not None:
+            conditions.append("price <= :max_price")
+            params["max_price"] = self.max_price
+        if self.house_type:
+            # Stored values are not consistent ("condo" vs "condominium"), so match every spelling
+            conditions.append("lower(house_type) = ANY(:house_types)")
+            params["house_types"] = sorted({self.house_type, *(w for w, t in HOUSE_TYPES.items() if t == self.house_type)})
+        if self.bedrooms is not None:
+            # No bedrooms column; listings state it in the title or description
+            conditions.append("(title ILIKE :bedrooms OR description ILIKE :bedrooms)")
+            params["bedrooms"] = f"%{self.bedrooms} bed%"
+        if self.bbox is not None:
+            conditions.append("lat BETWEEN :min_lat AND :max_lat AND lon BETWEEN :min_lon AND :max_lon")
+            params.update(zip(("min_lat", "min_lon", "max_lat", "max_lon"), self.bbox))
+        for i, amenity in enumerate(self.amenities):
+            conditions.append(f"EXISTS (SELECT 1 FROM jsonb_array_elements_text(amenities) AS a WHERE lower(a) = :amenity_{i})")
+            params[f"amenity_{i}"] = amenity
+        sql = f"{SEARCH_SELECT} WHERE {' AND '.join(conditions)} ORDER BY price ASC LIMIT :limit"
+        return sql, params
+
+
+def _consume(pattern: re.Pattern, q: str) -> Tuple[Optional[re.Match], str]:
+    match = pattern.search(q)
+    if match is None:
+        return None, q
+    return match, f"{q[:match.start()]} {q[match.end():]}"
+
+
+def parse_search_query(query: str) -> ParsedSearch:
+    """
+    Deterministically extract location, price bounds, house type, bedrooms and amenities.
+    `confidence` is the share of meaningful words the rules accounted for; callers fall
+    back to the LLM below SEARCH_RULES_MIN_CONFIDENCE.
+    """
+    q = normalize_query(query)
+    total = [t for t in _TOKEN.findall(q) if t not in FILLER]
+    parsed = ParsedSearch()
+
+    match, q = _consume(_BEDROOMS, q)
+    if match is not None:
+        count = match.group(1)
+        parsed.bedrooms = int(count) if count.isdigit() else _NUMBER_WORDS[count]
+
+    match, q = _consume(_BETWEEN, q)
+    if match is None:
+        match, q = _consume(_RANGE, q)
+    if match is not None:
+        low, high = sorted((float(match.group(1)), float(match.group(2))))
+        parsed.min_price, parsed.max_price = low, high
+    else:
+        match, q = _consume(_MAX_PRICE, q)
+        if match is not None:
+            parsed.max_price = float(match.group(1))
+        match, q = _consume(_MIN_PRICE, q)
+        if match is not None:
+            parsed.min_price = float(match.group(1))
+        if parsed.min_price is None and parsed.max_price is None:
+            match, q = _consume(_BARE_PRICE, q)
+            if match is not None:
+                parsed.max_price = float(match.group(1))
+
+    words = []
+    for token in _TOKEN.findall(q):
+        if token in HOUSE_TYPES and parsed.house_type is None:
+            parsed.house_type = HOUSE_TYPES[token]
+        elif token in AMENITIES:
+            if AMENITIES[token] not in parsed.amenities:
+                parsed.amenities.append(AMENITIES[token])
+        else:
+            words.append(token)
+    q = " ".join(words)
+
+    gazetteer = get_gazetteer()
+    match = _LOCATION.search(q)
+    if match is not None:
+        phrase = match.group(1).strip()
+        place = gazetteer.lookup(phrase)
+        # An unknown phrase ("in a safe area", "near my office") stays unparsed so the query
+        # falls through to the LLM instead of running a location filter that matches nothing
+        if place and place.confidence >= settings.GEOCODE_MIN_CONFIDENCE:
+            parsed.location = place.name
+            q = f"{q[:match.start()]} {q[match.end():]}"
+    remaining = [t for t in q.split() if t not in FILLER]
+    if parsed.location is None and remaining:
+        # A bare place name ("bole apartment under 5000") counts only on a confident match
+        place = gazetteer.lookup(" ".join(remaining))
+        if place and place.confidence >= 0.95:
+            parsed.location = place.name
+            remaining = []
+    parsed.unparsed = remaining
+    parsed.confidence = round(1 - len(remaining) / len(total), 3) if total else 0.0
+    return parsed
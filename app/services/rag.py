@@ -1,40 +1,331 @@
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import asyncio
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import Chroma
 from app.config import settings
 from structlog import get_logger
-import json
-import pandas as pd
-from typing import List
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.tenant_profile import TenantPreference
 from app.schemas.recommendation import RecommendationRequest
+from app.services.route_index import get_route_index
+from app.services.embedding_cache import get_embedding_cache
+from app.services.vector_engine import ExactVectorIndex
+from app.services.write_behind import get_write_behind
 
 logger = get_logger()
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+_model: Optional[Embeddings] = None
+_model_lock = threading.Lock()
+_model_status: Dict[str, Any] = {"state": "not_loaded", "load_seconds": None, "error": None}
+
+
+def get_embedding_model() -> Embeddings:
+    """Load the sentence-transformers model on first use (thread-safe, once per process)."""
+    global _model
+    if not settings.EMBEDDINGS_ENABLED:
+        raise RuntimeError("Embeddings are disabled (EMBEDDINGS_ENABLED=false)")
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model_status["state"] = "loading"
+                started = time.perf_counter()
+                try:
+                    # Imported here so workers that never retrieve don't pay for torch either
+                    from langchain_community.embeddings import HuggingFaceEmbeddings
+                    _model = HuggingFaceEmbeddings(
+                        model_name=settings.EMBEDDING_MODEL_NAME,
+                        model_kwargs={"device": settings.EMBEDDING_DEVICE},
+                        encode_kwargs={"batch_size": settings.EMBEDDING_BATCH_SIZE},
+                    )
+                except Exception as e:
+                    _model_status.update(state="failed", error=str(e))
+                    raise
+                _model_status.update(state="loaded", load_seconds=round(time.perf_counter() - started, 3), error=None)
+                logger.info("Embedding model loaded", model=settings.EMBEDDING_MODEL_NAME, load_seconds=_model_status["load_seconds"])
+    return _model
+
+
+def warm_up_embeddings() -> None:
+    """Load the model and run one query so the first request doesn't pay for it."""
+    try:
+        get_embedding_model().embed_query("warm up")
+    except Exception as e:
+        logger.warning("Embedding warm-up failed", error=str(e))
+
+
+def embedding_status() -> Dict[str, Any]:
+    cache = get_embedding_cache() if settings.EMBEDDINGS_ENABLED else None
+    return {
+        "enabled": settings.EMBEDDINGS_ENABLED,
+        "model": settings.EMBEDDING_MODEL_NAME,
+        **_model_status,
+        "cache": cache.stats() if cache is not None else None,
+    }
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings proxy handed to the vector store; defers the model load to the first embed
+    call. Documents go through the on-disk embedding cache, so the model is only loaded
+    when some text has never been embedded before.
+    """
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cache = get_embedding_cache()
+        if cache is None:
+            return get_embedding_model().embed_documents(texts)
+        return cache.embed(texts, lambda batch: get_embedding_model().embed_documents(batch), settings.EMBEDDING_BATCH_SIZE)
+
+    def embed_query(self, text: str) -> List[float]:
+        return get_embedding_model().embed_query(text)
+
+
+embeddings = LazyEmbeddings()
+
+PROPERTY_COLLECTION = "properties"
+ROUTE_COLLECTION = "transport_routes"
+
+_stores: Dict[str, Chroma] = {}
+_stores_lock = threading.Lock()
+# updated_at watermark of the last incremental sync from the properties table
+_last_synced_at: Optional[datetime] = None
+# time.monotonic() of the last full pass, which also removes listings deleted outright
+_last_reconciled_at: Optional[float] = None
+
+
+def get_vector_store(collection: str = PROPERTY_COLLECTION):
+    """Return the shared vector store for a collection (see VECTOR_BACKEND), opening it on first use."""
+    store = _stores.get(collection)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(collection)
+            if store is None:
+                if settings.VECTOR_BACKEND == "numpy":
+                    store = ExactVectorIndex(embeddings)
+                else:
+                    store = Chroma(
+                        collection_name=collection,
+                        embedding_function=embeddings,
+                        persist_directory=settings.VECTOR_STORE_DIR,
+                    )
+                _stores[collection] = store
+    return store
+
+
+def property_document(p: dict) -> str:
+    doc = f"{p['title']}: {p['location']}, {p['price']} ETB, {p['house_type']}"
+    if p.get("bedrooms") is not None:
+        doc += f", {p['bedrooms']} bedrooms"
+    return f"{doc}, amenities: {', '.join(p.get('amenities') or [])}"
+
+
+def content_hash(document: str) -> str:
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+def property_metadata(p: dict, document: str) -> Dict[str, Any]:
+    """Filterable scalar metadata stored with each vector (Chroma rejects None values)."""
+    metadata = {
+        "property_id": str(p["id"]),
+        "title": p.get("title"),
+        "location": p.get("location"),
+        "price": float(p["price"]) if p.get("price") is not None else None,
+        "house_type": p.get("house_type"),
+        "lat": float(p["lat"]) if p.get("lat") is not None else None,
+        "lon": float(p["lon"]) if p.get("lon") is not None else None,
+        "content_hash": content_hash(document),
+    }
+    return {k: v for k, v in metadata.items() if v is not None}
+
+
+def _upsert_changed(store: Chroma, ids: List[str], documents: List[str], metadatas: List[dict]) -> int:
+    """Embed and upsert only the documents whose content hash differs from the stored one."""
+    if not ids:
+        return 0
+    existing = store.get(ids=ids, include=["metadatas"])
+    stored = {i: (m or {}).get("content_hash") for i, m in zip(existing["ids"], existing["metadatas"])}
+    changed = [n for n, i in enumerate(ids) if stored.get(i) != metadatas[n]["content_hash"]]
+    if changed:
+        store.add_texts(
+            [documents[n] for n in changed],
+            metadatas=[metadatas[n] for n in changed],
+            ids=[ids[n] for n in changed],
+        )
+    return len(changed)
+
+
+def _delete(store: Chroma, ids: Iterable[str]) -> int:
+    ids = list(ids)
+    if ids:
+        store.delete(ids=ids)
+    return len(ids)
+
+
+def index_properties(properties: List[dict], removed_ids: Iterable[str] = ()) -> Dict[str, int]:
+    """
+    Incrementally index properties by id: unchanged rows (same content hash) are skipped,
+    changed or new rows are re-embedded and upserted, and `removed_ids` are deleted.
+    """
+    store = get_vector_store(PROPERTY_COLLECTION)
+    ids, documents, metadatas = [], [], []
+    for p in properties:
+        document = property_document(p)
+        ids.append(str(p["id"]))
+        documents.append(document)
+        metadatas.append(property_metadata(p, document))
+    upserted = _upsert_changed(store, ids, documents, metadatas)
+    deleted = _delete(store, (str(i) for i in removed_ids))
+    return {"seen": len(ids), "upserted": upserted, "skipped": len(ids) - upserted, "deleted": deleted}
+
+
+def index_routes() -> Dict[str, int]:
+    """Index transport routes; a no-op unless the route data changed."""
+    store = get_vector_store(ROUTE_COLLECTION)
+    docs: Dict[str, tuple] = {}
+    for t in get_route_index().routes:
+        document = f"{t.source} to {t.destination}: {t.price} ETB, {t.kilometer} km"
+        metadata = {"source": t.source, "destination": t.destination, "price": t.price, "content_hash": content_hash(document)}
+        docs[f"{t.source}->{t.destination}"] = (document, metadata)  # Chroma rejects duplicate ids in a batch
+    ids = list(docs)
+    documents = [docs[i][0] for i in ids]
+    metadatas = [docs[i][1] for i in ids]
+    upserted = _upsert_changed(store, ids, documents, metadatas)
+    stale = set(store.get(include=[])["ids"]) - set(ids)
+    return {"seen": len(ids), "upserted": upserted, "deleted": _delete(store, stale)}
+
+
+def _store_count(store) -> int:
+    return len(store) if isinstance(store, ExactVectorIndex) else store._collection.count()
+
+
+async def _sync_properties(db: AsyncSession, since: Optional[datetime]) -> Tuple[Dict[str, int], Optional[datetime]]:
+    """
+    Index the rows updated at or after `since`; without `since`, the whole catalog, also
+    deleting vectors whose row no longer exists. Returns the stats and the newest updated_at read.
+    """
+    params: Dict[str, Any] = {}
+    since_sql = ""
+    if since is not None:
+        since_sql = "WHERE updated_at >= :since"
+        params["since"] = since
+    result = await db.execute(text(
+        f"SELECT id, title, location, price, house_type, amenities, lat, lon, status, updated_at FROM properties {since_sql}"
+    ), params)
+    rows = [dict(zip(result.keys(), row)) for row in result.fetchall()]
+    approved = [r for r in rows if r["status"] == "APPROVED"]
+    removed = {str(r["id"]) for r in rows if r["status"] != "APPROVED"}
+    if since is None:
+        store = get_vector_store(PROPERTY_COLLECTION)
+        known = {str(r["id"]) for r in rows}
+        removed |= set(await asyncio.to_thread(lambda: store.get(include=[])["ids"])) - known
+    stats = await asyncio.to_thread(index_properties, approved, removed)
+    return stats, max((r["updated_at"] for r in rows), default=None)
+
+
+async def sync_vector_store(db: AsyncSession) -> Dict[str, int]:
+    """
+    Bring the property index up to date with the database. Passes normally read only rows
+    whose updated_at is past the last watermark minus VECTOR_SYNC_OVERLAP_SECONDS, so rows
+    committed late with an older timestamp are still picked up. The whole catalog is
+    reconciled (including listings deleted outright) on the first pass, every
+    VECTOR_SYNC_RECONCILE_SECONDS, and whenever the index and the approved rows disagree in number.
+    """
+    global _last_synced_at, _last_reconciled_at
+    if not settings.EMBEDDINGS_ENABLED:
+        return {}
+    full = _last_synced_at is None or time.monotonic() - _last_reconciled_at >= settings.VECTOR_SYNC_RECONCILE_SECONDS
+    since = None if full else _last_synced_at - timedelta(seconds=settings.VECTOR_SYNC_OVERLAP_SECONDS)
+    stats, newest = await _sync_properties(db, since)
+    if not full:
+        approved_count = (await db.execute(text("SELECT count(*) FROM properties WHERE status = 'APPROVED'"))).scalar()
+        indexed_count = await asyncio.to_thread(_store_count, get_vector_store(PROPERTY_COLLECTION))
+        if approved_count != indexed_count:
+            logger.info("Vector store out of step with the database, reconciling", approved=approved_count, indexed=indexed_count)
+            stats, newest = await _sync_properties(db, None)
+            full = True
+    if full:
+        _last_reconciled_at = time.monotonic()
+    if newest is not None:
+        _last_synced_at = max(newest, _last_synced_at) if _last_synced_at is not None else newest
+    logger.info("Vector store synced", reconciled=full, **stats)
+    return stats
+
 
 async def setup_vector_store(properties: List[dict]):
-    with open("train_data/transport_price_data.json", "r") as f:
-        transport_data = json.load(f)
-    documents = [f"{p['title']}: {p['location']}, {p['price']} ETB, {p['house_type']}, {p['bedrooms']} bedrooms, amenities: {', '.join(p['amenities'])}" for p in properties]
-    transport_docs = [f"{t['source']} to {t['destination']}: {t['price']} ETB, {t['kilometer']} km" for t in transport_data]
-    documents.extend(transport_docs)
-    vectorstore = Chroma.from_texts(documents, embeddings, persist_directory="/persistent-storage/chroma_db")
-    return vectorstore
-
-async def retrieve_relevant_properties(vectorstore, query: str, k: int = 5):
-    results = vectorstore.similarity_search(query, k=k)
+    await asyncio.to_thread(index_properties, properties)
+    await asyncio.to_thread(index_routes)
+    return get_vector_store(PROPERTY_COLLECTION)
+
+def _chroma_filter(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    house_type: Optional[str] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> Optional[Dict[str, Any]]:
+    conditions: List[Dict[str, Any]] = []
+    if min_price is not None:
+        conditions.append({"price": {"$gte": float(min_price)}})
+    if max_price is not None:
+        conditions.append({"price": {"$lte": float(max_price)}})
+    if house_type:
+        conditions.append({"house_type": {"$eq": house_type}})
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        conditions += [{"lat": {"$gte": min_lat}}, {"lat": {"$lte": max_lat}},
+                       {"lon": {"$gte": min_lon}}, {"lon": {"$lte": max_lon}}]
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+async def retrieve_relevant_properties(
+    vectorstore,
+    query: str,
+    k: int = 5,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    house_type: Optional[str] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+):
+    """Metadata of the k most similar properties, optionally filtered by price band, house type and (min_lat, min_lon, max_lat, max_lon) box."""
+    filters = {"min_price": min_price, "max_price": max_price, "house_type": house_type, "bbox": bbox}
+    if isinstance(vectorstore, ExactVectorIndex):
+        results = await asyncio.to_thread(vectorstore.similarity_search, query, k, **filters)
+    else:
+        results = await asyncio.to_thread(vectorstore.similarity_search, query, k=k, filter=_chroma_filter(**filters))
     return [doc.metadata for doc in results]
 
+def _preference_row(user_id: str, request: RecommendationRequest) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "job_school_location": request.job_school_location,
+        "salary": request.salary,
+        "house_type": request.house_type,
+        "family_size": request.family_size,
+        "preferred_amenities": request.preferred_amenities,
+        "created_at": datetime.utcnow(),
+    }
+
 async def save_tenant_preference(user_id: str, request: RecommendationRequest, db: AsyncSession) -> int:
-    preference = TenantPreference(
-        user_id=user_id,
-        job_school_location=request.job_school_location,
-        salary=request.salary,
-        house_type=request.house_type,
-        family_size=request.family_size,
-        preferred_amenities=request.preferred_amenities
-    )
-    db.add(preference)
+    return (await save_tenant_preferences(user_id, [request], db))[0]
+
+async def save_tenant_preferences(user_id: str, requests: List[RecommendationRequest], db: AsyncSession) -> List[int]:
+    """
+    Record tenant preferences and return their ids. With the write-behind queue running the
+    ids are pre-allocated and the rows inserted later; otherwise one flush and one commit.
+    """
+    rows = [_preference_row(user_id, request) for request in requests]
+    queue = get_write_behind()
+    if queue is not None:
+        return await queue.add_preferences(rows)
+    preferences = [TenantPreference(**row) for row in rows]
+    db.add_all(preferences)
+    await db.flush()
+    ids = [preference.id for preference in preferences]
     await db.commit()
-    await db.refresh(preference)
-    return preference.id
+    return ids
@@ -0,0 +1,51 @@
+import hashlib
+import json
+from functools import lru_cache
+from typing import Any, Dict
+
+from app.config import settings
+from app.services.promttemplet import build_reason_prompt
+from app.utils.cache import TieredCache
+
+# Bucket widths for the numeric context; tenants within a bucket share one reason
+_BUCKETS = {
+    "distance_km": 0.5,
+    "monthly_transport_cost": 50.0,
+    "single_trip_fare": 1.0,
+    "rent_price": 50.0,
+    "salary": 500.0,
+}
+
+reason_cache = TieredCache(
+    "reasons",
+    maxsize=settings.REASON_CACHE_MAX_ENTRIES,
+    ttl=settings.REASON_CACHE_TTL_SECONDS,
+    use_redis=settings.REASON_CACHE_REDIS,
+)
+
+
+@lru_cache(maxsize=None)
+def prompt_template_hash(language: str) -> str:
+    """Fingerprint of the prompt template: the prompt rendered with empty inputs."""
+    skeleton = build_reason_prompt({}, {}, {}, language)
+    return hashlib.sha256(skeleton.encode("utf-8")).hexdigest()[:16]
+
+
+def _bucket(value: Any, step: float) -> Any:
+    try:
+        return round(float(value) / step) * step
+    except (TypeError, ValueError):
+        return None
+
+
+def reason_cache_key(property: Dict[str, Any], language: str, context: Dict[str, Any] | None) -> str:
+    ctx = context or {}
+    bucketed = {k: _bucket(ctx.get(k), step) for k, step in _BUCKETS.items()}
+    bucketed.update({
+        "family_size": ctx.get("family_size"),
+        "bedrooms": ctx.get("bedrooms"),
+        "house_type": ctx.get("house_type"),
+        "amenities": sorted(str(a) for a in (ctx.get("amenities") or [])),
+    })
+    digest = hashlib.sha256(json.dumps(bucketed, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:24]
+    return f"{property.get('id')}:{language}:{prompt_template_hash(language)}:{digest}"
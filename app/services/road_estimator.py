@@ -0,0 +1,130 @@
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from structlog import get_logger
+
+from app.config import settings
+from app.utils.geo import haversine
+
+logger = get_logger()
+
+# Typical road/straight-line ratio for city driving, used until Gebeta samples exist
+DEFAULT_DETOUR_FACTOR = 1.3
+# Ratios outside this range are GPS/geocoding noise rather than real detours
+_MIN_RATIO, _MAX_RATIO = 1.0, 3.0
+# Pairs closer than this are dominated by rounding and are not used for calibration
+_MIN_STRAIGHT_KM = 0.2
+# Weight the saved factor carries at most, so it keeps following new observations
+_MAX_SAVED_SAMPLES = 1000
+
+
+class RoadDistanceEstimator:
+    """
+    Offline road-distance estimate: haversine distance times a detour factor.
+
+    The factor is a running mean of road/straight-line ratios observed from Gebeta
+    responses, seeded from a JSON file. Every worker adds only the ratios it observed
+    itself to that file, so concurrent workers and restarts never count a sample twice.
+    """
+
+    def __init__(self, factor: float = DEFAULT_DETOUR_FACTOR, samples: int = 0):
+        self._ratio_sum = factor * samples
+        self._samples = samples
+        self._default = factor
+        # Observations made since this estimator was loaded or last saved
+        self._new_sum = 0.0
+        self._new_samples = 0
+
+    @property
+    def factor(self) -> float:
+        samples = self._samples + self._new_samples
+        return (self._ratio_sum + self._new_sum) / samples if samples else self._default
+
+    @property
+    def samples(self) -> int:
+        return self._samples + self._new_samples
+
+    @property
+    def unsaved_samples(self) -> int:
+        return self._new_samples
+
+    def observe(self, o_lat: float, o_lon: float, d_lat: float, d_lon: float, road_m: float) -> None:
+        straight_km = haversine(o_lat, o_lon, d_lat, d_lon)
+        if straight_km < _MIN_STRAIGHT_KM or road_m <= 0:
+            return
+        ratio = road_m / 1000 / straight_km
+        if _MIN_RATIO <= ratio <= _MAX_RATIO:
+            self._new_sum += ratio
+            self._new_samples += 1
+
+    def estimate_m(self, o_lat: float, o_lon: float, d_lat: float, d_lon: float) -> float:
+        return haversine(o_lat, o_lon, d_lat, d_lon) * self.factor * 1000
+
+    @classmethod
+    def load(cls, path: str) -> "RoadDistanceEstimator":
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(float(data.get("detour_factor", DEFAULT_DETOUR_FACTOR)), int(data.get("samples", 0)))
+
+    def save(self, path: str) -> None:
+        """
+        Merge this estimator's unsaved observations into the file at `path`, under an
+        exclusive lock so workers saving at the same time do not overwrite each other.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                stored = self.load(path)
+            except FileNotFoundError:
+                stored = RoadDistanceEstimator(self._default)
+            samples = stored.samples + self._new_samples
+            ratio_sum = stored.factor * stored.samples + self._new_sum
+            if samples > _MAX_SAVED_SAMPLES:
+                ratio_sum, samples = ratio_sum * _MAX_SAVED_SAMPLES / samples, _MAX_SAVED_SAMPLES
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({
+                    "detour_factor": round(ratio_sum / samples, 4) if samples else self._default,
+                    "samples": samples,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                }, f, indent=2)
+            os.replace(tmp, path)
+        # The file now holds these observations (and other workers'); later saves add only newer ones
+        self._ratio_sum, self._samples = ratio_sum, samples
+        self._new_sum, self._new_samples = 0.0, 0
+
+
+_estimator: Optional[RoadDistanceEstimator] = None
+_estimator_lock = threading.Lock()
+
+
+def get_road_estimator() -> RoadDistanceEstimator:
+    """Return the shared estimator, loading the calibrated factor on first use."""
+    global _estimator
+    if _estimator is None:
+        with _estimator_lock:
+            if _estimator is None:
+                try:
+                    _estimator = RoadDistanceEstimator.load(settings.DETOUR_FACTOR_PATH)
+                except FileNotFoundError:
+                    _estimator = RoadDistanceEstimator()
+                except Exception as e:
+                    logger.warning("Detour factor unreadable, using default", path=settings.DETOUR_FACTOR_PATH, error=str(e))
+                    _estimator = RoadDistanceEstimator()
+    return _estimator
+
+
+def save_road_estimator() -> None:
+    """Add this process's new detour observations to the shared factor file (best effort)."""
+    if _estimator is None or not _estimator.unsaved_samples:
+        return
+    try:
+        _estimator.save(settings.DETOUR_FACTOR_PATH)
+        logger.info("Detour factor saved", factor=round(_estimator.factor, 4), samples=_estimator.samples)
+    except Exception as e:
+        logger.warning("Failed to save detour factor", path=settings.DETOUR_FACTOR_PATH, error=str(e))
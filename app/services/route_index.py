@@ -0,0 +1,155 @@
+import json
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from structlog import get_logger
+
+from app.config import settings
+from app.utils.geo import haversine_matrix
+
+logger = get_logger()
+
+# Upper bound on (properties x routes) cells scored per NumPy pass, ~16 MB of float64
+_MAX_MATRIX_CELLS = 2_000_000
+
+
+@dataclass(frozen=True)
+class Route:
+    source: str
+    destination: str
+    kilometer: Optional[float]
+    price: float
+    source_lat: Optional[float]
+    source_lon: Optional[float]
+    dest_lat: Optional[float]
+    dest_lon: Optional[float]
+
+    @property
+    def has_coords(self) -> bool:
+        return None not in (self.source_lat, self.source_lon, self.dest_lat, self.dest_lon)
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RouteIndex:
+    """
+    Read-only, process-wide view of the transport route dataset.
+
+    Built once from the JSON file and shared by every request; all containers are
+    tuples or read-only mappings so concurrent readers need no locking.
+    """
+
+    def __init__(self, routes: List[Route]):
+        self.routes: Tuple[Route, ...] = tuple(routes)
+        by_source: Dict[str, List[int]] = {}
+        by_destination: Dict[str, List[int]] = {}
+        for i, r in enumerate(self.routes):
+            by_source.setdefault(r.source.lower(), []).append(i)
+            by_destination.setdefault(r.destination.lower(), []).append(i)
+        self._by_source: Mapping[str, Tuple[int, ...]] = MappingProxyType({k: tuple(v) for k, v in by_source.items()})
+        self._by_destination: Mapping[str, Tuple[int, ...]] = MappingProxyType({k: tuple(v) for k, v in by_destination.items()})
+        # Coordinate columns for routes that have all four stops, frozen for sharing
+        with_coords = [i for i, r in enumerate(self.routes) if r.has_coords]
+        self._coord_ids = np.array(with_coords, dtype=np.int64)
+        self._source_lat = np.array([self.routes[i].source_lat for i in with_coords], dtype=np.float64)
+        self._source_lon = np.array([self.routes[i].source_lon for i in with_coords], dtype=np.float64)
+        self._dest_lat = np.array([self.routes[i].dest_lat for i in with_coords], dtype=np.float64)
+        self._dest_lon = np.array([self.routes[i].dest_lon for i in with_coords], dtype=np.float64)
+        for arr in (self._coord_ids, self._source_lat, self._source_lon, self._dest_lat, self._dest_lon):
+            arr.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    @classmethod
+    def from_records(cls, records: List[dict]) -> "RouteIndex":
+        routes = []
+        for t in records:
+            source = t.get("source")
+            destination = t.get("destination")
+            price = _to_float(t.get("price"))
+            if not isinstance(source, str) or not isinstance(destination, str) or price is None:
+                continue
+            routes.append(Route(
+                source=source,
+                destination=destination,
+                kilometer=_to_float(t.get("kilometer")),
+                price=price,
+                source_lat=_to_float(t.get("source_lat")),
+                source_lon=_to_float(t.get("source_lon")),
+                dest_lat=_to_float(t.get("dest_lat")),
+                dest_lon=_to_float(t.get("dest_lon")),
+            ))
+        return cls(routes)
+
+    @classmethod
+    def load(cls, path: str) -> "RouteIndex":
+        with open(path, "r") as f:
+            return cls.from_records(json.load(f))
+
+    def _ids_containing(self, names: Mapping[str, Tuple[int, ...]], needle: str) -> set:
+        # Scan distinct stop names only (not rows)
+        needle = needle.lower()
+        ids = set()
+        for name, idx in names.items():
+            if needle in name:
+                ids.update(idx)
+        return ids
+
+    def match(self, source: str, destination: str) -> List[Route]:
+        """Routes whose source and destination contain the given names (case-insensitive)."""
+        if not source or not destination:
+            return []
+        ids = self._ids_containing(self._by_source, source) & self._ids_containing(self._by_destination, destination)
+        return [self.routes[i] for i in sorted(ids)]
+
+    def nearest_routes(
+        self,
+        user_lat: float,
+        user_lon: float,
+        destinations: Sequence[Tuple[float, float]],
+    ) -> List[Optional[Route]]:
+        """
+        Best route for each (lat, lon) destination, minimising user->source stop plus
+        destination->dest stop distance. Scores all destinations against all routes in
+        NumPy, chunked so the working matrix stays bounded.
+        """
+        if not len(destinations) or not len(self._coord_ids):
+            return [None] * len(destinations)
+        dest = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        user_to_source = haversine_matrix([user_lat], [user_lon], self._source_lat, self._source_lon)[0]
+        best = np.empty(len(dest), dtype=np.int64)
+        chunk = max(1, _MAX_MATRIX_CELLS // len(self._coord_ids))
+        for start in range(0, len(dest), chunk):
+            part = dest[start:start + chunk]
+            total = haversine_matrix(part[:, 0], part[:, 1], self._dest_lat, self._dest_lon)
+            total += user_to_source
+            best[start:start + chunk] = total.argmin(axis=1)
+        return [self.routes[i] for i in self._coord_ids[best]]
+
+
+_index: Optional[RouteIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_route_index() -> RouteIndex:
+    """Return the shared route index, loading it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = RouteIndex.load(settings.TRANSPORT_DATA_PATH)
+                    logger.info("Transport route index loaded", path=settings.TRANSPORT_DATA_PATH, routes=len(_index))
+                except Exception as e:
+                    logger.warning("Transport route data unavailable, using empty index", path=settings.TRANSPORT_DATA_PATH, error=str(e))
+                    _index = RouteIndex([])
+    return _index
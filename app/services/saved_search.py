@@ -0,0 +1,230 @@
+import json
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, cast, func, or_, select, text
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from structlog import get_logger
+
+from app.config import settings
+from app.models.saved_search import SavedSearch, SavedSearchRefreshState, SavedSearchResult
+from app.services.gazetteer import get_gazetteer
+from app.services.property_search import execute_sql_query
+from app.services.query_parser import AMENITIES, HOUSE_TYPES, ParsedSearch
+from app.services.rag import content_hash
+from app.utils.geo import haversine
+
+logger = get_logger()
+
+# Kilometres per degree of latitude, for the radius pre-filter box
+_KM_PER_DEGREE = 111.32
+# Advisory lock id held by the worker running a refresh pass
+_REFRESH_LOCK_KEY = 0x5A7ED5EA
+# Changed rows are read from this long before the stored watermark, so rows committed late
+# with an older updated_at are not missed (re-evaluating a search twice is harmless)
+_WATERMARK_OVERLAP = timedelta(seconds=60)
+# Stored results that list any of the $ids property ids
+_HOLDS_PROPERTY = "$[*].property_id ? (@ == $ids[*])"
+
+
+def saved_search_criteria(search: SavedSearch) -> Tuple[ParsedSearch, Optional[Dict[str, float]]]:
+    """
+    Candidate query for a saved search, plus the coordinates of its location when the
+    gazetteer knows it. With coordinates, `max_distance_km` (or the default radius)
+    replaces the location-name match with a bounding box.
+    """
+    criteria = ParsedSearch(
+        min_price=search.min_price,
+        max_price=search.max_price,
+        house_type=HOUSE_TYPES.get((search.house_type or "").lower(), (search.house_type or "").lower()) or None,
+        bedrooms=search.bedrooms,
+        amenities=sorted({AMENITIES.get(a.lower(), a.lower()) for a in search.amenities or []}),
+        limit=settings.SAVED_SEARCH_CANDIDATE_LIMIT,
+    )
+    coords = None
+    if search.location:
+        place = get_gazetteer().lookup(search.location)
+        if place and place.confidence >= settings.GEOCODE_MIN_CONFIDENCE:
+            coords = {"lat": place.lat, "lon": place.lon}
+            radius = search.max_distance_km or settings.SAVED_SEARCH_DEFAULT_RADIUS_KM
+            dlat = radius / _KM_PER_DEGREE
+            dlon = radius / (_KM_PER_DEGREE * max(math.cos(math.radians(place.lat)), 0.01))
+            criteria.bbox = (place.lat - dlat, place.lon - dlon, place.lat + dlat, place.lon + dlon)
+        else:
+            criteria.location = search.location
+    return criteria, coords
+
+
+def rank_saved_search_results(search: SavedSearch, rows: List[Dict[str, Any]], coords: Optional[Dict[str, float]]) -> List[Dict[str, Any]]:
+    """Score candidates by proximity (0.6) and price (0.4), best first, dropping those beyond the radius."""
+    radius = search.max_distance_km or settings.SAVED_SEARCH_DEFAULT_RADIUS_KM
+    prices = [float(r["price"]) for r in rows]
+    low, high = (min(prices), max(prices)) if prices else (0.0, 0.0)
+    ranked = []
+    for row in rows:
+        price = float(row["price"])
+        distance_km = None
+        if coords and row.get("lat") is not None and row.get("lon") is not None:
+            distance_km = haversine(coords["lat"], coords["lon"], float(row["lat"]), float(row["lon"]))
+            if distance_km > radius:
+                continue
+        proximity = max(0.0, 1 - distance_km / radius) if distance_km is not None else 0.0
+        if search.max_price:
+            affordability = min(1.0, max(0.0, 1 - price / search.max_price))
+        else:
+            affordability = 1 - (price - low) / (high - low) if high > low else 1.0
+        ranked.append({
+            "property_id": str(row["id"]),
+            "title": row.get("title"),
+            "location": row.get("location"),
+            "price": price,
+            "house_type": row.get("house_type"),
+            "amenities": row.get("amenities") or [],
+            "photos": row.get("photos") or [],
+            "lat": row.get("lat"),
+            "lon": row.get("lon"),
+            "distance_km": round(distance_km, 2) if distance_km is not None else None,
+            "score": round(0.6 * proximity + 0.4 * affordability, 3),
+        })
+    ranked.sort(key=lambda r: (-r["score"], r["price"]))
+    return ranked[:settings.SAVED_SEARCH_RESULT_LIMIT]
+
+
+async def refresh_saved_search(search: SavedSearch, db: AsyncSession, fingerprint: Optional[str] = None, force: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """
+    Recompute one saved search and upsert its stored results (uncommitted). When the
+    criteria and candidate rows hash to `fingerprint` and `force` is unset, nothing is
+    written and None is returned.
+    """
+    criteria, coords = saved_search_criteria(search)
+    sql, params = criteria.to_sql()
+    rows = await execute_sql_query(sql, db, params)
+    new_fingerprint = content_hash(json.dumps([params, coords, rows], sort_keys=True, default=str))
+    if new_fingerprint == fingerprint and not force:
+        return None
+    recommendations = rank_saved_search_results(search, rows, coords)
+    values = {"recommendations": recommendations, "fingerprint": new_fingerprint, "refreshed_at": datetime.utcnow()}
+    await db.execute(
+        insert(SavedSearchResult)
+        .values(saved_search_id=search.id, **values)
+        .on_conflict_do_update(index_elements=[SavedSearchResult.saved_search_id], set_=values)
+    )
+    return recommendations
+
+
+def property_could_match(params: Dict[str, Any], prop: Dict[str, Any]) -> bool:
+    """
+    Whether a property passes the price, house type, area and location-name filters of a
+    saved search's candidate query (`ParsedSearch.to_sql` params). Looser than the query
+    itself, so a search it rejects cannot have gained this property.
+    """
+    if prop["status"] != "APPROVED":
+        return False
+    price = float(prop["price"]) if prop["price"] is not None else None
+    if "min_price" in params and (price is None or price < params["min_price"]):
+        return False
+    if "max_price" in params and (price is None or price > params["max_price"]):
+        return False
+    if "house_types" in params and (prop["house_type"] or "").lower() not in params["house_types"]:
+        return False
+    if "min_lat" in params:
+        if prop["lat"] is None or prop["lon"] is None:
+            return False
+        if not (params["min_lat"] <= prop["lat"] <= params["max_lat"] and params["min_lon"] <= prop["lon"] <= params["max_lon"]):
+            return False
+    if "location" in params and params["location"].strip("%").lower() not in (prop["location"] or "").lower():
+        return False
+    return True
+
+
+async def refresh_saved_searches(db: AsyncSession) -> Dict[str, int]:
+    """
+    One pass of the refresh worker. Saved searches without results or older than
+    SAVED_SEARCH_MAX_AGE_SECONDS are always recomputed. Properties changed since the last
+    completed pass (a watermark stored in SavedSearchRefreshState, so it holds whichever
+    worker ran that pass) re-evaluate only the searches they could enter, plus those whose
+    stored results list them; the rest stay untouched. Every search is re-evaluated on the
+    first pass ever and when properties were deleted outright.
+    """
+    # Every worker runs this loop; the transaction-scoped lock lets one of them do each pass
+    if not (await db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _REFRESH_LOCK_KEY})).scalar():
+        await db.rollback()
+        logger.debug("Saved search refresh running in another worker")
+        return {"checked": 0, "refreshed": 0, "failed": 0}
+    state = await db.get(SavedSearchRefreshState, 1)
+    newest, count = (await db.execute(text("SELECT max(updated_at), count(*) FROM properties"))).one()
+    changed: List[Dict[str, Any]] = []
+    evaluate_all = state is None
+    if state is not None:
+        result = await db.execute(text(
+            "SELECT id, price, house_type, location, lat, lon, status FROM properties WHERE updated_at >= :since"
+        ), {"since": state.properties_updated_at - _WATERMARK_OVERLAP})
+        changed = [dict(zip(result.keys(), row)) for row in result.fetchall()]
+        inserted = (await db.execute(
+            text("SELECT count(*) FROM properties WHERE created_at > :since"), {"since": state.properties_updated_at}
+        )).scalar()
+        # Fewer rows than were there plus those inserted since: some were deleted outright
+        evaluate_all = count < state.properties_count + inserted
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.SAVED_SEARCH_MAX_AGE_SECONDS)
+    holds_changed = func.jsonb_path_exists(
+        SavedSearchResult.recommendations, cast(_HOLDS_PROPERTY, JSONPATH),
+        bindparam("changed_ids", {"ids": [str(p["id"]) for p in changed]}, type_=JSONB),
+    )
+    stmt = (
+        select(SavedSearch, SavedSearchResult.fingerprint, SavedSearchResult.refreshed_at, holds_changed)
+        .outerjoin(SavedSearchResult, SavedSearchResult.saved_search_id == SavedSearch.id)
+        .order_by(SavedSearch.id)
+    )
+    if not evaluate_all and not changed:
+        stmt = stmt.where(or_(SavedSearchResult.saved_search_id.is_(None), SavedSearchResult.refreshed_at < stale_before))
+    stats = {"checked": 0, "refreshed": 0, "failed": 0}
+    for search, fingerprint, refreshed_at, holds in (await db.execute(stmt)).all():
+        force = refreshed_at is None or refreshed_at < stale_before
+        if not (force or evaluate_all or holds):
+            params = saved_search_criteria(search)[0].to_sql()[1]
+            if not any(property_could_match(params, p) for p in changed):
+                continue
+        stats["checked"] += 1
+        try:
+            # A savepoint per search: a failed statement would otherwise abort the whole pass
+            async with db.begin_nested():
+                refreshed = await refresh_saved_search(search, db, fingerprint, force)
+            if refreshed is not None:
+                stats["refreshed"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            logger.warning("Saved search refresh failed", saved_search_id=search.id, error=str(e))
+    # Advance the shared watermark only when every search caught up, so failures are retried
+    if not stats["failed"] and newest is not None:
+        await db.execute(
+            insert(SavedSearchRefreshState)
+            .values(id=1, properties_updated_at=newest, properties_count=count)
+            .on_conflict_do_update(index_elements=[SavedSearchRefreshState.id],
+                                   set_={"properties_updated_at": newest, "properties_count": count})
+        )
+    await db.commit()
+    logger.info("Saved search results refreshed", evaluated_all=evaluate_all, changed_properties=len(changed), **stats)
+    return stats
+
+
+async def get_saved_search_results(user_id: str, saved_search_id: int, db: AsyncSession) -> Optional[Dict[str, Any]]:
+    """Stored results for one of the user's saved searches, computed on first read; None if not theirs."""
+    row = (await db.execute(
+        select(SavedSearchResult.recommendations, SavedSearchResult.refreshed_at)
+        .join(SavedSearch, SavedSearch.id == SavedSearchResult.saved_search_id)
+        .where(SavedSearchResult.saved_search_id == saved_search_id, SavedSearch.user_id == user_id)
+    )).one_or_none()
+    if row is not None:
+        recommendations, refreshed_at = row
+    else:
+        search = (await db.execute(
+            select(SavedSearch).where(SavedSearch.id == saved_search_id, SavedSearch.user_id == user_id)
+        )).scalar_one_or_none()
+        if search is None:
+            return None
+        recommendations = await refresh_saved_search(search, db, force=True)
+        refreshed_at = datetime.utcnow()
+        await db.commit()
+    return {"saved_search_id": saved_search_id, "refreshed_at": refreshed_at, "recommendations": recommendations}
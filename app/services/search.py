@@ -1,8 +1,8 @@
-import httpx
 from app.config import settings
 from structlog import get_logger
 from typing import List, Optional
 from pybreaker import CircuitBreaker
+from app.core.http_clients import get_http_client
 
 logger = get_logger()
 breaker = CircuitBreaker(fail_max=3, reset_timeout=60)
@@ -19,20 +19,20 @@ async def search_properties(
     user_lon: Optional[float] = None,
     status: Optional[str] = None
 ) -> List[dict]:
-    async with httpx.AsyncClient() as client:
-        params = {
-            "location": location,
-            "min_price": min_price,
-            "max_price": max_price,
-            "house_type": house_type,
-            "bedrooms": bedrooms,
-            "amenities": preferred_amenities,
-            "user_lat": user_lat,
-            "user_lon": user_lon,
-            "status": status
-        }
-        response = await client.get(f"{settings.SEARCH_FILTERS_URL}/api/v1/search", params=params)
-        if response.status_code != 200:
-            logger.error("Search failed", status_code=response.status_code)
-            raise ValueError("Search failed")
-        return response.json()["results"]
+    client = get_http_client("search_filters")
+    params = {
+        "location": location,
+        "min_price": min_price,
+        "max_price": max_price,
+        "house_type": house_type,
+        "bedrooms": bedrooms,
+        "amenities": preferred_amenities,
+        "user_lat": user_lat,
+        "user_lon": user_lon,
+        "status": status
+    }
+    response = await client.get(f"{settings.SEARCH_FILTERS_URL}/api/v1/search", params=params)
+    if response.status_code != 200:
+        logger.error("Search failed", status_code=response.status_code)
+        raise ValueError("Search failed")
+    return response.json()["results"]
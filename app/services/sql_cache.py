@@ -0,0 +1,64 @@
+import hashlib
+import re
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from structlog import get_logger
+
+from app.config import settings
+from app.utils.cache import TieredCache
+
+logger = get_logger()
+
+# Validated SQL per normalized query; keys embed the schema version so migrations invalidate them
+sql_cache = TieredCache(
+    "nl_sql",
+    maxsize=settings.SQL_CACHE_MAX_ENTRIES,
+    ttl=settings.SQL_CACHE_TTL_SECONDS,
+    use_redis=settings.SQL_CACHE_REDIS,
+)
+
+_schema_version: Optional[str] = None
+
+_THOUSANDS = re.compile(r"(?<=\d)[,\s](?=\d{3}\b)")
+_K_SUFFIX = re.compile(r"\b(\d+(?:\.\d+)?)\s*k\b")
+_TRAILING_ZEROS = re.compile(r"\b(\d+)\.0+\b")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a search query for cache keys: case-folded, whitespace collapsed,
+    trailing punctuation dropped and numbers written one way ("8,000", "8 000", "8k",
+    "8000.00" all become "8000").
+    """
+    q = _SPACE.sub(" ", unicodedata.normalize("NFKC", query or "").casefold()).strip()
+    q = _THOUSANDS.sub("", q)
+    q = _K_SUFFIX.sub(lambda m: str(int(float(m.group(1)) * 1000)), q)
+    q = _TRAILING_ZEROS.sub(r"\1", q)
+    return q.rstrip(" .?!")
+
+
+async def get_schema_version(db: AsyncSession, prompt_fingerprint: str) -> str:
+    """
+    Alembic revision of the connected database plus a fingerprint of the prompt/schema text,
+    read once per process (a migration ships with a deploy, which restarts workers).
+    """
+    global _schema_version
+    if _schema_version is None:
+        try:
+            result = await db.execute(text("SELECT version_num FROM alembic_version"))
+            revision = ",".join(sorted(str(r[0]) for r in result.fetchall())) or "none"
+        except Exception as e:
+            logger.warning("Alembic revision unavailable for SQL cache key", error=str(e))
+            await db.rollback()
+            revision = "unknown"
+        _schema_version = f"{revision}:{prompt_fingerprint}"
+    return _schema_version
+
+
+def sql_cache_key(query: str, schema_version: str) -> str:
+    digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()[:32]
+    return f"{schema_version}:{digest}"
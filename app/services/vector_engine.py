@@ -0,0 +1,191 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Spare rows allocated on growth, as a fraction of the current size
+_GROWTH = 0.5
+# Compact once this fraction of allocated rows are deleted
+_MAX_DEAD_FRACTION = 0.25
+
+
+def _float_or_nan(value: Any) -> float:
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ExactVectorIndex:
+    """
+    In-memory exact cosine search over L2-normalized float32 embeddings.
+
+    Vectors sit in one contiguous matrix with parallel price / house_type / lat / lon
+    columns, so a query is a vectorised metadata pre-filter, one matrix-vector product
+    over the surviving rows and an argpartition top-k. Implements the subset of the
+    Chroma vector-store API used by `rag` (add_texts, get, delete, similarity_search),
+    so it can stand in for the Chroma collection. Not persisted: the first vector-store
+    sync after a restart refills it (cheaply, through the embedding cache).
+    """
+
+    def __init__(self, embedding_function: Embeddings, dim: Optional[int] = None):
+        self.embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self._dim = dim
+        self._size = 0  # rows in use, live or deleted
+        self._rows: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._texts: List[Optional[str]] = []
+        self._metadatas: List[Optional[dict]] = []
+        self._house_types: Dict[str, int] = {}
+        self._alloc(0)
+
+    def _alloc(self, capacity: int) -> None:
+        dim = self._dim or 0
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._price = np.full(capacity, np.nan)
+        self._lat = np.full(capacity, np.nan)
+        self._lon = np.full(capacity, np.nan)
+        self._house_type = np.full(capacity, -1, dtype=np.int32)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._alive)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, int(capacity * (1 + _GROWTH)), 64)
+        old = (self._vectors, self._alive, self._price, self._lat, self._lon, self._house_type)
+        self._alloc(new_capacity)
+        for new, prev in zip((self._vectors, self._alive, self._price, self._lat, self._lon, self._house_type), old):
+            new[:capacity] = prev
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = self._vectors[keep].copy()
+        self._price, self._lat, self._lon = self._price[keep].copy(), self._lat[keep].copy(), self._lon[keep].copy()
+        self._house_type = self._house_type[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._rows = {pid: n for n, pid in enumerate(self._ids)}
+        self._size = len(keep)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed and upsert documents by id."""
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids is not None else [str(self._size + n) for n in range(len(texts))]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._alloc(0)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+            self._grow(self._size + len(ids))
+            for vec, pid, text, meta in zip(vectors, ids, texts, metadatas):
+                row = self._rows.get(pid)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[pid] = row
+                    self._ids.append(pid)
+                    self._texts.append(text)
+                    self._metadatas.append(meta)
+                else:
+                    self._texts[row], self._metadatas[row] = text, meta
+                self._vectors[row] = vec
+                self._alive[row] = True
+                self._price[row] = _float_or_nan(meta.get("price"))
+                self._lat[row] = _float_or_nan(meta.get("lat"))
+                self._lon[row] = _float_or_nan(meta.get("lon"))
+                house_type = meta.get("house_type")
+                self._house_type[row] = self._house_types.setdefault(house_type, len(self._house_types)) if house_type else -1
+        return ids
+
+    def get(self, ids: Optional[Sequence[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            found = list(self._rows) if ids is None else [i for i in ids if i in self._rows]
+            return {"ids": found, "metadatas": [self._metadatas[self._rows[i]] for i in found]}
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        with self._lock:
+            for pid in ids or []:
+                row = self._rows.pop(pid, None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._ids[row] = self._texts[row] = self._metadatas[row] = None
+            if self._size and (self._size - len(self._rows)) / self._size > _MAX_DEAD_FRACTION:
+                self._compact()
+
+    def _mask(
+        self,
+        min_price: Optional[float],
+        max_price: Optional[float],
+        house_type: Optional[str],
+        bbox: Optional[Tuple[float, float, float, float]],
+    ) -> np.ndarray:
+        n = self._size
+        mask = self._alive[:n].copy()
+        # NaN comparisons are False, so rows missing a filtered field are excluded
+        if min_price is not None:
+            mask &= self._price[:n] >= min_price
+        if max_price is not None:
+            mask &= self._price[:n] <= max_price
+        if house_type:
+            code = self._house_types.get(house_type)
+            if code is None:
+                return np.zeros(n, dtype=bool)
+            mask &= self._house_type[:n] == code
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            lat, lon = self._lat[:n], self._lon[:n]
+            mask &= (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return mask
+
+    def search_by_vector(
+        self,
+        embedding: Sequence[float],
+        k: int = 5,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        house_type: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Top-k (document, cosine similarity) among rows passing the filters, best first."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        with self._lock:
+            if not self._size or k <= 0:
+                return []
+            candidates = np.flatnonzero(self._mask(min_price, max_price, house_type, bbox))
+            if not len(candidates):
+                return []
+            if len(candidates) * 2 > self._size:
+                # Broad filter: one product over the whole matrix beats gathering most rows
+                scores = (self._vectors[:self._size] @ query)[candidates]
+            else:
+                scores = self._vectors[candidates] @ query
+            if len(candidates) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [
+                (Document(page_content=self._texts[candidates[i]], metadata=self._metadatas[candidates[i]]), float(scores[i]))
+                for i in top
+            ]
+
+    def similarity_search(self, query: str, k: int = 5, **filters: Any) -> List[Document]:
+        embedding = self.embedding_function.embed_query(query)
+        return [doc for doc, _ in self.search_by_vector(embedding, k, **filters)]
@@ -0,0 +1,270 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from structlog import get_logger
+
+from app.config import settings
+from app.models.tenant_profile import RecommendationLog, TenantPreference
+
+logger = get_logger()
+
+_SHUTDOWN_ATTEMPTS = 3
+_NEXT_PREFERENCE_IDS = text(
+    "SELECT nextval(pg_get_serial_sequence('\"TenantPreferences\"', 'id')) FROM generate_series(1, :n)"
+)
+
+
+class WriteBehindError(RuntimeError):
+    """Queued rows could not be written when the caller needed them."""
+
+
+class WriteBehindFull(WriteBehindError):
+    """The queue holds `max_pending` rows and the database is not taking them."""
+
+
+# Rows the database rejects on their own merits; retrying them can never succeed
+_PERMANENT_ERRORS = (IntegrityError, DataError)
+
+
+class WriteBehindQueue:
+    """
+    Buffers TenantPreference and RecommendationLog inserts off the request path.
+
+    Pending rows are written as multi-row INSERTs in one transaction (preferences first,
+    so logs never precede their preference) every `flush_seconds`, or sooner once
+    `max_batch` rows are waiting. When the database is unavailable rows stay queued and
+    flushes back off exponentially up to `max_backoff_seconds`; a batch the database
+    rejects is written row by row and only the rows it refuses (integrity/data errors)
+    are dropped. At most `max_pending` rows are held: past that an enqueue flushes inline
+    and raises WriteBehindFull if the rows still cannot be written, so callers fail
+    instead of queued rows being lost. Readers of these tables may lag by up to one flush
+    interval unless they call `flush_pending` first.
+
+    Preference ids are taken from the table's sequence in blocks of `id_block`, so a
+    caller gets its id before the row exists.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        flush_seconds: float = 0.5,
+        max_batch: int = 200,
+        max_pending: int = 2000,
+        max_backoff_seconds: float = 30.0,
+        id_block: int = 50,
+    ):
+        self._session_factory = session_factory
+        self.flush_seconds = flush_seconds
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_backoff_seconds = max_backoff_seconds
+        self.id_block = id_block
+        self._preferences: List[Dict[str, Any]] = []
+        self._logs: List[Dict[str, Any]] = []
+        self._ids: List[int] = []
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._preferences) + len(self._logs)
+
+    async def allocate_preference_ids(self, count: int) -> List[int]:
+        async with self._id_lock:
+            if len(self._ids) < count:
+                async with self._session_factory() as session:
+                    result = await session.execute(_NEXT_PREFERENCE_IDS, {"n": max(self.id_block, count - len(self._ids))})
+                    self._ids.extend(result.scalars().all())
+            ids, self._ids = self._ids[:count], self._ids[count:]
+        return ids
+
+    async def add_preferences(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Queue TenantPreference rows (column -> value, without id); returns their ids."""
+        await self._reserve(len(rows))
+        ids = await self.allocate_preference_ids(len(rows))
+        self._preferences.extend({**row, "id": pid} for row, pid in zip(rows, ids))
+        self._after_enqueue()
+        return ids
+
+    async def add_recommendation_log(self, row: Dict[str, Any]) -> None:
+        await self._reserve(1)
+        self._logs.append(row)
+        self._after_enqueue()
+
+    async def _reserve(self, count: int) -> None:
+        if self.pending + count <= self.max_pending:
+            return
+        await self.flush(force=True)
+        if self.pending + count > self.max_pending:
+            raise WriteBehindFull(f"{self.pending} rows waiting for the database")
+
+    def _after_enqueue(self) -> None:
+        if self.pending >= self.max_batch:
+            self._wake.set()
+
+    async def _write(self, preferences: List[Dict[str, Any]], logs: List[Dict[str, Any]]) -> None:
+        async with self._session_factory() as session:
+            if preferences:
+                await session.execute(insert(TenantPreference), preferences)
+            if logs:
+                await session.execute(insert(RecommendationLog), logs)
+            await session.commit()
+
+    def _requeue(self, preferences: List[Dict[str, Any]], logs: List[Dict[str, Any]], error: Exception) -> None:
+        # Back in front of rows queued meanwhile, then wait before the next attempt
+        self._preferences[:0], self._logs[:0] = preferences, logs
+        self._failures += 1
+        self.failed_flushes += 1
+        delay = min(self.flush_seconds * 2 ** self._failures, self.max_backoff_seconds)
+        self._retry_at = asyncio.get_running_loop().time() + delay
+        logger.warning("Write-behind flush failed, rows kept queued", rows=self.pending, retry_in_seconds=delay, error=str(error))
+
+    async def flush(self, force: bool = False) -> int:
+        """
+        Write everything pending; returns the number of rows written. Unless `force`
+        is set, does nothing while backing off after a failure.
+        """
+        async with self._flush_lock:
+            if not force and asyncio.get_running_loop().time() < self._retry_at:
+                return 0
+            preferences, logs = self._preferences, self._logs
+            self._preferences, self._logs = [], []
+            if not preferences and not logs:
+                return 0
+            try:
+                await self._write(preferences, logs)
+            except _PERMANENT_ERRORS:
+                return await self._write_each(preferences, logs)
+            except Exception as e:
+                self._requeue(preferences, logs, e)
+                return 0
+            self._failures, self._retry_at = 0, 0.0
+            self.written += len(preferences) + len(logs)
+            return len(preferences) + len(logs)
+
+    def has_pending(self, tenant_preference_id: Optional[int] = None) -> bool:
+        """Whether rows for this preference (any rows, when None) are still queued."""
+        if tenant_preference_id is None:
+            return bool(self.pending)
+        key = str(tenant_preference_id)  # request bodies may carry the id as a string
+        return (any(str(row["id"]) == key for row in self._preferences)
+                or any(str(row["tenant_preference_id"]) == key for row in self._logs))
+
+    async def flush_pending(self, tenant_preference_id: Optional[int] = None) -> None:
+        """
+        Read-your-writes barrier: write the queue now if it holds rows for this preference
+        (any rows, when None). Raises WriteBehindError if they are still unwritten.
+        """
+        if not self.has_pending(tenant_preference_id):
+            return
+        await self.flush(force=True)
+        if self.has_pending(tenant_preference_id):
+            raise WriteBehindError(f"rows for tenant preference {tenant_preference_id} are not written yet")
+
+    async def _write_each(self, preferences: List[Dict[str, Any]], logs: List[Dict[str, Any]]) -> int:
+        # Isolate the rows the database refuses rather than losing the whole batch
+        items = [([row], []) for row in preferences] + [([], [row]) for row in logs]
+        written = 0
+        for i, (preference_rows, log_rows) in enumerate(items):
+            try:
+                await self._write(preference_rows, log_rows)
+                written += 1
+            except _PERMANENT_ERRORS as e:
+                self.dropped += 1
+                row = (preference_rows or log_rows)[0]
+                logger.error("Write-behind row dropped", table="TenantPreferences" if preference_rows else "RecommendationLogs",
+                             tenant_preference_id=row.get("id", row.get("tenant_preference_id")), error=str(e))
+            except Exception as e:
+                rest = items[i:]
+                self._requeue([r for p, _ in rest for r in p], [r for _, l in rest for r in l], e)
+                break
+        else:
+            self._failures, self._retry_at = 0, 0.0
+        self.written += written
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("Write-behind flush error", error=str(e))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Shutdown ignores the backoff but still gives a briefly unavailable database a few tries
+        for attempt in range(_SHUTDOWN_ATTEMPTS):
+            if not self.pending:
+                break
+            if attempt:
+                await asyncio.sleep(min(self.flush_seconds * 2 ** attempt, self.max_backoff_seconds))
+            await self.flush(force=True)
+        if self.pending:
+            logger.error("Write-behind rows lost at shutdown", rows=self.pending)
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self.pending, "written": self.written, "dropped": self.dropped, "failed_flushes": self.failed_flushes}
+
+
+_queue: Optional[WriteBehindQueue] = None
+
+
+def get_write_behind() -> Optional[WriteBehindQueue]:
+    """The running queue, or None when writes should go straight to the database."""
+    return _queue
+
+
+async def flush_pending_writes(tenant_preference_id: Optional[int] = None) -> None:
+    """`WriteBehindQueue.flush_pending` on the running queue; a no-op without one."""
+    queue = get_write_behind()
+    if queue is not None:
+        await queue.flush_pending(tenant_preference_id)
+
+
+async def start_write_behind(session_factory: Callable[[], AsyncSession]) -> None:
+    global _queue
+    if _queue is None:
+        _queue = WriteBehindQueue(
+            session_factory,
+            flush_seconds=settings.WRITE_BEHIND_FLUSH_SECONDS,
+            max_batch=settings.WRITE_BEHIND_MAX_BATCH,
+            max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+            max_backoff_seconds=settings.WRITE_BEHIND_MAX_BACKOFF_SECONDS,
+            id_block=settings.WRITE_BEHIND_ID_BLOCK,
+        )
+        _queue.start()
+        logger.info("Write-behind queue started", flush_seconds=_queue.flush_seconds)
+
+
+async def stop_write_behind() -> None:
+    global _queue
+    if _queue is not None:
+        queue, _queue = _queue, None
+        await queue.stop()
+        logger.info("Write-behind queue stopped", **queue.stats())
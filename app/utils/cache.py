@@ -0,0 +1,126 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from redis.asyncio import Redis
+from structlog import get_logger
+
+from app.config import settings
+
+logger = get_logger()
+
+_MISSING = object()
+_registry: Dict[str, "TieredCache"] = {}
+_redis: Optional[Redis] = None
+
+
+def get_redis() -> Optional[Redis]:
+    """Shared asyncio Redis client for cache tiers, or None when REDIS_URL is unset."""
+    global _redis
+    if _redis is None and settings.REDIS_URL:
+        _redis = Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+class TTLCache:
+    """In-process LRU cache with a per-entry time-to-live."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process TTLCache in front of an optional Redis tier.
+
+    Values must be JSON-serializable. Redis errors are logged and treated as misses
+    so the cache never fails a request. Hit/miss counters are exposed via `stats()`.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, use_redis: bool = False):
+        self.name = name
+        self.local = TTLCache(maxsize, ttl)
+        self.use_redis = use_redis
+        self.counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+        _registry[name] = self
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.name}:{key}"
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            self.counters["local_hits"] += 1
+            return value
+        redis = get_redis() if self.use_redis else None
+        if redis is not None:
+            try:
+                raw = await redis.get(self._redis_key(key))
+                if raw is not None:
+                    ttl = await redis.ttl(self._redis_key(key))
+                    value = json.loads(raw)
+                    self.local.set(key, value, ttl if ttl and ttl > 0 else None)
+                    self.counters["redis_hits"] += 1
+                    return value
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                logger.warning("Redis cache read failed", cache=self.name, error=str(e))
+        self.counters["misses"] += 1
+        return default
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.local.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        redis = get_redis() if self.use_redis else None
+        if redis is not None and ttl >= 1:
+            try:
+                await redis.set(self._redis_key(key), json.dumps(value), ex=int(ttl))
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                logger.warning("Redis cache write failed", cache=self.name, error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["local_hits"] + self.counters["redis_hits"]
+        total = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self.local),
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss counters for every registered cache, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,29 @@
+from math import radians, sin, cos, sqrt, atan2
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in km."""
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Pairwise great-circle distances in km.
+
+    `lat1`/`lon1` have shape (N,) and `lat2`/`lon2` shape (M,); the result is (N, M).
+    Inputs are degrees.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
@@ -0,0 +1,37 @@
+"""
+Per-request cost of building and compiling the recommendation LangGraph.
+
+    python -m benchmarks.bench_graph_compile
+
+Compares the old per-request `StateGraph(...).compile()` with reusing the
+module-level compiled graph, in wall time and peak traced allocation.
+"""
+import time
+import tracemalloc
+
+from app.services.langgraph_agent import build_recommendation_graph, recommendation_graph
+
+ITERATIONS = 200
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / ITERATIONS, peak
+
+
+def main():
+    per_request, peak_a = measure(build_recommendation_graph)
+    reused, peak_b = measure(lambda: recommendation_graph)
+    print(f"compile per request : {per_request * 1e3:8.3f} ms/request, peak {peak_a / 1024:8.1f} KiB")
+    print(f"reuse compiled graph: {reused * 1e3:8.3f} ms/request, peak {peak_b / 1024:8.1f} KiB")
+    print(f"saved per request   : {(per_request - reused) * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Nearest-route matching: legacy per-property pandas `apply` vs batched NumPy.
+
+    python -m benchmarks.bench_nearest_route
+
+The legacy path is linear in the number of properties, so it is timed on a few
+properties and extrapolated to keep large runs short.
+"""
+import random
+import time
+from math import radians, sin, cos, sqrt, atan2
+
+import pandas as pd
+
+from app.services.route_index import RouteIndex
+
+PROPERTY_COUNTS = [10, 100, 1000]
+ROUTE_COUNTS = [50, 500, 5000, 50000]
+LEGACY_SAMPLE = 3
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+    return R * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+def random_point(rng):
+    return 8.9 + rng.random() * 0.2, 38.7 + rng.random() * 0.2
+
+
+def make_routes(n, rng):
+    records = []
+    for i in range(n):
+        (slat, slon), (dlat, dlon) = random_point(rng), random_point(rng)
+        records.append({"source": f"S{i}", "destination": f"D{i}", "kilometer": 5.0, "price": 10.0,
+                        "source_lat": slat, "source_lon": slon, "dest_lat": dlat, "dest_lon": dlon})
+    return records
+
+
+def legacy_nearest(df, user, prop):
+    # Mirrors the previous transport_cost_step fallback
+    td = df.copy()
+    td = td.dropna(subset=["source_lat", "source_lon", "dest_lat", "dest_lon"])
+    td = td.assign(user_to_source_km=td.apply(lambda r: haversine(user[0], user[1], float(r["source_lat"]), float(r["source_lon"])), axis=1))
+    td = td.assign(prop_to_dest_km=td.apply(lambda r: haversine(prop[0], prop[1], float(r["dest_lat"]), float(r["dest_lon"])), axis=1))
+    td = td.assign(total_nearness_km=td["user_to_source_km"] + td["prop_to_dest_km"])
+    return td.sort_values("total_nearness_km").head(1)
+
+
+def main():
+    rng = random.Random(42)
+    user = (9.0, 38.75)
+    print(f"{'routes':>7} {'props':>6} {'legacy_s':>10} {'numpy_s':>10} {'speedup':>9}")
+    for n_routes in ROUTE_COUNTS:
+        records = make_routes(n_routes, rng)
+        df = pd.DataFrame(records)
+        index = RouteIndex.from_records(records)
+        for n_props in PROPERTY_COUNTS:
+            props = [random_point(rng) for _ in range(n_props)]
+
+            sample = props[:LEGACY_SAMPLE]
+            t0 = time.perf_counter()
+            for p in sample:
+                legacy_nearest(df, user, p)
+            legacy = (time.perf_counter() - t0) / len(sample) * n_props
+
+            t0 = time.perf_counter()
+            index.nearest_routes(user[0], user[1], props)
+            vectorized = time.perf_counter() - t0
+
+            print(f"{n_routes:>7} {n_props:>6} {legacy:>10.4f} {vectorized:>10.4f} {legacy / vectorized:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Random candidate sampling: ORDER BY random() vs random_key keyset seek.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_search_sampling
+
+Builds an UNLOGGED scratch table `bench_properties` at 10k, 100k and 1M rows with the
+same partial indexes as the sampling migration, times both strategies for the
+price-band and any-approved fallback tiers, and drops the table afterwards.
+"""
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+REPEAT = 20
+
+SETUP = [
+    "DROP TABLE IF EXISTS bench_properties",
+    """
+    CREATE UNLOGGED TABLE bench_properties (
+        id BIGSERIAL PRIMARY KEY,
+        title TEXT NOT NULL,
+        location TEXT NOT NULL,
+        price NUMERIC(10, 2) NOT NULL,
+        house_type VARCHAR(50) NOT NULL,
+        status TEXT NOT NULL,
+        random_key DOUBLE PRECISION NOT NULL DEFAULT random()
+    )
+    """,
+    """
+    INSERT INTO bench_properties (title, location, price, house_type, status)
+    SELECT 'Listing ' || g,
+           (ARRAY['Bole', 'Piazza', 'CMC', 'Megenagna', 'Sarbet'])[1 + (g % 5)],
+           500 + random() * 19500,
+           (ARRAY['apartment', 'house', 'studio', 'condominium'])[1 + (g % 4)],
+           CASE WHEN random() < 0.9 THEN 'APPROVED' ELSE 'PENDING' END
+    FROM generate_series(1, :rows) AS g
+    """,
+    "CREATE INDEX ON bench_properties (price) WHERE status = 'APPROVED'",
+    "CREATE INDEX ON bench_properties (house_type, price) WHERE status = 'APPROVED'",
+    "CREATE INDEX ON bench_properties (random_key) WHERE status = 'APPROVED'",
+    "ANALYZE bench_properties",
+]
+
+BAND = "status = 'APPROVED' AND price BETWEEN :min_price AND :max_price"
+ANY = "status = 'APPROVED'"
+
+
+def order_by_random(where: str) -> str:
+    return f"SELECT id FROM bench_properties WHERE {where} ORDER BY random() LIMIT 20"
+
+
+def random_key_seek(where: str) -> str:
+    return f"""
+        SELECT id FROM (
+            (SELECT id, random_key, 0 AS wrap FROM bench_properties
+             WHERE {where} AND random_key >= :seed ORDER BY random_key LIMIT 20)
+            UNION ALL
+            (SELECT id, random_key, 1 AS wrap FROM bench_properties
+             WHERE {where} AND random_key < :seed ORDER BY random_key LIMIT 20)
+        ) AS sampled ORDER BY wrap, random_key LIMIT 20
+    """
+
+
+async def time_query(conn, sql: str) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        params = {"min_price": 1500, "max_price": 3500, "seed": random.random()}
+        t0 = time.perf_counter()
+        await conn.execute(text(sql), params)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+async def main():
+    engine = create_async_engine(settings.DATABASE_URL)
+    print(f"{'rows':>9} {'tier':>12} {'random()_ms':>12} {'random_key_ms':>14} {'speedup':>8}")
+    try:
+        for rows in ROW_COUNTS:
+            async with engine.begin() as conn:
+                for stmt in SETUP:
+                    await conn.execute(text(stmt), {"rows": rows} if ":rows" in stmt else {})
+            async with engine.connect() as conn:
+                for label, where in (("price band", BAND), ("any", ANY)):
+                    legacy = await time_query(conn, order_by_random(where))
+                    seek = await time_query(conn, random_key_seek(where))
+                    print(f"{rows:>9} {label:>12} {legacy:>12.2f} {seek:>14.2f} {legacy / seek:>7.1f}x")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS bench_properties"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
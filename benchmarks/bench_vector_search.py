@@ -0,0 +1,90 @@
+"""
+Property retrieval: Chroma (HNSW, persistent client) vs the NumPy ExactVectorIndex.
+
+    python -m benchmarks.bench_vector_search
+
+Vectors are random 384-d (MiniLM-sized) and precomputed, so only index and search cost
+is measured. Each store is queried unfiltered and with a price band + house type filter
+(Chroma `where` clause vs NumPy pre-filter); recall is Chroma's overlap with the exact top-k.
+"""
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+
+from app.services.rag import _chroma_filter
+from app.services.vector_engine import ExactVectorIndex
+
+DOC_COUNTS = [1_000, 10_000, 100_000]
+DIM = 384
+QUERIES = 50
+K = 5
+HOUSE_TYPES = ["apartment", "condominium", "villa", "studio", "shared"]
+FILTERS = {"min_price": 2000.0, "max_price": 6000.0, "house_type": "apartment"}
+CHROMA_BATCH = 5000
+
+
+class TableEmbeddings(Embeddings):
+    """Looks texts up in a precomputed vector table ("<row>" -> row vector)."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def embed_documents(self, texts):
+        return self.table[[int(t) for t in texts]].tolist()
+
+    def embed_query(self, text):
+        return self.table[int(text)].tolist()
+
+
+def timed_queries(search, queries):
+    t0 = time.perf_counter()
+    results = [search(q) for q in queries]
+    return (time.perf_counter() - t0) / len(queries) * 1000, results
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'docs':>7} {'filter':>6} {'chroma_ms':>10} {'numpy_ms':>9} {'speedup':>8} {'recall':>7} "
+          f"{'chroma_build_s':>14} {'numpy_build_s':>13}")
+    for n in DOC_COUNTS:
+        vectors = rng.standard_normal((n + QUERIES, DIM)).astype(np.float32)
+        embeddings = TableEmbeddings(vectors)
+        texts = [str(i) for i in range(n)]
+        ids = [f"p{i}" for i in range(n)]
+        metadatas = [{"property_id": pid, "price": float(rng.integers(1000, 10000)),
+                      "house_type": HOUSE_TYPES[i % len(HOUSE_TYPES)], "lat": 9.0, "lon": 38.7}
+                     for i, pid in enumerate(ids)]
+        queries = [str(n + q) for q in range(QUERIES)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            chroma = Chroma(collection_name="bench", embedding_function=embeddings, persist_directory=tmp,
+                            collection_metadata={"hnsw:space": "cosine"})
+            for start in range(0, n, CHROMA_BATCH):
+                end = start + CHROMA_BATCH
+                chroma.add_texts(texts[start:end], metadatas=metadatas[start:end], ids=ids[start:end])
+            chroma_build = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            exact = ExactVectorIndex(embeddings)
+            exact.add_texts(texts, metadatas=metadatas, ids=ids)
+            numpy_build = time.perf_counter() - t0
+
+            for label, filters in (("none", {}), ("yes", FILTERS)):
+                where = _chroma_filter(**filters)
+                chroma_ms, chroma_res = timed_queries(lambda q: chroma.similarity_search(q, k=K, filter=where), queries)
+                numpy_ms, numpy_res = timed_queries(lambda q: exact.similarity_search(q, k=K, **filters), queries)
+                hits = sum(
+                    len({d.metadata["property_id"] for d in c} & {d.metadata["property_id"] for d in e})
+                    for c, e in zip(chroma_res, numpy_res)
+                )
+                recall = hits / (K * len(queries))
+                print(f"{n:>7} {label:>6} {chroma_ms:>10.3f} {numpy_ms:>9.3f} {chroma_ms / numpy_ms:>7.1f}x {recall:>7.3f} "
+                      f"{chroma_build:>14.2f} {numpy_build:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy.exc import ProgrammingError
+from app.services import langgraph_agent
+from app.services.langgraph_agent import (
+    AgentState, build_tiered_search_query, reason_step, run_recommendation_agent_batch, search_step, stream_recommendation_agent, transport_cost_step,
+)
+
+
+class FakeResult:
+    def __init__(self, cols, rows):
+        self._cols, self._rows = cols, rows
+
+    def keys(self):
+        return self._cols
+
+    def fetchall(self):
+        return self._rows
+
+    def scalars(self):
+        return FakeResult(self._cols, [])
+
+    def all(self):
+        return self._rows
+
+    def one_or_none(self):
+        return None
+
+
+class FakeSession:
+    def __init__(self, rows=None):
+        self.added = []
+        self.rows = rows or []
+        self.executed = 0
+
+    async def execute(self, statement, params=None):
+        self.executed += 1
+        cols = ["tier", "tier_pos", "id", "title", "location", "price", "lat", "lon"]
+        return FakeResult(cols, self.rows)
+
+    async def rollback(self):
+        pass
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def make_state(n: int) -> AgentState:
+    props = [{"id": f"p{i}", "title": f"P{i}", "location": "Bole", "price": 1500.0, "lat": 9.0, "lon": 38.7} for i in range(n)]
+    return AgentState(
+        tenant_preference_id=1, user_id="u1", job_school_location="Bole", salary=5000.0,
+        house_type="apartment", family_size=2, preferred_amenities=[], language="en",
+        coords={"lat": 9.0, "lon": 38.7}, properties=props, recommendations=props,
+    )
+
+
+@pytest.mark.asyncio
+async def test_reasons_are_generated_concurrently_and_fail_per_property(monkeypatch):
+    async def slow_reason(state, prop, transport_cost, language, context):
+        await asyncio.sleep(0.2)
+        if prop["id"] == "p1":
+            raise RuntimeError("boom")
+        return f"reason {prop['id']}"
+    monkeypatch.setattr(langgraph_agent, "generate_reason", slow_reason)
+    monkeypatch.setattr(langgraph_agent.settings, "REASON_CONCURRENCY", 3)
+
+    started = time.perf_counter()
+    state = await reason_step(make_state(3), {"configurable": {"db": FakeSession()}})
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.5
+    assert [r["reason"] for r in state.recommendations] == [
+        "reason p0", "Reason generation failed in English.", "reason p2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_search_uses_one_round_trip_and_applies_tiers_in_order():
+    rows = [
+        (1, 1, "a", "A", "Bole", 1200, 9.0, 38.7),
+        (1, 2, "b", "B", "Bole", 1300, 9.0, 38.7),
+        (2, 1, "b", "B", "Bole", 1300, 9.0, 38.7),
+        (2, 2, "c", "C", "Bole", 2000, 9.0, 38.7),
+        (3, 1, "d", "D", "Bole", 2500, 9.0, 38.7),
+        (4, 1, "e", "E", "CMC", 3000, 9.0, 38.7),
+    ]
+    db = FakeSession(rows)
+    state = await search_step(make_state(0), {"configurable": {"db": db}})
+    assert db.executed == 1
+    # Tier 1 gives 2 (<3) so tier 2 is added (deduplicated); with 3 results later tiers are skipped
+    assert [p["id"] for p in state.properties] == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("mode", ["random", "random_key"])
+def test_random_tiers_only_run_while_earlier_tiers_are_short(monkeypatch, mode):
+    monkeypatch.setattr(langgraph_agent.settings, "SEARCH_SAMPLING_MODE", mode)
+    sql = str(build_tiered_search_query(make_state(0))[0])
+    ctes = {tier: sql.split(f"tier{tier} AS (", 1)[1].split(f"tier{tier + 1} AS (")[0] for tier in range(1, 6)}
+    assert "count(DISTINCT id)" not in ctes[1]
+    for tier in range(2, 6):
+        # A one-time filter on the earlier tiers' count: Postgres never starts the scan once it is false
+        earlier = " UNION ALL ".join(f"SELECT id FROM tier{t}" for t in range(1, tier))
+        assert f"(SELECT count(DISTINCT id) FROM ({earlier}) AS earlier) < 3" in ctes[tier]
+    if mode == "random_key":
+        assert all(ctes[tier].count("< 3") == 2 for tier in (3, 4, 5))  # both halves of the keyset seek
+
+
+@pytest.mark.asyncio
+async def test_search_falls_back_to_random_order_without_random_key(monkeypatch):
+    monkeypatch.setattr(langgraph_agent.settings, "SEARCH_SAMPLING_MODE", "random_key")
+    monkeypatch.setattr(langgraph_agent, "_random_key_missing", False)
+    db = FakeSession([(1, 1, "a", "A", "Bole", 1200, 9.0, 38.7)])
+    statements = []
+    execute = db.execute
+
+    async def unmigrated_execute(statement, params=None):
+        statements.append(str(statement))
+        if "random_key" in str(statement):
+            raise ProgrammingError("SELECT", {}, Exception('column "random_key" does not exist'))
+        return await execute(statement, params)
+    db.execute = unmigrated_execute
+
+    state = await search_step(make_state(0), {"configurable": {"db": db}})
+    assert [p["id"] for p in state.properties] == ["a"]
+    await search_step(make_state(0), {"configurable": {"db": db}})
+    # One failed attempt, then ORDER BY random() for this and later searches
+    assert ["random_key" in sql for sql in statements] == [True, False, False]
+
+
+@pytest.mark.asyncio
+async def test_transport_costs_stay_aligned_when_some_properties_lack_coords(monkeypatch):
+    async def fake_batch(lat, lon, destinations):
+        return {pid: 1000.0 * (i + 1) for i, pid in enumerate(destinations)}
+    monkeypatch.setattr(langgraph_agent, "get_matrix_batch", fake_batch)
+    state = make_state(3)
+    state.properties[0]["lat"] = None
+    state = await transport_cost_step(state, {"configurable": {"db": FakeSession()}})
+    by_id = {tc["property_id"]: tc["distance_km"] for tc in state.transport_costs}
+    assert by_id == {"p0": 5.0, "p1": 1.0, "p2": 2.0}
+
+
+@pytest.mark.asyncio
+async def test_transport_costs_fall_back_to_local_estimate_when_gebeta_fails(monkeypatch):
+    async def failing_batch(lat, lon, destinations):
+        raise RuntimeError("gebeta down")
+    monkeypatch.setattr(langgraph_agent, "get_matrix_batch", failing_batch)
+    monkeypatch.setattr(langgraph_agent.settings, "ROUTING_MODE", "gebeta")
+    monkeypatch.setattr(langgraph_agent.settings, "ROUTING_LOCAL_FALLBACK", True)
+    state = make_state(2)
+    state.properties[1]["lat"] = 9.02
+    state = await transport_cost_step(state, {"configurable": {"db": FakeSession()}})
+    by_id = {tc["property_id"]: tc["distance_km"] for tc in state.transport_costs}
+    assert by_id["p0"] == 0.0
+    # ~2.2 km straight line scaled by the detour factor, not the flat 5 km fallback
+    assert 2.2 < by_id["p1"] < 5.0
+
+
+
+@pytest.mark.asyncio
+async def test_stream_emits_ranked_list_before_reasons(monkeypatch):
+    async def fake_batch(lat, lon, destinations):
+        return {pid: 2000.0 for pid in destinations}
+
+    async def fake_stream(state, prop, transport_cost, language, context):
+        await asyncio.sleep(0.01)
+        yield f"{prop['id']} is "
+        yield "close"
+    monkeypatch.setattr(langgraph_agent, "get_matrix_batch", fake_batch)
+    monkeypatch.setattr(langgraph_agent, "stream_reason", fake_stream)
+    rows = [(1, i + 1, f"p{i}", f"P{i}", "Bole", 1200 + i, 9.0, 38.7) for i in range(3)]
+
+    events = [e async for e in stream_recommendation_agent(
+        tenant_preference_id=1, user_id="u1", job_school_location="Bole", salary=5000.0,
+        house_type="apartment", family_size=2, preferred_amenities=[], language="en", db=FakeSession(rows),
+    )]
+    names = [e["event"] for e in events]
+    assert names.index("recommendations") < names.index("reason_delta")
+    assert [e["data"]["stage"] for e in events if e["event"] == "stage"] == ["geocode", "search", "transport_cost", "rank", "reason"]
+    ranked = next(e["data"] for e in events if e["event"] == "recommendations")
+    assert all(r["reason"] is None and r["transport_cost"] > 0 for r in ranked)
+    assert sorted(e["data"]["reason"] for e in events if e["event"] == "reason") == ["p0 is close", "p1 is close", "p2 is close"]
+    assert names[-1] == "done"
+    assert [r["reason"] for r in events[-1]["data"]["recommendations"]] == ["p0 is close", "p1 is close", "p2 is close"]
+
+
+@pytest.mark.asyncio
+async def test_batch_shares_candidate_search_per_group_and_reports_errors_per_profile(monkeypatch):
+    async def fake_batch(lat, lon, destinations):
+        return {pid: 2000.0 for pid in destinations}
+
+    async def fake_reason(state, prop, transport_cost, language, context):
+        return f"reason {prop['id']}"
+    monkeypatch.setattr(langgraph_agent, "get_matrix_batch", fake_batch)
+    monkeypatch.setattr(langgraph_agent, "generate_reason", fake_reason)
+    rows = [(1, i + 1, f"p{i}", f"P{i}", "Bole", 1200 + i, 9.0, 38.7) for i in range(3)]
+    sessions = []
+
+    def session_factory():
+        # Groups open their sessions first, in input order; the second group's fails
+        if len(sessions) == 1:
+            sessions.append(None)
+            raise RuntimeError("database unavailable")
+        sessions.append(FakeSession(rows))
+        return sessions[-1]
+
+    base = dict(user_id="u1", house_type="apartment", family_size=2, preferred_amenities=["wifi"], language="en")
+    results = await run_recommendation_agent_batch([
+        dict(base, tenant_preference_id=1, job_school_location="Bole", salary=5100.0),
+        dict(base, tenant_preference_id=2, job_school_location="Piassa", salary=5000.0),
+        dict(base, tenant_preference_id=3, job_school_location="bole", salary=5900.0),
+    ], session_factory)
+
+    assert [r["tenant_preference_id"] for r in results] == [1, 2, 3]
+    assert results[1]["error_code"] == "candidate_search_failed"
+    assert "database unavailable" not in results[1]["error"]
+    assert [[rec["reason"] for rec in r["recommendations"]] for r in (results[0], results[2])] == [
+        ["reason p0", "reason p1", "reason p2"]] * 2
+    # One search for the Bole group, then one session per profile for ranking and reasons
+    assert len(sessions) == 4 and sessions[0].executed == 1
@@ -0,0 +1,63 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+from app.dependencies import auth
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeClient:
+    def __init__(self, status_code=200):
+        self.calls = 0
+        self.status_code = status_code
+
+    async def get(self, url, headers=None):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return FakeResponse(self.status_code, {"user_id": "u1", "role": "Tenant"})
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    auth.verify_cache.local.clear()
+    client = FakeClient()
+    monkeypatch.setattr(auth, "get_http_client", lambda name: client)
+    return client
+
+
+def creds(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_upstream_call(fake_client):
+    results = await asyncio.gather(*(auth.get_current_user(creds("tok-a")) for _ in range(10)))
+    assert all(r["user_id"] == "u1" for r in results)
+    assert fake_client.calls == 1
+    await auth.get_current_user(creds("tok-a"))
+    assert fake_client.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_tokens_are_negatively_cached(fake_client):
+    fake_client.status_code = 401
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await auth.get_current_user(creds("tok-bad"))
+    assert fake_client.calls == 1
+
+
+def test_token_ttl_is_capped_by_expiry():
+    token = jwt.encode({"exp": int(time.time()) + 10}, "secret")
+    assert auth._token_ttl(token) <= 10
+    assert auth._token_ttl("opaque-token") == auth.settings.AUTH_CACHE_TTL_SECONDS
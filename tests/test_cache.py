@@ -0,0 +1,47 @@
+import pytest
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache, TieredCache, cache_stats
+from app.services.reason_cache import reason_cache_key
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "a" becomes most recently used
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set("a", 1)
+    c.set("b", 2, ttl=60)
+    now[0] += 10
+    assert c.get("a") is None
+    assert c.get("b") == 2
+
+
+@pytest.mark.asyncio
+async def test_tiered_cache_counts_hits_and_misses():
+    c = TieredCache("test-tiered", maxsize=10, ttl=60)
+    assert await c.get("k") is None
+    await c.set("k", {"v": 1})
+    assert await c.get("k") == {"v": 1}
+    stats = cache_stats()["test-tiered"]
+    assert stats["local_hits"] == 1 and stats["misses"] == 1 and stats["hit_ratio"] == 0.5
+
+
+def test_reason_cache_key_buckets_numeric_context():
+    prop = {"id": "p1"}
+    base = {"distance_km": 4.9, "monthly_transport_cost": 400.0, "single_trip_fare": 10.0,
+            "rent_price": 1500.0, "salary": 5000.0, "family_size": 2, "amenities": ["wifi", "parking"]}
+    near = {**base, "distance_km": 5.1, "salary": 5100.0, "amenities": ["parking", "wifi"]}
+    far = {**base, "distance_km": 8.0}
+    assert reason_cache_key(prop, "en", base) == reason_cache_key(prop, "en", near)
+    assert reason_cache_key(prop, "en", base) != reason_cache_key(prop, "en", far)
+    assert reason_cache_key(prop, "en", base) != reason_cache_key(prop, "am", base)
+    assert reason_cache_key(prop, "en", base) != reason_cache_key({"id": "p2"}, "en", base)
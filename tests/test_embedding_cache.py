@@ -0,0 +1,43 @@
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(len(texts))
+        return [[float(len(t)), float(i), 1.0] for i, t in enumerate(texts)]
+
+
+def test_only_unseen_texts_are_embedded_in_batches(tmp_path):
+    model = FakeModel()
+    cache = EmbeddingCache(str(tmp_path), "mini")
+    first = cache.embed(["a", "bb", "ccc", "a"], model, batch_size=2)
+    assert model.calls == [2, 1]
+    assert first[0] == first[3]
+    assert cache.embed(["ccc", "bb"], model) == [first[2], first[1]]
+    assert model.calls == [2, 1]
+    assert cache.stats() == {"rows": 3, "hits": 3, "misses": 3}
+
+
+def test_restart_reads_vectors_from_disk_without_embedding(tmp_path):
+    EmbeddingCache(str(tmp_path), "mini").embed(["x", "yy"], FakeModel())
+    model = FakeModel()
+    reopened = EmbeddingCache(str(tmp_path), "mini")
+    assert reopened.embed(["yy"], model) == [[2.0, 1.0, 1.0]]
+    assert model.calls == []
+    assert isinstance(reopened._matrix, np.memmap) and reopened._matrix.dtype == np.float32
+    # A different model never sees these vectors
+    assert EmbeddingCache(str(tmp_path), "other").embed(["yy"], model) and model.calls == [1]
+
+
+def test_orphaned_vectors_from_an_interrupted_append_are_dropped(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "mini")
+    cache.embed(["x"], FakeModel())
+    with open(cache._vectors_path, "ab") as f:
+        f.write(np.ones(3, dtype=np.float32).tobytes())  # vector written, key never recorded
+    fresh = EmbeddingCache(str(tmp_path), "mini")
+    assert fresh.embed(["x", "zz"], FakeModel()) == [[1.0, 0.0, 1.0], [2.0, 0.0, 1.0]]
@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+
+from app.services import feedback, langgraph_agent, write_behind
+from app.services.langgraph_agent import AgentState, rank_step
+from tests.test_write_behind import FakeDatabase
+
+
+def make_state() -> AgentState:
+    props = [
+        {"id": "near-expensive", "price": 8000.0, "lat": 9.0, "lon": 38.7},
+        {"id": "far-cheap", "price": 500.0, "lat": 9.0, "lon": 38.7},
+    ]
+    return AgentState(
+        tenant_preference_id=7, user_id="u1", job_school_location="Bole", salary=5000.0,
+        house_type="apartment", family_size=2, preferred_amenities=[], language="en",
+        properties=props,
+        transport_costs=[{"property_id": "near-expensive", "distance_km": 1.0}, {"property_id": "far-cheap", "distance_km": 2.0}],
+    )
+
+
+@pytest.mark.asyncio
+async def test_rank_reads_preference_counter(monkeypatch):
+    lookups = []
+
+    async def fake_counts(db, scope, key):
+        lookups.append((scope, key))
+        return liked, 0
+    monkeypatch.setattr(langgraph_agent, "get_feedback_counts", fake_counts)
+
+    liked = 0
+    state = await rank_step(make_state(), {"configurable": {"db": None}})
+    assert [p["id"] for p in state.recommendations] == ["far-cheap", "near-expensive"]
+    liked = 1
+    state = await rank_step(make_state(), {"configurable": {"db": None}})
+    assert [p["id"] for p in state.recommendations] == ["near-expensive", "far-cheap"]
+    assert lookups == [("preference", 7)] * 2
+
+
+class FakeSession:
+    def __init__(self):
+        self.added, self.statements, self.commits = [], [], 0
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_feedback_increments_all_scopes_in_one_upsert():
+    db = FakeSession()
+    await feedback.record_feedback(db, "u1", {"tenant_preference_id": 7, "property_id": "p1", "liked": False})
+
+    (statement,) = db.statements
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert "ON CONFLICT (scope, key) DO UPDATE" in str(compiled)
+    values = compiled.params
+    assert sorted(v for k, v in values.items() if k.startswith("key")) == ["7", "p1", "u1"]
+    assert {v for k, v in values.items() if k.startswith("disliked")} == {1}
+    assert len(db.added) == 1 and db.commits == 1
+
+
+def test_liked_is_parsed_like_the_backfill():
+    assert [feedback.parse_liked(v) for v in (True, "true", "TRUE", 1, "1")] == [True] * 5
+    assert [feedback.parse_liked(v) for v in (False, "false", "0", 0, "no", None)] == [False] * 6
+
+
+@pytest.mark.asyncio
+async def test_feedback_writes_a_queued_preference_first(monkeypatch):
+
+    database = FakeDatabase()
+    queue = write_behind.WriteBehindQueue(database.session, flush_seconds=60)
+    monkeypatch.setattr(write_behind, "_queue", queue)
+    (preference_id,) = await queue.add_preferences([{"user_id": "u1"}])
+    await queue.add_preferences([{"user_id": "u2"}])
+
+    db = FakeSession()
+    await feedback.record_feedback(db, "u1", {"tenant_preference_id": str(preference_id), "property_id": "p1", "liked": True})
+    assert queue.pending == 0
+    assert [table for table, _ in database.committed[0]] == ["TenantPreferences"]
+    assert db.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_feedback_fails_cleanly_when_the_preference_cannot_be_written(monkeypatch):
+
+    database = FakeDatabase()
+    queue = write_behind.WriteBehindQueue(database.session, flush_seconds=60)
+    monkeypatch.setattr(write_behind, "_queue", queue)
+    (preference_id,) = await queue.add_preferences([{"user_id": "u1"}])
+    database.fail_when = lambda table, rows: OperationalError("INSERT", {}, ConnectionError("down"))
+
+    db = FakeSession()
+    with pytest.raises(write_behind.WriteBehindError):
+        await feedback.record_feedback(db, "u1", {"tenant_preference_id": preference_id, "property_id": "p1", "liked": True})
+    assert db.added == [] and db.commits == 0
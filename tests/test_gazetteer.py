@@ -0,0 +1,44 @@
+from app.services.gazetteer import Gazetteer, fold
+from app.services.route_index import RouteIndex
+
+RECORDS = [
+    {"source": "Wonji Mazoria", "destination": "Posta", "kilometer": 5.0, "price": 15.0,
+     "source_lat": 8.52, "source_lon": 39.26, "dest_lat": 8.55, "dest_lon": 39.27},
+    {"source": "Posta", "destination": "Kidane Mihret", "kilometer": 3.0, "price": 10.0,
+     "source_lat": 8.57, "source_lon": 39.27, "dest_lat": 8.56, "dest_lon": 39.29},
+    {"source": "Posta", "destination": "Bole", "kilometer": 4.0, "price": 10.0,
+     "source_lat": None, "source_lon": None, "dest_lat": 8.53, "dest_lon": 39.25},
+]
+
+
+def build():
+    return Gazetteer.build(RouteIndex.from_records(RECORDS), [("Bole Bulbula", 8.96, 38.78, 4)])
+
+
+def test_exact_and_alias_lookups():
+    gaz = build()
+    exact = gaz.lookup("  posta ")
+    assert exact.method == "exact" and exact.confidence == 1.0
+    assert (exact.lat, exact.lon) == (8.56, 39.27)  # averaged over both stops
+    # A same-named stop in another city does not drag the builtin district
+    assert gaz.lookup("ቦሌ").lat == 8.9956
+    assert gaz.lookup("Adaamaa").name == "Adama"
+    assert fold("Finfinnee") == fold("Finfine")
+
+
+def test_token_prefix_and_fuzzy_lookups_score_below_exact():
+    gaz = build()
+    token = gaz.lookup("near Kidane Mihret church")
+    assert token.name == "Kidane Mihret" and token.method == "token"
+    assert gaz.lookup("Wonji").name == "Wonji Mazoria"
+    fuzzy = gaz.lookup("Megenanga")
+    assert fuzzy.name == "Megenagna" and fuzzy.method == "fuzzy"
+    assert all(m.confidence < 1.0 for m in (token, fuzzy))
+    assert gaz.lookup("Zzzyx") is None
+
+
+def test_lookups_are_memoized():
+    gaz = build()
+    gaz.lookup("Bole Bulbula")
+    gaz.lookup("Bole Bulbula")
+    assert gaz.lookup.cache_info().hits == 1
@@ -0,0 +1,59 @@
+import pytest
+from app.services import gebeta
+
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    gebeta.matrix_cache.local.clear()
+    calls = []
+
+    async def fetch(lat, lon, destinations):
+        calls.append(list(destinations))
+        return [{"distance": 1000.0 * (d[0] - 8.0)} for d in destinations]
+    monkeypatch.setattr(gebeta, "_fetch_matrix", fetch)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_only_missing_destinations_are_fetched(fake_fetch):
+    first = await gebeta.get_matrix(9.0, 38.7, [(9.1, 38.7), (9.2, 38.7)])
+    second = await gebeta.get_matrix(9.00001, 38.70001, [(9.3, 38.7), (9.1, 38.7), (9.2, 38.7)])
+    assert fake_fetch == [[(9.1, 38.7), (9.2, 38.7)], [(9.3, 38.7)]]
+    assert [d["distance"] for d in second] == pytest.approx([1300.0, 1100.0, 1200.0])
+    assert first == second[1:]
+
+
+@pytest.mark.asyncio
+async def test_batch_splits_into_provider_chunks_keyed_by_id(fake_fetch):
+    destinations = {f"p{i}": (8.0 + i / 10, 38.7) for i in range(1, 26)}
+    distances = await gebeta.get_matrix_batch(9.0, 38.7, destinations)
+    assert sorted(len(c) for c in fake_fetch) == [5, 10, 10]
+    assert set(distances) == set(destinations)
+    assert distances["p17"] == pytest.approx(1700.0)
+
+
+@pytest.mark.asyncio
+async def test_batch_keeps_partial_results_when_a_chunk_fails(monkeypatch):
+    gebeta.matrix_cache.local.clear()
+
+    async def flaky_fetch(lat, lon, destinations):
+        if any(d[0] > 9.0 for d in destinations):
+            raise ValueError("ONM API failed with status 500")
+        return [{"distance": 1000.0} for _ in destinations]
+    monkeypatch.setattr(gebeta, "_fetch_matrix", flaky_fetch)
+    destinations = {f"p{i}": (8.0 + i / 10, 38.7) for i in range(1, 21)}
+    distances = await gebeta.get_matrix_batch(9.0, 38.7, destinations)
+    assert set(distances) == {f"p{i}" for i in range(1, 11)}
+
+
+@pytest.mark.asyncio
+async def test_cached_distances_survive_when_every_chunk_fails(fake_fetch, monkeypatch):
+    await gebeta.get_matrix_batch(9.0, 38.7, {"cached": (9.1, 38.7)})
+
+    async def down(lat, lon, destinations):
+        raise ValueError("ONM API failed with status 500")
+    monkeypatch.setattr(gebeta, "_fetch_matrix", down)
+    distances = await gebeta.get_matrix_batch(9.0, 38.7, {"cached": (9.1, 38.7), "new": (9.2, 38.7)})
+    assert distances == {"cached": pytest.approx(1100.0)}
+    with pytest.raises(ValueError):
+        await gebeta.get_matrix_batch(9.0, 38.7, {"new": (9.2, 38.7)})
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+
+from app.services import gemini
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StallingModel:
+    """Streams `chunks`, then hangs as a stalled Gemini stream would."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def generate_content_async(self, prompt, stream=False):
+        async def stream_chunks():
+            for text in self.chunks:
+                yield Chunk(text)
+            await asyncio.sleep(3600)
+        return stream_chunks()
+
+
+@pytest.fixture
+def models(monkeypatch):
+    gemini.reason_cache.local.clear()
+    monkeypatch.setattr(gemini.settings, "GEMINI_TIMEOUT_SECONDS", 0.05)
+    models = {}
+    monkeypatch.setattr(gemini, "_get_model", lambda name: models[name])
+    return models
+
+
+@pytest.mark.asyncio
+async def test_stream_timeout_covers_the_whole_generation(models):
+    primary, fallback = gemini.REASON_MODELS
+    models[primary] = StallingModel(["Close to ", "work"])
+    models[fallback] = StallingModel(["unused"])
+    parts = []
+    with pytest.raises(asyncio.TimeoutError):
+        async for text in gemini.stream_reason({}, {"id": "p1"}, 0.0, "en"):
+            parts.append(text)
+    assert parts == ["Close to ", "work"]
+
+
+@pytest.mark.asyncio
+async def test_stream_stalled_before_first_chunk_falls_back(models):
+    primary, fallback = gemini.REASON_MODELS
+    models[primary] = StallingModel([])
+    models[fallback] = StallingModel([])
+    parts = [text async for text in gemini.stream_reason({}, {"id": "p2"}, 0.0, "en")]
+    assert parts == ["Reason generation failed in English."]
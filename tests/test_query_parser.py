@@ -0,0 +1,56 @@
+import pytest
+
+from app.services import property_search
+from app.services.query_parser import parse_search_query
+
+
+def test_common_queries_are_fully_parsed():
+    p = parse_search_query("2 bedroom apartment in Bole under 8,000 birr")
+    assert (p.location, p.max_price, p.house_type, p.bedrooms, p.confidence) == ("Bole", 8000.0, "apartment", 2, 1.0)
+
+    p = parse_search_query("house with parking near Piazza")
+    assert (p.location, p.house_type, p.amenities) == ("Piazza", "house", ["parking"])
+
+    p = parse_search_query("condo between 5k and 10k with wifi")
+    assert (p.min_price, p.max_price, p.house_type, p.amenities) == (5000.0, 10000.0, "condominium", ["wifi"])
+
+
+def test_vague_queries_have_low_confidence():
+    p = parse_search_query("something quiet with a nice view for my family")
+    assert p.confidence < 0.8
+    assert "quiet" in p.unparsed
+
+
+def test_unknown_location_phrases_stay_unparsed():
+    for query in ("apartment in a safe area", "house near my office"):
+        p = parse_search_query(query)
+        assert p.location is None
+        assert p.confidence < 0.8
+
+
+def test_sql_is_parameterized():
+    sql, params = parse_search_query("villa in CMC over 20000").to_sql()
+    assert "20000" not in sql and "CMC" not in sql
+    assert params["min_price"] == 20000.0 and params["location"] == "%CMC%"
+    assert "villa" in params["house_types"]
+
+
+@pytest.mark.asyncio
+async def test_only_unparsed_queries_reach_the_llm(monkeypatch):
+    async def fake_generate(query):
+        return "SELECT id FROM properties"
+
+    async def fake_version(db, fingerprint):
+        return "test"
+    monkeypatch.setattr(property_search, "generate_sql_query", fake_generate)
+    monkeypatch.setattr(property_search, "get_schema_version", fake_version)
+    monkeypatch.setattr(property_search, "_path_counts", {"rules": 0, "cache": 0, "llm": 0})
+    property_search.sql_cache.local.clear()
+
+    sql, params = await property_search.translate_query("studio in Megenagna under 6000", None)
+    assert params["max_price"] == 6000.0
+    await property_search.translate_query("somewhere calm and family friendly", None)
+    await property_search.translate_query("Somewhere calm and family friendly", None)
+    stats = property_search.search_path_stats()
+    assert stats["counts"] == {"rules": 1, "cache": 1, "llm": 1}
+    assert stats["shares"]["rules"] == round(1 / 3, 4)
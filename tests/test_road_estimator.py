@@ -0,0 +1,32 @@
+from app.services.road_estimator import RoadDistanceEstimator
+
+
+def test_observe_calibrates_factor_and_ignores_noise():
+    est = RoadDistanceEstimator()
+    assert est.factor == 1.3
+    est.observe(9.0, 38.7, 9.02, 38.7, 0)  # no path
+    est.observe(9.0, 38.7, 9.0001, 38.7, 500)  # too close to calibrate
+    est.observe(9.0, 38.7, 9.02, 38.7, 50_000)  # implausible detour
+    assert est.samples == 0
+    straight_m = est.estimate_m(9.0, 38.7, 9.02, 38.7) / 1.3
+    est.observe(9.0, 38.7, 9.02, 38.7, straight_m * 1.5)
+    assert est.samples == 1
+    assert abs(est.factor - 1.5) < 1e-6
+
+
+def test_workers_merge_only_their_new_samples(tmp_path):
+    path = str(tmp_path / "detour_factor.json")
+    straight_m = RoadDistanceEstimator().estimate_m(9.0, 38.7, 9.02, 38.7) / 1.3
+    first, second = RoadDistanceEstimator(), RoadDistanceEstimator()
+    first.observe(9.0, 38.7, 9.02, 38.7, straight_m * 1.4)
+    second.observe(9.0, 38.7, 9.02, 38.7, straight_m * 1.6)
+    second.observe(9.0, 38.7, 9.02, 38.7, straight_m * 1.6)
+    first.save(path)
+    second.save(path)
+    first.save(path)  # nothing new since the last save
+
+    loaded = RoadDistanceEstimator.load(path)
+    assert loaded.samples == 3 and loaded.unsaved_samples == 0
+    assert abs(loaded.factor - (1.4 + 1.6 + 1.6) / 3) < 1e-3
+    loaded.save(path)  # a restarted worker does not recount the seed
+    assert RoadDistanceEstimator.load(path).samples == 3
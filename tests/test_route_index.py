@@ -0,0 +1,51 @@
+import pytest
+from app.services.route_index import RouteIndex, get_route_index
+
+RECORDS = [
+    {"source": "Piazza", "destination": "Bole", "kilometer": 7.0, "price": 20.0,
+     "source_lat": 9.03, "source_lon": 38.75, "dest_lat": 8.99, "dest_lon": 38.79},
+    {"source": "Piazza", "destination": "Megenagna", "kilometer": 6.0, "price": 15.0,
+     "source_lat": 9.03, "source_lon": 38.75, "dest_lat": 9.02, "dest_lon": 38.80},
+    {"source": "Mexico", "destination": "Bole Bulbula", "kilometer": 12.0, "price": 25.0,
+     "source_lat": None, "source_lon": None, "dest_lat": 8.95, "dest_lon": 38.78},
+]
+
+
+def test_match_by_name_is_case_insensitive_substring():
+    index = RouteIndex.from_records(RECORDS)
+    routes = index.match("piazza", "bole")
+    assert [r.destination for r in routes] == ["Bole"]
+    assert index.match("Mexico", "Bole")[0].price == 25.0
+    assert index.match("Kaliti", "Bole") == []
+
+
+def test_nearest_route_skips_routes_without_coords():
+    index = RouteIndex.from_records(RECORDS)
+    (best,) = index.nearest_routes(9.03, 38.75, [(9.02, 38.80)])
+    assert best.destination == "Megenagna"
+
+
+def test_index_is_immutable_and_shared():
+    index = RouteIndex.from_records(RECORDS)
+    with pytest.raises(AttributeError):
+        index.routes[0].price = 1.0
+    assert get_route_index() is get_route_index()
+
+
+def test_nearest_routes_batch_matches_brute_force():
+    import random
+    from app.utils.geo import haversine
+    rng = random.Random(7)
+    records = [
+        {"source": f"S{i}", "destination": f"D{i}", "kilometer": 1.0, "price": float(i),
+         "source_lat": 8.9 + rng.random() * 0.2, "source_lon": 38.7 + rng.random() * 0.2,
+         "dest_lat": 8.9 + rng.random() * 0.2, "dest_lon": 38.7 + rng.random() * 0.2}
+        for i in range(200)
+    ]
+    index = RouteIndex.from_records(records)
+    props = [(8.9 + rng.random() * 0.2, 38.7 + rng.random() * 0.2) for _ in range(25)]
+    batched = index.nearest_routes(9.0, 38.75, props)
+    for (plat, plon), route in zip(props, batched):
+        expected = min(index.routes, key=lambda r: haversine(9.0, 38.75, r.source_lat, r.source_lon) + haversine(plat, plon, r.dest_lat, r.dest_lon))
+        assert route == expected
+    assert RouteIndex([]).nearest_routes(9.0, 38.75, props) == [None] * len(props)
@@ -0,0 +1,76 @@
+import pytest
+
+from app.models.saved_search import SavedSearch
+from app.services import saved_search
+from app.services.saved_search import property_could_match, rank_saved_search_results, refresh_saved_search, saved_search_criteria
+
+
+def test_known_locations_search_by_radius_and_unknown_ones_by_name():
+    criteria, coords = saved_search_criteria(SavedSearch(location="Bole", house_type="Condo", amenities=["WiFi"], max_distance_km=2))
+    sql, params = criteria.to_sql()
+    assert coords is not None and "location" not in params
+    assert params["min_lat"] < coords["lat"] < params["max_lat"]
+    assert "condo" in params["house_types"] and params["amenity_0"] == "wifi"
+
+    criteria, coords = saved_search_criteria(SavedSearch(location="Nowhere Town", house_type="duplex"))
+    sql, params = criteria.to_sql()
+    assert coords is None and params["location"] == "%Nowhere Town%"
+    assert params["house_types"] == ["duplex"]
+
+
+def test_ranking_prefers_close_and_cheap_and_drops_out_of_radius():
+    search = SavedSearch(max_price=5000.0, max_distance_km=5.0)
+    rows = [
+        {"id": "far", "price": 1000, "lat": 9.2, "lon": 38.7},
+        {"id": "near-expensive", "price": 4500, "lat": 9.001, "lon": 38.7},
+        {"id": "near-cheap", "price": 1500, "lat": 9.001, "lon": 38.7},
+        {"id": "unlocated", "price": 1000, "lat": None, "lon": None},
+    ]
+    ranked = rank_saved_search_results(search, rows, {"lat": 9.0, "lon": 38.7})
+    assert [r["property_id"] for r in ranked] == ["near-cheap", "near-expensive", "unlocated"]
+    assert ranked[-1]["distance_km"] is None
+
+
+def test_changed_properties_only_wake_searches_they_could_enter():
+    params = saved_search_criteria(SavedSearch(location="Bole", house_type="condo", max_price=3000.0, max_distance_km=2))[0].to_sql()[1]
+    coords = saved_search_criteria(SavedSearch(location="Bole"))[1]
+    near = {"status": "APPROVED", "price": 2500, "house_type": "Condominium", "location": "Bole", **coords}
+    assert property_could_match(params, near)
+    assert not property_could_match(params, {**near, "price": 3500})
+    assert not property_could_match(params, {**near, "house_type": "villa"})
+    assert not property_could_match(params, {**near, "lat": coords["lat"] + 1})
+    assert not property_could_match(params, {**near, "status": "REJECTED"})
+
+    by_name = saved_search_criteria(SavedSearch(location="Nowhere Town"))[0].to_sql()[1]
+    assert property_could_match(by_name, {**near, "location": "Near nowhere town centre"})
+    assert not property_could_match(by_name, near)
+
+
+class FakeSession:
+    def __init__(self):
+        self.writes = 0
+        self.fingerprint = None
+
+    async def execute(self, statement, params=None):
+        self.writes += 1
+        self.fingerprint = statement.compile().params["fingerprint"]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_matches_are_not_rewritten(monkeypatch):
+    rows = [{"id": "p1", "price": 1200.0, "lat": 9.0, "lon": 38.7}]
+
+    async def fake_query(sql, db, params=None):
+        return list(rows)
+    monkeypatch.setattr(saved_search, "execute_sql_query", fake_query)
+    search = SavedSearch(id=1, location="Bole", max_price=3000.0)
+    db = FakeSession()
+
+    first = await refresh_saved_search(search, db)
+    assert [r["property_id"] for r in first] == ["p1"] and db.writes == 1
+
+    stored = db.fingerprint
+    assert await refresh_saved_search(search, db, stored) is None and db.writes == 1
+    assert await refresh_saved_search(search, db, stored, force=True) is not None and db.writes == 2
+    rows.append({"id": "p2", "price": 900.0, "lat": 9.0, "lon": 38.7})
+    assert len(await refresh_saved_search(search, db, stored)) == 2 and db.writes == 3
@@ -0,0 +1,46 @@
+import pytest
+
+from app.services import property_search, sql_cache
+from app.services.sql_cache import normalize_query
+
+
+class RevisionSession:
+    def __init__(self, revision):
+        self.revision = revision
+
+    async def execute(self, stmt, params=None):
+        revision = self.revision
+
+        class Result:
+            def fetchall(self):
+                return [(revision,)]
+        return Result()
+
+
+def test_normalize_query_ignores_case_spacing_and_number_format():
+    variants = ["2 Bedroom apartment in Bole under 8,000", "  2 bedroom  APARTMENT in bole under 8k?",
+                "2 bedroom apartment in Bole under 8000.00", "2 bedroom apartment in bole under 8 000"]
+    assert {normalize_query(v) for v in variants} == {"2 bedroom apartment in bole under 8000"}
+
+
+@pytest.mark.asyncio
+async def test_repeated_queries_skip_the_llm_until_the_schema_changes(monkeypatch):
+    calls = []
+
+    async def fake_generate(query):
+        calls.append(query)
+        return "SELECT id FROM properties"
+    monkeypatch.setattr(property_search, "generate_sql_query", fake_generate)
+    monkeypatch.setattr(property_search.settings, "SEARCH_RULES_ENABLED", False)
+    monkeypatch.setattr(sql_cache, "_schema_version", None)
+    sql_cache.sql_cache.local.clear()
+
+    db = RevisionSession("rev1")
+    assert await property_search.translate_query("Villa in CMC under 20,000", db) == ("SELECT id FROM properties", {})
+    await property_search.translate_query("villa in cmc under 20k", db)
+    assert len(calls) == 1
+
+    # A new migration revision (seen after restart) misses the old entries
+    monkeypatch.setattr(sql_cache, "_schema_version", None)
+    await property_search.translate_query("villa in cmc under 20k", RevisionSession("rev2"))
+    assert len(calls) == 2
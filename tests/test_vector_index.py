@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services import rag
+from app.services.vector_engine import ExactVectorIndex
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    embedding = CountingEmbedding(size=16)
+    monkeypatch.setattr(rag, "embeddings", embedding)
+    monkeypatch.setattr(rag.settings, "VECTOR_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(rag, "_stores", {})
+    return embedding
+
+
+def prop(pid, price=1500.0, title="Flat"):
+    return {"id": pid, "title": title, "location": "Bole", "price": price, "house_type": "apartment",
+            "amenities": ["wifi"], "lat": 9.0, "lon": 38.7}
+
+
+def test_index_skips_unchanged_rows_and_deletes_removed(store):
+    stats = rag.index_properties([prop("a"), prop("b")])
+    assert stats == {"seen": 2, "upserted": 2, "skipped": 0, "deleted": 0}
+
+    stats = rag.index_properties([prop("a"), prop("b", price=1800.0)], removed_ids=["a"])
+    assert stats["upserted"] == 1 and stats["skipped"] == 1 and stats["deleted"] == 1
+    assert store.embedded == 3
+
+    docs = rag.get_vector_store().similarity_search("Flat in Bole", k=5)
+    assert [d.metadata["property_id"] for d in docs] == ["b"]
+    assert docs[0].metadata["price"] == 1800.0 and docs[0].metadata["house_type"] == "apartment"
+
+
+def test_route_index_is_not_reembedded_when_unchanged(store):
+    first = rag.index_routes()
+    assert first["upserted"] == first["seen"] > 0
+    assert rag.index_routes()["upserted"] == 0
+
+
+def test_embedding_model_is_not_loaded_at_import_and_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(rag, "_model", None)
+    assert rag.embedding_status()["state"] in ("not_loaded", "failed")
+    monkeypatch.setattr(rag.settings, "EMBEDDINGS_ENABLED", False)
+    with pytest.raises(RuntimeError):
+        rag.embeddings.embed_query("Bole apartment")
+
+
+class AxisEmbedding(DeterministicFakeEmbedding):
+    # "<axis> ..." embeds onto that axis, so similarity is easy to predict
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        vec = [0.0] * self.size
+        vec[int(text.split()[0])] = 1.0
+        vec[-1] = 0.1
+        return vec
+
+
+def test_exact_index_filters_before_ranking_and_supports_upsert_and_delete():
+    index = ExactVectorIndex(AxisEmbedding(size=5))
+    meta = lambda pid, price, ht, lat: {"property_id": pid, "price": price, "house_type": ht, "lat": lat, "lon": 38.7}
+    index.add_texts(
+        ["0 a", "0 b", "1 c", "2 d"],
+        metadatas=[meta("a", 1000, "apartment", 9.0), meta("b", 3000, "apartment", 9.0),
+                   meta("c", 1200, "villa", 9.0), meta("d", 900, "apartment", 8.5)],
+        ids=["a", "b", "c", "d"],
+    )
+    ids = lambda docs: [d.metadata["property_id"] for d in docs]
+    assert ids(index.similarity_search("0 q", k=2)) == ["a", "b"]
+    assert ids(index.similarity_search("0 q", k=5, max_price=2000, house_type="apartment")) == ["a", "d"]
+    assert ids(index.similarity_search("0 q", k=5, bbox=(8.9, 38.6, 9.1, 38.8), house_type="apartment")) == ["a", "b"]
+    assert index.similarity_search("0 q", house_type="studio") == []
+
+    index.add_texts(["3 a"], metadatas=[meta("a", 1000, "apartment", 9.0)], ids=["a"])
+    index.delete(["b"])
+    assert len(index) == 3
+    assert ids(index.similarity_search("3 q", k=1)) == ["a"]
+    assert ids(index.similarity_search("0 q", k=1)) != ["b"]
+    assert index.get(ids=["a", "b"])["ids"] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_passes_filters_to_either_backend(store, monkeypatch):
+    rag.index_properties([prop("a", price=1000.0), prop("b", price=5000.0)])
+    assert [m["property_id"] for m in await rag.retrieve_relevant_properties(rag.get_vector_store(), "Flat", k=5, max_price=2000)] == ["a"]
+
+    monkeypatch.setattr(rag.settings, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(rag, "_stores", {})
+    rag.index_properties([prop("a", price=1000.0), prop("b", price=5000.0)])
+    assert isinstance(rag.get_vector_store(), ExactVectorIndex)
+    assert [m["property_id"] for m in await rag.retrieve_relevant_properties(rag.get_vector_store(), "Flat", k=5, min_price=2000)] == ["b"]
+
+
+class FakeProperties:
+    """properties table for sync_vector_store: honours the updated_at filter and the approved count."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, statement, params=None):
+        if "count(*)" in str(statement):
+            return FakeSyncResult([], [(sum(r["status"] == "APPROVED" for r in self.rows),)])
+        since = (params or {}).get("since")
+        rows = [r for r in self.rows if since is None or r["updated_at"] >= since]
+        cols = ["id", "title", "location", "price", "house_type", "amenities", "lat", "lon", "status", "updated_at"]
+        return FakeSyncResult(cols, [tuple(r[c] for c in cols) for r in rows])
+
+
+class FakeSyncResult:
+    def __init__(self, cols, rows):
+        self._cols, self._rows = cols, rows
+
+    def keys(self):
+        return self._cols
+
+    def fetchall(self):
+        return self._rows
+
+    def scalar(self):
+        return self._rows[0][0]
+
+
+@pytest.mark.asyncio
+async def test_sync_overlaps_the_watermark_and_reconciles_hard_deletes(store, monkeypatch):
+    monkeypatch.setattr(rag.settings, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(rag, "_last_synced_at", None)
+    monkeypatch.setattr(rag, "_last_reconciled_at", None)
+    now = datetime(2026, 1, 1, 12, 0)
+    db = FakeProperties([{**prop(pid), "status": "APPROVED", "updated_at": now} for pid in ("a", "b")])
+    await rag.sync_vector_store(db)
+
+    # Committed after the pass, but stamped before the watermark
+    db.rows.append({**prop("late"), "status": "APPROVED", "updated_at": now - timedelta(seconds=5)})
+    stats = await rag.sync_vector_store(db)
+    assert stats["upserted"] == 1 and "late" in rag.get_vector_store().get()["ids"]
+
+    del db.rows[0]  # deleted outright: the count check triggers a full reconcile
+    stats = await rag.sync_vector_store(db)
+    assert stats["deleted"] == 1
+    assert sorted(rag.get_vector_store().get()["ids"]) == ["b", "late"]
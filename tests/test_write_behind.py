@@ -0,0 +1,120 @@
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.services.write_behind import WriteBehindFull, WriteBehindQueue
+
+
+class FakeResult:
+    def __init__(self, values):
+        self._values = values
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._values
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.next_id = 1
+        self.committed = []
+        self.fail_when = lambda table, rows: False
+
+    def session(self):
+        return FakeSession(self)
+
+
+class FakeSession:
+    def __init__(self, database):
+        self.database = database
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if not hasattr(statement, "table"):
+            # nextval() block allocation
+            ids = list(range(self.database.next_id, self.database.next_id + params["n"]))
+            self.database.next_id += params["n"]
+            return FakeResult(ids)
+        error = self.database.fail_when(statement.table.name, params)
+        if error:
+            raise error
+        self.statements.append((statement.table.name, params))
+
+    async def commit(self):
+        self.database.committed.append(self.statements)
+
+
+@pytest.mark.asyncio
+async def test_rows_are_batched_with_preallocated_ids_and_preferences_first():
+    db = FakeDatabase()
+    queue = WriteBehindQueue(db.session, id_block=10)
+    ids = await queue.add_preferences([{"user_id": "u1"}, {"user_id": "u2"}])
+    assert ids == [1, 2]
+    await queue.add_recommendation_log({"tenant_preference_id": 1})
+    assert await queue.add_preferences([{"user_id": "u3"}]) == [3]
+    assert db.next_id == 11 and db.committed == []
+
+    assert await queue.flush() == 4
+    assert len(db.committed) == 1
+    (first_table, preferences), (second_table, logs) = db.committed[0]
+    assert (first_table, second_table) == ("TenantPreferences", "RecommendationLogs")
+    assert [p["id"] for p in preferences] == [1, 2, 3] and len(logs) == 1
+    assert queue.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_unavailable_database_keeps_rows_queued_with_backoff():
+    db = FakeDatabase()
+    queue = WriteBehindQueue(db.session, flush_seconds=60)
+    await queue.add_preferences([{"user_id": "u1"}])
+    db.fail_when = lambda table, rows: OperationalError("INSERT", {}, ConnectionError("connection refused"))
+    for _ in range(5):
+        await queue.flush(force=True)
+    assert queue.pending == 1 and queue.dropped == 0
+
+    db.fail_when = lambda table, rows: False
+    assert await queue.flush() == 0  # still backing off
+    assert await queue.flush(force=True) == 1 and queue.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_only_rows_the_database_rejects_are_dropped():
+    db = FakeDatabase()
+    queue = WriteBehindQueue(db.session)
+    db.fail_when = lambda table, rows: any(r["user_id"] == "bad" for r in rows) and IntegrityError("INSERT", {}, Exception("fk"))
+    await queue.add_preferences([{"user_id": "ok"}, {"user_id": "bad"}])
+
+    assert await queue.flush() == 1
+    assert queue.stats() == {"pending": 0, "written": 1, "dropped": 1, "failed_flushes": 0}
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_new_rows_instead_of_dropping_queued_ones():
+    db = FakeDatabase()
+    queue = WriteBehindQueue(db.session, max_pending=2)
+    await queue.add_recommendation_log({"tenant_preference_id": 1})
+    await queue.add_recommendation_log({"tenant_preference_id": 2})
+    db.fail_when = lambda table, rows: OperationalError("INSERT", {}, ConnectionError("connection refused"))
+    with pytest.raises(WriteBehindFull):
+        await queue.add_recommendation_log({"tenant_preference_id": 3})
+    assert queue.pending == 2
+
+
+@pytest.mark.asyncio
+async def test_pending_limit_flushes_inline_and_stop_drains():
+    db = FakeDatabase()
+    queue = WriteBehindQueue(db.session, flush_seconds=60, max_batch=10, max_pending=3)
+    queue.start()
+    for i in range(4):
+        await queue.add_recommendation_log({"tenant_preference_id": i})
+    assert queue.pending == 1 and len(db.committed) == 1
+
+    await queue.stop()
+    assert queue.pending == 0 and queue.written == 4